@@ -1,203 +1,346 @@
-from kivy.app import App
-from kivy.uix.gridlayout import GridLayout
-from kivy.uix.label import Label
-from kivy.uix.image import Image
-from kivy.uix.button import Button
-from kivy.uix.textinput import TextInput
-from bs4 import BeautifulSoup
-import requests
-from datetime import datetime
-from kivy.clock import Clock
-import sys
-
-sys.setrecursionlimit(5000)
-
-
-class Cardano_Converter_By_Kaushal_Bhingaradia(App):
-    logo = 'ada_logo.png'
-    count = 0
-    red = [1, 0, 0, 1]
-    green = [0, 1, 0, 1]
-    blue = [0, 0, 1, 1]
-    purple = [1, 0, 1, 1]
-    white = [0, 0, 0, 0]
-
-    def build(self):
-        self.window = GridLayout()
-        self.window.cols = 1
-
-        # Widgets
-        self.window.add_widget(Image(source="ada_logo.png"))
-
-        intro = 'Welcome to Simple Cardano Converter!\n By: Kaushal ' \
-                'Bhingaradia 2022\n\n' \
-                'NOTE: This program works off the internet for real time\n ' \
-                'ADA prices and is still in beta!'
-
-        instructions = 'Just enter only numbers for CAD or ADA in the ' \
-                       'text box, then the program will output ADA or CAD\n' \
-                       'depending on which conversion button you press!'
-
-        # The top message
-        self.greeting = Label(text=intro)
-        self.window.add_widget(self.greeting)
-
-        # Output instructions in console
-        print(instructions)
-
-        # The clickable start Button
-        self.start_button = Button(text="Let's get started!")
-        self.start_button.bind(on_press=self.convert_page)
-        self.start_button.bind(on_press=self.refresh)
-        self.start_button.bind(on_press=self.delete)
-        self.window.add_widget(self.start_button)
-
-        # Display the widgets
-        return self.window
-
-    def refresh(self, instance):
-        print('Now running refresher!')
-        # refresh date and currency price every 10 seconds
-        Clock.schedule_interval(self.refresh_conversion_page, 10)
-
-    def refresh_conversion_page(self, dt):
-
-        self.price.text = f"""
-        The current price of ADA is ${self.get_realtime_cardano_price()} CAD
-        @ {self.date_time()}
-        """
-
-    def date_time(self):
-        now = datetime.now()
-        return now.strftime('%Y/%m/%d %I:%M:%S')
-
-    def delete(self, instance):
-        # Function to delete the button on click
-        self.window.remove_widget(self.start_button)
-        self.window.remove_widget(self.greeting)
-
-    def convert_page(self, instance):
-        # New page UI to show conversion buttons
-
-        self.window.cols = 1
-
-        price_status = f"""
-        The current price of ADA is ${self.get_realtime_cardano_price()} CAD
-        @ {self.date_time()}
-        """
-
-        # Market Price
-        self.price = Label(text=price_status)
-        self.price.color = self.red
-        self.window.add_widget(self.price)
-
-        # Text input instructions
-        self.message = Label(text='Enter CAD or ADA in text box below!')
-        self.window.add_widget(self.message)
-
-        # Input Lines for entering values of either ADA  or CAD
-        self.input = TextInput(multiline=False, input_filter='float',
-                               write_tab=False)
-        if self.input.text == '':
-            self.input.text = '0'
-        self.window.add_widget(self.input)
-
-        # Button shows the conversion result and clears on click
-        self.result = Button(text='Output')
-        self.result.bind(on_press=self.clear)
-        self.window.add_widget(self.result)
-
-        # Top button to convert the inputted text CAD to ADA
-        self.button = Button(text='Convert CAD to ADA')
-        self.button.color = self.blue
-        self.button.bind(on_press=self.CAD_to_ADA)
-        self.window.add_widget(self.button)
-
-        # Bottom button to convert the inputted text ADA to CAD
-        self.button2 = Button(text='Convert ADA to CAD')
-        self.button2.color = self.purple
-        self.button2.bind(on_press=self.ADA_to_CAD)
-        self.window.add_widget(self.button2)
-
-        # Display widgets
-        return self.window
-
-    def clear(self, instance):
-        self.result.color = self.red
-        self.count = 0
-        self.input.text = '0'
-        self.result.text = 'CLEAR!'
-
-    def get_realtime_cardano_price(self):
-        # Get the URL
-        url = "https://www.google.ca/search?q=" + 'ADA' + "+price"
-
-        # Make a request to the website
-        HTML = requests.get(url)
-
-        # Parse the HTML
-        soup = BeautifulSoup(HTML.text, 'html.parser')
-
-        # Find the current price
-        # text = soup.find("div", attrs={'class':'BNeawe iBp4i AP7Wnd'}).text
-        text = soup.find("div", attrs={'class': 'BNeawe iBp4i AP7Wnd'}).find(
-            "div", attrs={'class': 'BNeawe iBp4i AP7Wnd'}).text
-        # Return the text
-        edit = str(text)[:4]
-        return edit
-
-    def CAD_to_ADA(self, instance):
-        # Count number of conversions
-        self.count += 1
-
-        # Get real time cardano prices
-        cardano_price = float(self.get_realtime_cardano_price())
-
-        # CAD variable converted to float
-        if self.input.text == '':
-            self.input.text = '0'
-        CAD = float(self.input.text)
-
-        # Conversion formula to get ADA value from CAD
-        convert = CAD / cardano_price
-
-        # ADA rounded 2 decimal places after conversion
-        rounded_calc = round(convert, 2)
-
-        work = '{} CAD  --------->  {} ADA! ' \
-               '\nYou converted {} time(s)!'.format(str(round(float(CAD), 2)),
-                                                    str(rounded_calc),
-                                                    str(self.count))
-        # Update the button to show the conversion
-        self.result.color = self.green
-        self.result.text = work
-
-    def ADA_to_CAD(self, instance):
-        # Count number of conversions
-        self.count += 1
-
-        # Get real time cardano prices
-        cardano_price = float(self.get_realtime_cardano_price())
-
-        # ADA variable
-        if self.input.text == '':
-            self.input.text = '0'
-        ADA = float(self.input.text)
-
-        # Conversion formula to get CAD value from Cardano
-        convert = ADA * cardano_price
-
-        # ADA rounded 2 decimal places after conversion
-        rounded_calc = round(convert, 2)
-
-        work = '{} ADA  --------->  {} CAD! ' \
-               '\nYou converted {} time(s)!'.format(str(round(float(ADA), 2)),
-                                                    str(rounded_calc),
-                                                    str(self.count))
-        # Update the button to show the conversion
-        self.result.color = self.green
-        self.result.text = work
-
-
-if __name__ == "__main__":
-    Cardano_Converter_By_Kaushal_Bhingaradia().run()
+from kivy.app import App
+from kivy.uix.gridlayout import GridLayout
+from kivy.uix.label import Label
+from kivy.uix.image import Image
+from kivy.uix.button import Button
+from kivy.uix.textinput import TextInput
+from http_transport import get_transport
+from html_extract import GOOGLE_NESTED_PRICE, DECIMAL
+from conversion import convert_exact, to_decimal, CAD_TO_ADA, ADA_TO_CAD
+from price_cache import PriceCache, DEFAULT_QUOTE
+from poll_scheduler import AdaptivePollScheduler
+from async_fetch import AsyncTransport, KivyLoopDriver
+from price_stream import PriceStream, KRAKEN_URL
+from quote_broker import get_broker
+from image_assets import scaled_image, LOGO
+from datetime import datetime
+from kivy.clock import Clock
+from kivy.core.window import Window
+import os
+import sys
+
+sys.setrecursionlimit(5000)
+
+
+class Cardano_Converter_By_Kaushal_Bhingaradia(App):
+    logo = 'ada_logo.png'
+    count = 0
+    red = [1, 0, 0, 1]
+    green = [0, 1, 0, 1]
+    blue = [0, 0, 1, 1]
+    purple = [1, 0, 1, 1]
+    white = [0, 0, 0, 0]
+
+    # Quote cache shared by the refresh tick and the conversion buttons
+    price_cache = PriceCache(ttl=10)
+
+    # Poll interval that adapts to volatility, failures and rate limits
+    poll_scheduler = AdaptivePollScheduler(base_interval=10)
+
+    # Quote slot shared with the other instances on the machine, opened when refreshing starts
+    quote_broker = None
+
+    def build(self):
+        self.window = GridLayout()
+        self.window.cols = 1
+
+        # Widgets
+        # The logo pre-scaled from its 2000x2000 source, so Kivy does not decode the full image
+        self.window.add_widget(Image(source=scaled_image(LOGO, (256, 256))))
+
+        intro = 'Welcome to Simple Cardano Converter!\n By: Kaushal ' \
+                'Bhingaradia 2022\n\n' \
+                'NOTE: This program works off the internet for real time\n ' \
+                'ADA prices and is still in beta!'
+
+        instructions = 'Just enter only numbers for CAD or ADA in the ' \
+                       'text box, then the program will output ADA or CAD\n' \
+                       'depending on which conversion button you press!'
+
+        # The top message
+        self.greeting = Label(text=intro)
+        self.window.add_widget(self.greeting)
+
+        # Output instructions in console
+        print(instructions)
+
+        # The clickable start Button
+        self.start_button = Button(text="Let's get started!")
+        self.start_button.bind(on_press=self.convert_page)
+        self.start_button.bind(on_press=self.refresh)
+        self.start_button.bind(on_press=self.delete)
+        self.window.add_widget(self.start_button)
+
+        # Display the widgets
+        return self.window
+
+    def refresh(self, instance):
+        print('Now running refresher!')
+        get_transport().add_listener(self.poll_scheduler.observe_response)
+
+        # Refreshes run on an asyncio loop stepped by the Clock, so they never block the UI
+        self.async_transport = AsyncTransport()
+        self.async_transport.add_listener(self.poll_scheduler.observe_response)
+        self.loop_driver = KivyLoopDriver()
+        self.loop_driver.start()
+
+        # Read the quote another instance polls instead of polling here too;
+        # offline and replayed quotes are not real, so they are kept to this instance
+        if not (os.environ.get("CARDANO_CONVERTER_OFFLINE") or os.environ.get("CARDANO_CONVERTER_REPLAY")):
+            self.quote_broker = get_broker()
+
+        # Take pushed quotes from a ticker stream when CARDANO_CONVERTER_STREAM is set,
+        # to 1 for Kraken's or to a feed URL, polling only while it is down
+        self.price_stream = None
+        stream_url = os.environ.get("CARDANO_CONVERTER_STREAM")
+        if stream_url and not os.environ.get("CARDANO_CONVERTER_OFFLINE"):
+            if stream_url.lower() in ("1", "on", "true"):
+                stream_url = KRAKEN_URL
+            self.price_stream = PriceStream(self.on_stream_tick, url=stream_url,
+                                            kind="sse" if stream_url.startswith("http") else "websocket",
+                                            on_state=self.on_stream_state)
+            self.loop_driver.submit(self.price_stream.run())
+
+        # Pause refreshing while minimised or while the user is away
+        Window.bind(on_minimize=lambda window: self.poll_scheduler.pause(),
+                    on_restore=lambda window: self.poll_scheduler.resume(),
+                    on_touch_down=lambda window, touch: self.poll_scheduler.touch(),
+                    on_key_down=lambda window, *args: self.poll_scheduler.touch())
+
+        # refresh date and currency price whenever the scheduler says so,
+        # starting at once when there is no price to show yet
+        self.schedule_refresh(0 if self.price_cache.peek(DEFAULT_QUOTE) is None else None)
+
+    def schedule_refresh(self, delay=None):
+        if delay is None:
+            delay = self.poll_scheduler.next_interval()
+        self.refresh_event = Clock.schedule_once(self.refresh_conversion_page, delay)
+
+    def refresh_conversion_page(self, dt):
+
+        streaming = self.price_stream is not None and self.price_stream.is_live()
+        if self.poll_scheduler.is_paused() or streaming:
+            if self.quote_broker is not None:
+                # Let another instance poll for everyone while this one is not
+                self.quote_broker.step_down()
+            self.schedule_refresh()
+            return
+
+        # Fetch in the background and schedule the next refresh once it is shown
+        self.loop_driver.submit(self.load_price_async(), self.show_price)
+
+    def show_price(self, price, error):
+        if error is not None:
+            print(f"Error refreshing price: {error}")
+        self.show_cached_price()
+        self.schedule_refresh()
+
+    def show_cached_price(self):
+        price = self.price_cache.peek(DEFAULT_QUOTE)
+        if price is not None:
+            self.price.text = self.price_status(price)
+
+    def price_status(self, price):
+        if price is None:
+            return """
+            Loading the current price of ADA...
+            """
+        return f"""
+            The current price of ADA is ${price} CAD
+            @ {self.date_time()}
+            """
+
+    def on_stream_tick(self, price, timestamp):
+        # Streamed prices go through the cache and label like refreshed ones
+        self.poll_scheduler.record_price(price)
+        self.price_cache.put(DEFAULT_QUOTE, str(price))
+        self.publish_shared(price, "stream")
+        self.show_cached_price()
+
+    def on_stream_state(self, live):
+        # Refresh at once when the stream drops, then keep polling until it is back
+        # A refresh already in flight schedules the next one itself
+        if not live and self.refresh_event.is_triggered:
+            self.refresh_event.cancel()
+            self.schedule_refresh(0)
+
+    def date_time(self):
+        now = datetime.now()
+        return now.strftime('%Y/%m/%d %I:%M:%S')
+
+    def delete(self, instance):
+        # Function to delete the button on click
+        self.window.remove_widget(self.start_button)
+        self.window.remove_widget(self.greeting)
+
+    def convert_page(self, instance):
+        # New page UI to show conversion buttons
+
+        self.window.cols = 1
+
+        # Market Price, filled in by the first refresh when none is cached yet
+        self.price = Label(text=self.price_status(self.price_cache.peek(DEFAULT_QUOTE)))
+        self.price.color = self.red
+        self.window.add_widget(self.price)
+
+        # Text input instructions
+        self.message = Label(text='Enter CAD or ADA in text box below!')
+        self.window.add_widget(self.message)
+
+        # Input Lines for entering values of either ADA  or CAD
+        self.input = TextInput(multiline=False, input_filter='float',
+                               write_tab=False)
+        if self.input.text == '':
+            self.input.text = '0'
+        self.window.add_widget(self.input)
+
+        # Button shows the conversion result and clears on click
+        self.result = Button(text='Output')
+        self.result.bind(on_press=self.clear)
+        self.window.add_widget(self.result)
+
+        # Top button to convert the inputted text CAD to ADA
+        self.button = Button(text='Convert CAD to ADA')
+        self.button.color = self.blue
+        self.button.bind(on_press=self.CAD_to_ADA)
+        self.window.add_widget(self.button)
+
+        # Bottom button to convert the inputted text ADA to CAD
+        self.button2 = Button(text='Convert ADA to CAD')
+        self.button2.color = self.purple
+        self.button2.bind(on_press=self.ADA_to_CAD)
+        self.window.add_widget(self.button2)
+
+        # Display widgets
+        return self.window
+
+    def clear(self, instance):
+        self.result.color = self.red
+        self.count = 0
+        self.input.text = '0'
+        self.result.text = 'CLEAR!'
+
+    def get_cached_price(self):
+        # Serve the cached price without waiting, refreshing it in the background when stale
+        # None until the first price has loaded
+        return self.price_cache.get(DEFAULT_QUOTE, self.load_price, block=False)
+
+    def load_price(self):
+        # Take the price another instance polled, if there is a recent one
+        price = self.shared_price()
+        if price is not None:
+            return price
+
+        # Fetch a fresh price, telling the scheduler whether it worked
+        try:
+            price = self.get_realtime_cardano_price()
+        except Exception:
+            self.poll_scheduler.record_failure()
+            raise
+        self.poll_scheduler.record_price(price)
+        self.publish_shared(price, "google")
+        return price
+
+    async def load_price_async(self):
+        # Take the price another instance polled, if there is a recent one
+        price = self.shared_price()
+        if price is not None:
+            self.price_cache.put(DEFAULT_QUOTE, price)
+            return price
+
+        # Fetch a fresh price on the event loop and cache it for the conversions
+        try:
+            response = await self.async_transport.get(self.price_url())
+            price = self.parse_price(response.content)
+        except Exception:
+            self.poll_scheduler.record_failure()
+            raise
+        self.poll_scheduler.record_price(price)
+        self.price_cache.put(DEFAULT_QUOTE, price)
+        self.publish_shared(price, "google")
+        return price
+
+    def shared_price(self):
+        # Get the price from the shared slot, or None when this instance is the one polling
+        if self.quote_broker is None or self.quote_broker.try_lead():
+            return None
+        quote = self.quote_broker.read_fresh()
+        return quote.price if quote is not None else None
+
+    def publish_shared(self, price, source):
+        # Hand a polled price to the other instances when this one is polling for them
+        if self.quote_broker is not None and self.quote_broker.leading:
+            self.quote_broker.publish_quote(price, source, next_poll=self.poll_scheduler.next_poll_time())
+
+    def price_url(self):
+        # Get the URL
+        return "https://www.google.ca/search?q=" + 'ADA' + "+price"
+
+    def parse_price(self, content):
+        # Find the current price in the nested price divs, without parsing the whole page
+        text = GOOGLE_NESTED_PRICE.search(content).group(1).decode()
+        # Return the whole price, with every digit the page shows
+        return DECIMAL.search(text).group(0)
+
+    def get_realtime_cardano_price(self):
+        # Make a request to the website over the shared pooled transport
+        HTML = get_transport().get(self.price_url())
+        return self.parse_price(HTML.content)
+
+    def CAD_to_ADA(self, instance):
+        # Get real time cardano prices
+        cardano_price = self.get_cached_price()
+        if cardano_price is None:
+            self.result.color = self.red
+            self.result.text = 'Price not loaded yet, try again in a moment'
+            return
+
+        # Count number of conversions
+        self.count += 1
+
+        # CAD variable parsed exactly
+        if self.input.text == '':
+            self.input.text = '0'
+        CAD = to_decimal(self.input.text)
+
+        # Exact conversion to ADA, rounded once to the lovelace
+        rounded_calc = convert_exact(CAD, cardano_price, CAD_TO_ADA)
+
+        work = '{} CAD  --------->  {} ADA! ' \
+               '\nYou converted {} time(s)!'.format(str(CAD),
+                                                    str(rounded_calc),
+                                                    str(self.count))
+        # Update the button to show the conversion
+        self.result.color = self.green
+        self.result.text = work
+
+    def ADA_to_CAD(self, instance):
+        # Get real time cardano prices
+        cardano_price = self.get_cached_price()
+        if cardano_price is None:
+            self.result.color = self.red
+            self.result.text = 'Price not loaded yet, try again in a moment'
+            return
+
+        # Count number of conversions
+        self.count += 1
+
+        # ADA variable parsed exactly
+        if self.input.text == '':
+            self.input.text = '0'
+        ADA = to_decimal(self.input.text)
+
+        # Exact conversion to CAD, rounded once to the cent
+        rounded_calc = convert_exact(ADA, cardano_price, ADA_TO_CAD)
+
+        work = '{} ADA  --------->  {} CAD! ' \
+               '\nYou converted {} time(s)!'.format(str(ADA),
+                                                    str(rounded_calc),
+                                                    str(self.count))
+        # Update the button to show the conversion
+        self.result.color = self.green
+        self.result.text = work
+
+
+if __name__ == "__main__":
+    Cardano_Converter_By_Kaushal_Bhingaradia().run()
@@ -0,0 +1,14 @@
+import os
+
+# Per-user directory for persisted quotes, history and caches
+DATA_DIR = os.environ.get(
+    "CARDANO_CONVERTER_HOME",
+    os.path.join(os.path.expanduser("~"), ".cardano_converter")
+)
+
+
+def data_path(*parts):
+    """Get a path inside the data directory, creating its parent folders"""
+    path = os.path.join(DATA_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
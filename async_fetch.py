@@ -0,0 +1,334 @@
+import asyncio
+import functools
+import json
+import time
+from http_transport import get_transport, request_headers
+from market_stats import MARKETS_URL, parse_markets
+from metrics import get_metrics
+from price_fetcher import FetchResult, is_valid_price
+from price_sources import GOOGLE_URL, COINGECKO_URL, google_price, coingecko_price
+from source_registry import SourceRegistry
+
+
+class HttpStatusError(Exception):
+    """An error status from an upstream server"""
+
+    def __init__(self, status_code, url):
+        super().__init__(f"HTTP {status_code} from {url}")
+        self.status_code = status_code
+
+
+class AsyncResponse:
+    """A fully read response, shaped like the requests one the sync sources get"""
+
+    def __init__(self, url, status_code, headers, content, encoding=None):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise HttpStatusError(self.status_code, self.url)
+
+
+class AsyncTransport:
+    """Pooled asyncio HTTP client for the price sources
+
+    Uses aiohttp when it is installed: one session with a bounded connection
+    pool serves every source from the event loop, with no thread per
+    request. Without aiohttp, requests go through the shared sync transport
+    on the loop's worker threads, so the async API works either way.
+    Retryable server errors and connection errors are retried with
+    exponential backoff, within the request's timeout; 429 responses go
+    straight to the listeners, as with the sync transport.
+    """
+
+    def __init__(self, limit=8, retries=2, backoff_factor=0.3,
+                 status_forcelist=(500, 502, 503, 504), timeout=5, sync_transport=None):
+        self.limit = limit
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.status_forcelist = status_forcelist
+        self.timeout = timeout
+        self.sync_transport = sync_transport or get_transport()
+
+        self.session = None
+        try:
+            import aiohttp
+            self.aiohttp = aiohttp
+        except ImportError:
+            self.aiohttp = None
+        if getattr(self.sync_transport, "intercepts", False):
+            # Recorded or replayed traffic has to go through the sync transport
+            self.aiohttp = None
+
+        # Callbacks that see every response, e.g. to pick up rate-limit headers
+        self.listeners = []
+
+    async def get(self, url, preset=None, headers=None, timeout=None):
+        """Send a GET request and read the whole response"""
+        timeout = self.timeout if timeout is None else timeout
+        if self.aiohttp is None:
+            # The sync transport retries and notifies its own listeners
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(None, functools.partial(
+                self.sync_transport.get, url, preset=preset, headers=headers, timeout=timeout))
+
+        # Every attempt and backoff has to fit in the one timeout
+        response = await asyncio.wait_for(self.get_with_retries(url, request_headers(preset, headers)), timeout)
+        for listener in self.listeners:
+            try:
+                listener(response)
+            except Exception as e:
+                print(f"Error in response listener: {e}")
+        return response
+
+    async def get_with_retries(self, url, headers):
+        """Send a GET request, retrying connection errors and retryable statuses"""
+        if self.session is None:
+            connector = self.aiohttp.TCPConnector(limit=self.limit)
+            self.session = self.aiohttp.ClientSession(connector=connector)
+
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            try:
+                async with self.session.get(url, headers=headers) as raw:
+                    response = AsyncResponse(url, raw.status, raw.headers, await raw.read(), raw.charset)
+            except self.aiohttp.ClientConnectionError:
+                if last:
+                    raise
+            else:
+                if last or response.status_code not in self.status_forcelist:
+                    return response
+            await asyncio.sleep(self.backoff_factor * 2 ** attempt)
+
+    def add_listener(self, listener):
+        """Call listener(response) for every response"""
+        self.listeners.append(listener)
+
+    async def close(self):
+        """Close the pooled session"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+# Async versions of the sources in price_sources, with the same parsing
+
+
+async def async_price_from_google(transport):
+    """Get price from Google search"""
+    return google_price(await transport.get(GOOGLE_URL, preset='browser', timeout=5))
+
+
+async def async_price_from_coingecko(transport):
+    """Get price from CoinGecko website as fallback"""
+    return coingecko_price(await transport.get(COINGECKO_URL, preset='browser', timeout=5))
+
+
+async def async_price_from_markets(transport, feed):
+    """Get price from the CoinGecko markets API, refreshing the feed's market stats in the same request"""
+    url = MARKETS_URL.format(coin="cardano", currency="cad")
+    response = await transport.get(url, preset='json', timeout=5)
+    response.raise_for_status()
+    stats = parse_markets(response.json())
+    if stats is None or stats.price is None:
+        return None
+    feed.cache.put(feed.KEY, stats)
+    return str(stats.price)
+
+
+def run_in_executor(function):
+    """Wrap a blocking source as a coroutine function that runs it on a worker thread"""
+    async def run():
+        return await asyncio.get_event_loop().run_in_executor(None, function)
+    return run
+
+
+class AsyncPriceFetcher:
+    """Asyncio counterpart of PriceFetcher: the first valid quote of hedged sources
+
+    Sources are coroutine functions, taken from a SourceRegistry fastest
+    healthy source first, and launched hedge_delay apart (all at once with
+    0). Each attempt has its own deadline of request_timeout, the whole
+    fetch gives up after timeout, and the losers are cancelled outright
+    once a quote arrives. A semaphore bounds the requests in flight across
+    every concurrent fetch on the loop.
+    """
+
+    def __init__(self, sources, hedge_delay=0.0, timeout=6.0, request_timeout=5.0, max_concurrency=8):
+        if isinstance(sources, SourceRegistry):
+            self.registry = sources
+        else:
+            self.registry = SourceRegistry(sources)
+        self.hedge_delay = hedge_delay
+        self.timeout = timeout
+        self.request_timeout = request_timeout
+        self.max_concurrency = max_concurrency
+        self.semaphore = None
+
+    async def run_source(self, name, fetch):
+        """Await one source within its deadline and record the outcome in the registry"""
+        if self.semaphore is None:
+            # Created on first use, so it belongs to the loop that runs the fetches
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async with self.semaphore:
+            start = time.monotonic()
+            try:
+                price = await asyncio.wait_for(fetch(), self.request_timeout)
+            except asyncio.CancelledError:
+                # Lost the race, which only says the source is slower than the winner
+                self.registry.record_cancelled(name, time.monotonic() - start)
+                raise
+            except Exception as e:
+                self.registry.record_error(name, time.monotonic() - start, e)
+                raise
+
+        elapsed = time.monotonic() - start
+        if is_valid_price(price):
+            self.registry.record_success(name, elapsed)
+        else:
+            self.registry.record_parse_failure(name, elapsed)
+        return price
+
+    async def fetch(self):
+        """Return a FetchResult for the first valid quote, or one with price None"""
+        loop = asyncio.get_event_loop()
+        start = time.monotonic()
+        deadline = start + self.timeout
+        sources = self.registry.ordered()
+        next_launch = start
+        launched = 0
+        running = {}
+
+        try:
+            while True:
+                now = time.monotonic()
+
+                # Start the next source when its hedge slot is due
+                while launched < len(sources) and now >= next_launch:
+                    name, fetch = sources[launched]
+                    running[loop.create_task(self.run_source(name, fetch))] = name
+                    launched += 1
+                    next_launch = now + self.hedge_delay
+
+                if not running or now >= deadline:
+                    break
+
+                wake_at = next_launch if launched < len(sources) else deadline
+                done, _ = await asyncio.wait(list(running), timeout=max(0, min(wake_at, deadline) - now),
+                                             return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    name = running.pop(task)
+                    try:
+                        price = task.result()
+                    except Exception as e:
+                        print(f"Error fetching price from {name}: {e}")
+                        price = None
+
+                    if is_valid_price(price):
+                        elapsed = time.monotonic() - start
+                        get_metrics().observe("quote_fetch_seconds", elapsed, source=name)
+                        return FetchResult(price, name, elapsed)
+
+                # Every running source failed, so there is no point waiting for the next slot
+                if not running:
+                    next_launch = time.monotonic()
+
+            get_metrics().count("quote_failures_total")
+            return FetchResult(None, None, time.monotonic() - start)
+        finally:
+            # Cancel whatever is still in flight, including when the caller cancels us
+            for task in running:
+                task.cancel()
+
+
+class LoopDriver:
+    """Runs an asyncio event loop in small steps from a GUI toolkit's own timer
+
+    Nothing blocks the GUI and no thread is needed: every interval the loop
+    runs the callbacks that are ready and polls its sockets without waiting,
+    then hands control back. Subclasses only schedule tick() after interval
+    seconds on their toolkit. A step with nothing to do is one non-blocking
+    poll, so fifty a second cost next to nothing while the app is idle.
+    Coroutines are started with submit(), and their result or error is
+    passed to the optional callback on the GUI thread.
+    """
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.loop = asyncio.new_event_loop()
+        self.running = False
+
+    def submit(self, coroutine, callback=None):
+        """Schedule a coroutine on the loop, calling callback(result, error) when it finishes"""
+        task = self.loop.create_task(coroutine)
+        if callback is not None:
+            def done(task):
+                if task.cancelled():
+                    return
+                error = task.exception()
+                callback(None if error else task.result(), error)
+            task.add_done_callback(done)
+        return task
+
+    def step(self):
+        """Run one iteration of the event loop"""
+        self.loop.call_soon(self.loop.stop)
+        self.loop.run_forever()
+
+    def run_until(self, predicate, timeout):
+        """Step the loop until predicate() is true or timeout seconds pass, before the GUI runs"""
+        deadline = time.monotonic() + timeout
+        while not predicate() and time.monotonic() < deadline:
+            self.step()
+            time.sleep(self.interval)
+
+    def start(self):
+        self.running = True
+        self.schedule()
+
+    def stop(self):
+        self.running = False
+
+    def tick(self, *args):
+        if not self.running:
+            return
+        try:
+            self.step()
+        except Exception as e:
+            print(f"Error running the event loop: {e}")
+        self.schedule()
+
+    def schedule(self):
+        raise NotImplementedError
+
+
+class TkLoopDriver(LoopDriver):
+    """Drives an asyncio loop from Tk's after() timer"""
+
+    def __init__(self, root, interval=0.02):
+        super().__init__(interval)
+        self.root = root
+
+    def schedule(self):
+        self.root.after(int(self.interval * 1000), self.tick)
+
+
+class KivyLoopDriver(LoopDriver):
+    """Drives an asyncio loop from Kivy's Clock"""
+
+    def schedule(self):
+        from kivy.clock import Clock
+        Clock.schedule_once(self.tick, self.interval)
@@ -0,0 +1,480 @@
+"""Headless batch conversion of CAD and ADA amounts
+
+Streams a CSV or JSON Lines file through the conversion kernel in chunks,
+so memory use stays flat however large the ledger is. Every row is
+converted at one quote: --price, a live fetch with --live, or by default
+the last quote the app saved. With --as-of each row is instead converted at
+the price in effect at its own timestamp, looked up in the recorded price
+history. No GUI toolkit is loaded. With --rounding the amounts are
+converted in exact fixed-point arithmetic instead of floating point,
+rounded once the given way, and written with exactly --decimals places.
+
+    python batch_convert.py ledger.csv -o converted.csv --direction cad-to-ada
+    python batch_convert.py ledger.csv --as-of --interpolation linear
+    python batch_convert.py ledger.csv --rounding half-up
+"""
+import argparse
+import csv
+import io
+import itertools
+import json
+import math
+import operator
+import os
+import sys
+import time
+from datetime import datetime
+import numpy as np
+from conversion import (convert, convert_units, format_units, parse_units, prices_as_of, to_decimal, DIRECTIONS,
+                        CAD_TO_ADA, INTERPOLATIONS, PREVIOUS, ROUNDINGS)
+from last_quote import load_last_quote
+from tick_store import TickStore
+from app_paths import data_path
+
+# Decimal places written for each target currency (ADA is divisible to 6 places)
+DEFAULT_DECIMALS = {"ADA": 6, "CAD": 2}
+
+
+def convert_exact_strings(amounts, prices, direction, rounding, decimals):
+    """Convert amounts given as decimal strings exactly, returning the results as strings
+
+    prices is one quote, kept as the string or Decimal it was given so no
+    digit is lost, or an array of per-row prices. Rows with no amount (None)
+    or no known price are left as None.
+    """
+    known = np.array([amount is not None for amount in amounts], dtype=bool)
+    if np.ndim(prices):
+        prices = np.asarray(prices, dtype=float)
+        known &= ~np.isnan(prices)
+    if known.all():
+        units, places = parse_units(amounts)
+        converted = convert_units(units, prices, direction, rounding, source_places=places, target_places=decimals)
+        return format_units(converted, decimals)
+
+    results = [None] * len(amounts)
+    if known.any():
+        positions = np.flatnonzero(known).tolist()
+        units, places = parse_units([amounts[position] for position in positions])
+        converted = convert_units(units, prices[known] if np.ndim(prices) else prices, direction, rounding,
+                                  source_places=places, target_places=decimals)
+        for position, text in zip(positions, format_units(converted, decimals)):
+            results[position] = text
+    return results
+
+
+def missing_rows(values):
+    """Get the positions of NaN values, the rows with no amount or that could not be priced"""
+    return np.flatnonzero(np.isnan(values)).tolist()
+
+
+def float_amounts(amounts):
+    """Read amounts as floats, with NaN for missing ones, or raise ValueError
+
+    Booleans and infinite or NaN amounts are refused, as the exact path
+    refuses them, rather than converted as 1, 0, inf or a blank.
+    """
+    values = np.array(amounts, dtype=float)
+    if np.count_nonzero(~np.isfinite(values)) != amounts.count(None):
+        raise ValueError("amounts must be finite numbers")
+    if any(type(amount) is bool for amount in amounts):
+        raise ValueError("amounts must be numbers, not booleans")
+    return values
+
+
+def amount_error(amount, exact):
+    """Say what is wrong with one amount, or return None when it converts"""
+    if isinstance(amount, bool):
+        return f"amount must be a number, not {json.dumps(amount)}"
+    if exact:
+        try:
+            to_decimal(amount)
+        except ValueError as e:
+            return str(e)
+        return None
+    try:
+        value = float(amount)
+    except (TypeError, ValueError):
+        return f"amount must be a number, not {amount!r}"
+    if not math.isfinite(value):
+        return f"amount must be a finite number, not {amount!r}"
+    return None
+
+
+def exit_on_bad_amount(amounts, line_numbers, exact=False):
+    """Exit naming the line and value of the first amount that does not convert
+
+    Called once a chunk has failed to convert, so the fast path never pays
+    for checking rows one at a time. Returns when every amount parses, so
+    the caller can re-raise the original error.
+    """
+    for amount, line in zip(amounts, line_numbers):
+        if amount is None:
+            continue
+        error = amount_error(amount, exact)
+        if error:
+            sys.exit(f"Line {line}: {error}")
+
+
+def exit_on_bad_timestamp(stamps, line_numbers):
+    """Exit naming the line and value of the first timestamp that does not parse
+
+    The timestamp counterpart of exit_on_bad_amount, called once a chunk has
+    failed to price.
+    """
+    for stamp, line in zip(stamps, line_numbers):
+        try:
+            parse_timestamp(stamp)
+        except ValueError:
+            sys.exit(f"Line {line}: timestamp {stamp!r} is not epoch seconds or an ISO 8601 date")
+
+
+def resolve_price(args):
+    """Get the (price, source) pair to convert every row at
+
+    The price stays a string, so exact conversions use every digit quoted
+    rather than the nearest float.
+    """
+    if args.price:
+        try:
+            price = to_decimal(args.price, "--price")
+        except ValueError as e:
+            sys.exit(str(e))
+        if price <= 0:
+            sys.exit("--price must be positive")
+        return str(price), "command line"
+
+    if args.live:
+        from price_fetcher import PriceFetcher
+        from price_sources import DEFAULT_SOURCES
+
+        fetcher = PriceFetcher(DEFAULT_SOURCES)
+        result = fetcher.fetch()
+        fetcher.shutdown()
+        if result.price:
+            return str(result.price), result.source
+        sys.exit("Could not fetch a live price from any source")
+
+    quote = load_last_quote()
+    if quote:
+        return str(quote["price"]), f"saved quote from {time.ctime(quote['time'])}"
+    sys.exit("No price available: pass --price or --live, or run the app once to save a quote")
+
+
+class FixedPricer:
+    """Prices every row at the same quote"""
+
+    def __init__(self, price):
+        self.price = price
+
+    def __call__(self, timestamps):
+        return self.price
+
+
+class AsOfPricer:
+    """Prices each row from the recorded ticks around its timestamp"""
+
+    def __init__(self, store, interpolation=PREVIOUS):
+        self.store = store
+        self.interpolation = interpolation
+
+    def __call__(self, timestamps):
+        timestamps = parse_timestamps(timestamps)
+        known = ~np.isnan(timestamps)
+        if not known.any():
+            return np.full(len(timestamps), np.nan)
+        # Only the ticks spanning this chunk are read from the memory map
+        tick_times, tick_prices = self.store.covering(timestamps[known].min(), timestamps[known].max())
+        prices = prices_as_of(timestamps, tick_times, tick_prices, self.interpolation)
+        # Rows with no timestamp go unpriced, even with nearest
+        prices[~known] = np.nan
+        return prices
+
+
+def parse_timestamps(values):
+    """Parse epoch seconds or ISO 8601 dates, each on its own so a file may mix them
+
+    Blank or missing timestamps are NaN, so their rows go unpriced. Raises
+    ValueError on the first timestamp that is neither.
+    """
+    try:
+        timestamps = np.array(values, dtype=float)
+        if np.isfinite(timestamps[~np.isnan(timestamps)]).all():
+            return timestamps
+    except (ValueError, TypeError):
+        pass
+    return np.array([parse_timestamp(value) for value in values], dtype=float)
+
+
+def parse_timestamp(value):
+    """Parse one timestamp as epoch seconds or an ISO 8601 date, or NaN when it is blank"""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return np.nan
+    if isinstance(value, bool):
+        raise ValueError(f"timestamp must be a number or a date, not {value!r}")
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        try:
+            return datetime.fromisoformat(value.strip()).timestamp()
+        except (AttributeError, ValueError):
+            raise ValueError(f"timestamp {value!r} is not epoch seconds or an ISO 8601 date")
+    if not np.isfinite(seconds):
+        raise ValueError(f"timestamp must be finite, not {value!r}")
+    return seconds
+
+
+def chunks(rows, size):
+    """Split an iterable into lists of at most size items"""
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def csv_line(row):
+    """Serialise one CSV row without a line terminator"""
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="").writerow(row)
+    return buffer.getvalue()
+
+
+def csv_line_numbers(text, first_line):
+    """Get the input line each row of a chunk starts on, for error messages"""
+    if '"' in text:
+        # Quoted fields can span lines, so each row starts after the line the last one ended on
+        reader = csv.reader(io.StringIO(text))
+        numbers = []
+        start = first_line
+        for row in reader:
+            if row:
+                numbers.append(start)
+            start = first_line + reader.line_num
+        return numbers
+    return [first_line + offset for offset, line in enumerate(text.split("\n")) if line]
+
+
+def convert_csv(infile, outfile, pricer, direction, column, timestamp_column, decimals, chunk_size, rounding=None):
+    """Convert a CSV file, appending a column named after the target currency
+
+    With a timestamp column the price used for each row is appended too.
+    """
+    header_line = infile.readline()
+    if not header_line:
+        return 0
+    header = next(csv.reader([header_line]))
+    if column not in header:
+        sys.exit(f"Column '{column}' not found in the CSV header")
+    position = header.index(column)
+    if timestamp_column and timestamp_column not in header:
+        sys.exit(f"Column '{timestamp_column}' not found in the CSV header")
+    stamp_position = header.index(timestamp_column) if timestamp_column else None
+
+    header_line = header_line.rstrip("\r\n")
+    added = DIRECTIONS[direction][1].lower() + (",price" if timestamp_column else "")
+    outfile.write(f"{header_line},{added}\n")
+
+    number = f"{{:.{decimals}f}}".format
+    suffix = ",{}\n".format
+    priced_suffix = ",{},{}\n".format
+    total = 0
+    # Input line of the next chunk's first row, after the header
+    first_line = 2
+    for lines in chunks(infile, chunk_size):
+        text = "".join(lines).replace("\r\n", "\n")
+        chunk_first_line = first_line
+        first_line += len(lines)
+
+        if '"' in text:
+            # Quoted fields need the csv module, both to read and to write them back
+            rows = [row for row in csv.reader(io.StringIO(text)) if row]
+            lines = [csv_line(row) for row in rows]
+        else:
+            # Plain rows are split directly, which is several times faster
+            lines = [line for line in text.split("\n") if line]
+            rows = [line.split(",") for line in lines]
+
+        # A row with more or fewer fields than the header, e.g. from an unquoted "1,000", is misread
+        widths = list(map(len, rows))
+        if rows and (min(widths) != len(header) or max(widths) != len(header)):
+            for row, line in zip(rows, csv_line_numbers(text, chunk_first_line)):
+                if len(row) != len(header):
+                    sys.exit(f"Line {line}: {len(row)} fields where the header has {len(header)}")
+
+        # A blank amount is missing, and gives an empty result rather than 0
+        amounts = [row[position] or None for row in rows]
+        stamps = [row[stamp_position] for row in rows] if timestamp_column else None
+        try:
+            prices = pricer(stamps)
+        except ValueError:
+            exit_on_bad_timestamp(stamps, csv_line_numbers(text, chunk_first_line))
+            raise
+
+        try:
+            if rounding:
+                results = ["" if text is None else text
+                           for text in convert_exact_strings(amounts, prices, direction, rounding, decimals)]
+            else:
+                converted = convert(float_amounts(amounts), np.asarray(prices, dtype=float), direction)
+                results = list(map(number, converted.tolist()))
+                for row in missing_rows(converted):
+                    results[row] = ""
+        except (ValueError, TypeError):
+            exit_on_bad_amount(amounts, csv_line_numbers(text, chunk_first_line), bool(rounding))
+            raise
+
+        if timestamp_column:
+            # Rows before the first recorded tick have no price, so both their cells stay empty
+            price_cells = prices.tolist()
+            for row in missing_rows(prices):
+                price_cells[row] = ""
+            added = map(priced_suffix, results, price_cells)
+        else:
+            added = map(suffix, results)
+        outfile.write("".join(map(operator.add, lines, added)))
+        total += len(lines)
+    return total
+
+
+def convert_jsonl(infile, outfile, pricer, direction, column, timestamp_column, decimals, chunk_size, rounding=None):
+    """Convert a JSON Lines file, adding a field named after the target currency
+
+    With a timestamp field the price used for each record is added too.
+    Exact results are written as strings, so no digit is lost to a float.
+    Records that could not be priced get null for both, as JSON has no NaN.
+    """
+    target = DIRECTIONS[direction][1].lower()
+
+    total = 0
+    first_line = 1
+    for lines in chunks(infile, chunk_size):
+        line_numbers = [first_line + offset for offset, line in enumerate(lines) if line.strip()]
+        first_line += len(lines)
+        records = []
+        for line, number in zip((line for line in lines if line.strip()), line_numbers):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if not isinstance(record, dict):
+                sys.exit(f"Line {number}: not a JSON object")
+            records.append(record)
+        stamps = [record.get(timestamp_column) for record in records] if timestamp_column else None
+        try:
+            prices = pricer(stamps)
+        except ValueError:
+            exit_on_bad_timestamp(stamps, line_numbers)
+            raise
+
+        # A missing, null or empty amount gives a null result rather than 0
+        amounts = [None if record.get(column) == "" else record.get(column) for record in records]
+        try:
+            if rounding:
+                results = convert_exact_strings(amounts, prices, direction, rounding, decimals)
+            else:
+                converted = convert(float_amounts(amounts), np.asarray(prices, dtype=float),
+                                    direction).round(decimals)
+                results = converted.tolist()
+                for row in missing_rows(converted):
+                    results[row] = None
+        except (ValueError, TypeError):
+            exit_on_bad_amount(amounts, line_numbers, bool(rounding))
+            raise
+
+        for record, value in zip(records, results):
+            record[target] = value
+        if timestamp_column:
+            price_values = prices.tolist()
+            for row in missing_rows(prices):
+                price_values[row] = None
+            for record, price in zip(records, price_values):
+                record["price"] = price
+        outfile.write("".join(json.dumps(record) + "\n" for record in records))
+        total += len(records)
+    return total
+
+
+def detect_format(path, fmt):
+    """Pick csv or jsonl from --format or the file extension"""
+    if fmt:
+        return fmt
+    return "jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert CAD/ADA amounts in bulk")
+    parser.add_argument("input", help="CSV or JSON Lines file of amounts ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="file to write ('-' for stdout, the default)")
+    parser.add_argument("-d", "--direction", choices=list(DIRECTIONS), default=CAD_TO_ADA)
+    parser.add_argument("-c", "--column", default="amount", help="column or field holding the amounts")
+    parser.add_argument("-f", "--format", choices=["csv", "jsonl"], help="input format (default: from the extension)")
+    parser.add_argument("--decimals", type=int, help="decimal places of the results (default: 6 for ADA, 2 for CAD)")
+    parser.add_argument("--chunk-size", type=int, default=65536, help="rows converted per chunk")
+    parser.add_argument("--rounding", choices=list(ROUNDINGS),
+                        help="convert exactly, with no floating point, rounding the results this way")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("-p", "--price", help="price in CAD per ADA to convert at")
+    source.add_argument("--live", action="store_true", help="fetch one live quote before converting")
+    source.add_argument("--as-of", action="store_true",
+                        help="convert each row at the recorded price in effect at its timestamp")
+    parser.add_argument("-t", "--timestamp-column", default="timestamp",
+                        help="column or field holding epoch or ISO 8601 timestamps (with --as-of)")
+    parser.add_argument("--interpolation", choices=INTERPOLATIONS, default=PREVIOUS,
+                        help="how to price timestamps between two ticks (with --as-of)")
+    parser.add_argument("--ticks", help="tick store to read prices from (default: the app's price history)")
+    args = parser.parse_args(argv)
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+    if args.decimals is not None and args.decimals < 0:
+        parser.error("--decimals must not be negative")
+
+    if args.as_of:
+        ticks_path = args.ticks or data_path("ticks.bin")
+        # Opening a store creates it, so a mistyped path would otherwise price nothing
+        if args.ticks and not os.path.exists(ticks_path):
+            sys.exit(f"No tick store at {ticks_path}")
+        if not os.path.exists(ticks_path):
+            sys.exit("The price history is empty: run the app to record some prices first")
+        store = TickStore(ticks_path)
+        if not len(store):
+            sys.exit("The price history is empty: run the app to record some prices first")
+        pricer = AsOfPricer(store, args.interpolation)
+        timestamp_column = args.timestamp_column
+        price_note = f"as of each timestamp ({args.interpolation}, {len(store)} ticks)"
+    else:
+        price, source_name = resolve_price(args)
+        pricer = FixedPricer(price)
+        timestamp_column = None
+        price_note = f"at ${price} CAD per ADA ({source_name})"
+
+    fmt = detect_format(args.input, args.format)
+    decimals = args.decimals
+    if decimals is None:
+        decimals = DEFAULT_DECIMALS[DIRECTIONS[args.direction][1]]
+
+    infile = sys.stdin if args.input == "-" else open(args.input, newline="")
+    outfile = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    completed = False
+    try:
+        start = time.perf_counter()
+        converter = convert_jsonl if fmt == "jsonl" else convert_csv
+        total = converter(infile, outfile, pricer, args.direction, args.column, timestamp_column,
+                          decimals, args.chunk_size, ROUNDINGS.get(args.rounding))
+        elapsed = time.perf_counter() - start
+        completed = True
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+        if outfile is not sys.stdout:
+            outfile.close()
+            if not completed:
+                # A failed run would leave a truncated file that looks like a finished one
+                os.remove(args.output)
+
+    print(f"Converted {total} rows {price_note} "
+          f"in {elapsed:.2f} s ({total / max(elapsed, 1e-9):,.0f} rows/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
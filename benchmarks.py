@@ -0,0 +1,806 @@
+"""Performance benchmarks for the Cardano Converter
+
+Run every benchmark with `python benchmarks.py`, or pick some by name,
+e.g. `python benchmarks.py startup`. The exit status is non-zero when a
+benchmark goes over its budget.
+
+Each stage reports its throughput, latency percentiles and peak memory.
+`--save-baseline` stores them, and later runs fail when a stage's median
+latency, throughput or peak memory is more than `--threshold` percent
+worse than the baseline.
+"""
+import argparse
+from collections import namedtuple
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from app_paths import data_path
+from source_registry import percentile
+
+# Directory of the app, so benchmarks work from any working directory
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Regression allowed against the baseline before a run fails, in percent
+DEFAULT_THRESHOLD = 20
+
+# Peak memory varies more between runs than time does, so it has its own tolerance,
+# and growth smaller than MEMORY_FLOOR bytes is never a regression
+DEFAULT_MEMORY_THRESHOLD = 50
+MEMORY_FLOOR = 256 * 1024
+
+# Times each stage is measured in a row, and rounds of the whole run spread further apart in time;
+# the best measurement is kept, as noise only ever makes a stage slower
+REPEATS = 5
+DEFAULT_ROUNDS = 2
+
+# Shortest time one repeat measures for, in seconds, so stages of a few microseconds
+# are measured over enough calls for a scheduler hiccup not to move their median
+MIN_REPEAT_TIME = 0.1
+
+# Stage timing a fixed workload, which scales the times of the other stages when
+# comparing, so a run on a busier or slower machine is not read as a regression
+CALIBRATION = "calibration"
+
+# Metrics compared with the baseline; tail percentiles are reported but too noisy to gate on
+COMPARED = ("per_second", "p50", "peak")
+
+# Metrics of this run by stage, as {stage: {metric: value}}
+METRICS = {}
+
+# Timings of one stage: items per second, latency percentiles in seconds and peak memory in bytes
+Timing = namedtuple("Timing", ["runs", "per_second", "p50", "p95", "p99", "peak"])
+
+
+def summarize(timings, items=1, peak=0):
+    """Turn the durations of some runs into a Timing, counting items processed per run"""
+    return Timing(len(timings), len(timings) * items / max(sum(timings), 1e-12),
+                  percentile(timings, 0.5), percentile(timings, 0.95), percentile(timings, 0.99), peak)
+
+
+def time_calls(function, runs, items=1, warmup=1, repeats=REPEATS, settle=None):
+    """Time at least runs calls of function, repeats times, then trace one more call for its peak memory
+
+    Throughput, median latency and peak memory are the best of the repeats,
+    and the tail percentiles come from every call. settle is called before
+    and after the traced call, to wait for work the function leaves running
+    in the background, so the peak always covers the same work.
+    """
+    import tracemalloc
+
+    for _ in range(warmup):
+        function()
+    summaries = []
+    peaks = []
+    all_timings = []
+    for _ in range(repeats):
+        timings = []
+        started = time.perf_counter()
+        while len(timings) < runs or time.perf_counter() - started < MIN_REPEAT_TIME:
+            began = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - began)
+        summaries.append(summarize(timings, items))
+        all_timings.extend(timings)
+
+        if settle is not None:
+            settle()
+        tracemalloc.start()
+        function()
+        if settle is not None:
+            settle()
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    pooled = summarize(all_timings, items)
+    return pooled._replace(per_second=max(summary.per_second for summary in summaries),
+                           p50=min(summary.p50 for summary in summaries), peak=min(peaks))
+
+
+def record(stage, timing):
+    """Keep a stage's timing for the baseline comparison, the best of every round it ran in"""
+    values = timing._asdict()
+    kept = METRICS.get(stage)
+    if kept:
+        values["per_second"] = max(values["per_second"], kept["per_second"])
+        for metric in ("p50", "p95", "p99", "peak"):
+            values[metric] = min(values[metric], kept[metric])
+    METRICS[stage] = values
+
+
+def reference_work():
+    """A fixed mix of the arithmetic, string and dict work the stages do"""
+    totals = {}
+    for i in range(5000):
+        key = f"{i % 97:02d}"
+        totals[key] = totals.get(key, 0) + i * i / 7
+    return sorted(totals.items())
+
+
+def calibrate():
+    """Time reference_work, recording how fast this machine is right now"""
+    record(CALIBRATION, time_calls(reference_work, 20))
+
+
+def describe(timing, unit="calls"):
+    """Format a timing as throughput, percentiles and peak memory"""
+    text = (f"{timing.per_second:,.0f} {unit}/s, p50 {timing.p50 * 1000:.3f} ms, "
+            f"p95 {timing.p95 * 1000:.3f} ms, p99 {timing.p99 * 1000:.3f} ms")
+    if timing.peak:
+        text += f", peak {timing.peak / 1e6:.2f} MB"
+    return text
+
+
+def compare(baseline, metrics, threshold, memory_threshold=DEFAULT_MEMORY_THRESHOLD):
+    """List (stage, metric, baseline, current, change) for everything worse than its threshold percent
+
+    Times are scaled by the calibration stage first, so current is what the
+    run would have measured on the machine as fast as it was for the baseline.
+    """
+    regressions = []
+    # How much slower the machine is than when the baseline was saved
+    slowdown = 1.0
+    if baseline.get(CALIBRATION, {}).get("p50") and metrics.get(CALIBRATION, {}).get("p50"):
+        slowdown = metrics[CALIBRATION]["p50"] / baseline[CALIBRATION]["p50"]
+
+    for stage, values in metrics.items():
+        if stage == CALIBRATION:
+            continue
+        saved = baseline.get(stage, {})
+        for metric in COMPARED:
+            before, now = saved.get(metric), values.get(metric)
+            if not before or now is None:
+                continue
+            if metric == "per_second":
+                now *= slowdown
+            elif metric != "peak":
+                now /= slowdown
+            # Throughput should not fall, everything else should not rise
+            change = (before - now) / before if metric == "per_second" else (now - before) / before
+            if metric == "peak":
+                if change * 100 > memory_threshold and now - before > MEMORY_FLOOR:
+                    regressions.append((stage, metric, before, now, change))
+            elif change * 100 > threshold:
+                regressions.append((stage, metric, before, now, change))
+    return regressions
+
+
+def load_baseline(path):
+    """Read saved metrics, or an empty dict when there is no baseline yet"""
+    try:
+        with open(path, "r") as f:
+            return json.load(f).get("metrics", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_baseline(path, metrics):
+    """Store metrics as the baseline, keeping saved stages that were not run this time"""
+    merged = load_baseline(path)
+    merged.update(metrics)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump({"saved": time.time(), "python": sys.version.split()[0], "metrics": merged}, f, indent=2)
+    os.replace(temp_path, path)
+
+# Time budget from interpreter start to the first painted frame, in seconds
+STARTUP_BUDGET = 1.0
+
+# Imports that must stay out of the startup path
+DEFERRED_IMPORTS = ("matplotlib", "bs4", "requests", "PIL")
+
+# Deferred imports that a library the window needs loads by itself, so the app cannot
+# keep them out: customtkinter imports PIL for its images. They are reported rather
+# than failed on, but only while the library alone is confirmed to load them
+DEPENDENCY_IMPORTS = {"PIL": "customtkinter"}
+
+# Measures startup in a fresh interpreter so no import is already cached
+STARTUP_SCRIPT = r'''
+import json
+import sys
+import time
+
+start = time.perf_counter()
+import tkinter as tk
+import cardano_converter
+
+
+class QuietConverter(cardano_converter.CardanoConverter):
+    """Converter that never fetches, so only startup is measured"""
+
+    def start_price_thread(self):
+        pass
+
+
+try:
+    root = tk.Tk()
+except tk.TclError as e:
+    print(json.dumps({"skipped": str(e)}))
+    sys.exit(0)
+
+app = QuietConverter(root)
+root.update()
+elapsed = time.perf_counter() - start
+
+loaded = [name for name in %r if name in sys.modules]
+print(json.dumps({"seconds": elapsed, "loaded": loaded}))
+root.destroy()
+''' % (DEFERRED_IMPORTS,)
+
+
+def loaded_by_dependency(name):
+    """Check whether the library DEPENDENCY_IMPORTS names for a module imports it by itself"""
+    dependency = DEPENDENCY_IMPORTS.get(name)
+    if dependency is None:
+        return False
+    script = f"import sys, {dependency}; print({name!r} in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True).stdout
+    return output.strip() == "True"
+
+
+def bench_startup(runs=5):
+    """Time from a cold interpreter to the first frame of the main window"""
+    from image_assets import scaled_image, LOGO, LOGO_SIZE
+
+    # Only the first launch renders the scaled logo, so measure the launches after it
+    scaled_image(os.path.join(APP_DIR, LOGO), LOGO_SIZE)
+    timings = []
+    for _ in range(runs):
+        process = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT],
+            cwd=APP_DIR,
+            capture_output=True,
+            text=True
+        )
+        if process.returncode:
+            # e.g. customtkinter missing: report it like any other failed benchmark
+            error = process.stderr.strip().splitlines()
+            print(f"startup: FAIL, the app exited with code {process.returncode}"
+                  f"{': ' + error[-1] if error else ''}")
+            return False
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+
+        if "skipped" in result:
+            print(f"startup: skipped, no display ({result['skipped']})")
+            return True
+        loaded = [name for name in result["loaded"] if not loaded_by_dependency(name)]
+        if loaded:
+            print(f"startup: FAIL, deferred modules imported at startup: {', '.join(loaded)}")
+            return False
+        timings.append(result["seconds"])
+
+    for name in result["loaded"]:
+        print(f"startup: note, {name} is loaded at startup by {DEPENDENCY_IMPORTS[name]}, "
+              f"which the app cannot defer")
+
+    record("startup", summarize(timings))
+    median = statistics.median(timings)
+    passed = median <= STARTUP_BUDGET
+    print(f"startup: median {median * 1000:.1f} ms, best {min(timings) * 1000:.1f} ms "
+          f"over {runs} runs (budget {STARTUP_BUDGET * 1000:.0f} ms) {'ok' if passed else 'FAIL'}")
+    return passed
+
+
+def legacy_chart_redraw(times, prices):
+    """The old create_price_chart: a new figure, plot and canvas on every tick"""
+    from datetime import datetime
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=(4, 3), dpi=100)
+    fig.patch.set_facecolor('#FFFFFF')
+    plot = fig.add_subplot(111)
+
+    x_values = list(range(len(prices)))
+    plot.plot(x_values, prices, color="#007AFF", linewidth=2)
+    plot.fill_between(x_values, prices, color="#5AC8FA", alpha=0.2)
+
+    step_size = max(1, len(times) // 5)
+    indices = list(range(0, len(times), step_size))
+    if len(times) - 1 not in indices:
+        indices.append(len(times) - 1)
+    labels = [datetime.strptime(times[i], '%Y/%m/%d %I:%M:%S %p').strftime('%H:%M') for i in indices]
+    plot.set_xticks(indices)
+    plot.set_xticklabels(labels)
+
+    plot.spines['top'].set_visible(False)
+    plot.spines['right'].set_visible(False)
+    plot.tick_params(axis='both', colors='#1D1D1F', labelsize=8)
+    plot.grid(axis='y', linestyle='--', alpha=0.3)
+    plot.set_title('ADA Price (CAD)', fontsize=10, color='#1D1D1F')
+    plot.set_ylim(max(0, min(prices) * 0.9), max(prices) * 1.1)
+
+    FigureCanvasAgg(fig).draw()
+
+
+def bench_chart(ticks=200, window=24):
+    """Cost of one chart update: rebuilding the figure versus updating it in place"""
+    import math
+    from datetime import datetime
+    from price_chart import PriceChart
+
+    start = time.time()
+    timestamps = [start + 30 * i for i in range(ticks + window)]
+    prices = [0.7 + 0.02 * math.sin(i / 15) for i in range(ticks + window)]
+    labels = [datetime.fromtimestamp(t).strftime('%Y/%m/%d %I:%M:%S %p') for t in timestamps]
+
+    def run(update):
+        position = [0]
+
+        def tick():
+            i = position[0] % ticks
+            position[0] += 1
+            update(i, i + window)
+        return time_calls(tick, ticks, warmup=0)
+
+    legacy = run(lambda a, b: legacy_chart_redraw(labels[a:b], prices[a:b]))
+    chart = PriceChart()
+    incremental = run(lambda a, b: chart.update(timestamps[a:b], prices[a:b]))
+    record("chart", incremental)
+
+    passed = incremental.p50 <= legacy.p50
+    print(f"chart: rebuild {legacy.p50 * 1000:.2f} ms/tick, in place {describe(incremental, 'ticks')} "
+          f"({legacy.p50 / incremental.p50:.1f}x) {'ok' if passed else 'FAIL'}")
+    return passed
+
+
+# Saved pages the price extractors are benchmarked on, with the extractor for each
+EXTRACT_FIXTURES = (
+    ("google_converter.html", "google"),
+    ("google_results.html", "google"),
+    ("coingecko_cardano.html", "coingecko"),
+)
+
+
+def legacy_google_price(html):
+    """The old get_price_from_google parse: a full BeautifulSoup tree and find_all scans"""
+    import re
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+
+    price_element = soup.find("div", attrs={'class': 'BNeawe iBp4i AP7Wnd'})
+    if price_element:
+        text = price_element.find("div", attrs={'class': 'BNeawe iBp4i AP7Wnd'})
+        if text:
+            match = re.search(r'\d+\.\d+', text.text)
+            if match:
+                return match.group(0)
+
+    price_element = soup.select_one(".DFlfde.SwHCTb")
+    if price_element:
+        return price_element.text
+
+    for div in soup.find_all('div'):
+        if div.text and 'CAD' in div.text and '$' in div.text:
+            match = re.search(r'\$(\d+\.\d+)', div.text)
+            if match:
+                return match.group(1)
+    return None
+
+
+def legacy_coingecko_price(html):
+    """The old get_price_from_coingecko parse"""
+    import re
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    for span in soup.find_all('span'):
+        if 'C$' in span.text:
+            match = re.search(r'C\$(\d+\.\d+)', span.text)
+            if match:
+                return match.group(1)
+    return None
+
+
+def bench_extract(runs=20):
+    """Time and peak memory of pulling the price out of saved pages, old parse versus streaming extraction"""
+    from html_extract import extract_google_price, extract_coingecko_price
+
+    extractors = {
+        "google": (legacy_google_price, extract_google_price),
+        "coingecko": (legacy_coingecko_price, extract_coingecko_price),
+    }
+    try:
+        import bs4  # noqa: F401
+    except ImportError:
+        print("extract: skipped, beautifulsoup4 is not installed to compare against")
+        return True
+
+    passed = True
+    for filename, site in EXTRACT_FIXTURES:
+        with open(os.path.join(APP_DIR, "fixtures", filename), "rb") as f:
+            content = f.read()
+        legacy, extract = extractors[site]
+
+        expected = legacy(content.decode("utf-8"))
+        result = extract(content)
+        old = time_calls(lambda: legacy(content.decode("utf-8")), runs)
+        new = time_calls(lambda: extract(content), runs)
+        record(f"extract.{filename}", new)
+
+        ok = result == expected and new.p50 <= old.p50
+        passed = passed and ok
+        print(f"extract {filename}: price {result} (old parse {expected}), "
+              f"old {old.p50 * 1000:.2f} ms / {old.peak / 1e6:.1f} MB, "
+              f"new {describe(new, 'pages')} ({old.p50 / new.p50:.0f}x) {'ok' if ok else 'FAIL'}")
+    return passed
+
+
+# Tail latency budget of the quote server under load, in seconds
+SERVER_P99_BUDGET = 0.25
+
+
+# Saved responses served by the stand-in upstream for each path, with their content type
+STANDIN_ROUTES = {
+    "/search": ("google_converter.html", "text/html; charset=utf-8"),
+    "/en/coins/cardano": ("coingecko_cardano.html", "text/html; charset=utf-8"),
+    "/api/v3/coins/markets": ("coingecko_markets.json", "application/json"),
+    "/api/v3/simple/price": ("coingecko_simple_price.json", "application/json"),
+}
+
+
+def start_standin_upstream(delay=0.05):
+    """Serve the saved Google and CoinGecko responses on a local port, counting the requests
+
+    Any path not in STANDIN_ROUTES gets the /simple/price response. Returns
+    the server and a list that gains one item per upstream request.
+    """
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    from urllib.parse import urlsplit
+
+    hits = []
+    responses = {}
+    for path, (filename, content_type) in STANDIN_ROUTES.items():
+        with open(os.path.join(APP_DIR, "fixtures", filename), "rb") as f:
+            responses[path] = (f.read(), content_type)
+
+    class StandinHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes, which Nagle would hold back for a delayed ACK
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            hits.append(self.path)
+            time.sleep(delay)
+            body, content_type = responses.get(urlsplit(self.path).path, responses["/api/v3/simple/price"])
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    upstream = ThreadingHTTPServer(("127.0.0.1", 0), StandinHandler)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    return upstream, hits
+
+
+class StandinTransport:
+    """Sends every request to the stand-in upstream instead of the real host"""
+
+    def __init__(self, transport, base_url):
+        self.transport = transport
+        self.base_url = base_url
+
+    def get(self, url, **kw):
+        from urllib.parse import urlsplit
+        parts = urlsplit(url)
+        return self.transport.get(f"{self.base_url}{parts.path}?{parts.query}", **kw)
+
+
+def bench_fetch(runs=100):
+    """Throughput and latency of each price source, and of the hedged fetch, against the stand-in upstream"""
+    import market_stats
+    import price_sources
+    from http_transport import HttpTransport
+    from price_fetcher import PriceFetcher, is_valid_price
+    from quote_matrix import QuoteMatrix
+
+    upstream, hits = start_standin_upstream(delay=0)
+    transport = StandinTransport(HttpTransport(retries=0), f"http://127.0.0.1:{upstream.server_address[1]}")
+    matrix = QuoteMatrix(transport=transport)
+
+    sources = [
+        ("google", lambda: price_sources.get_price_from_google(transport)),
+        ("coingecko_api", lambda: price_sources.get_price_from_api(matrix)),
+        ("coingecko_web", lambda: price_sources.get_price_from_coingecko(transport)),
+        ("markets", lambda: str(market_stats.fetch_market_stats(transport).price)),
+    ]
+    fetcher = PriceFetcher(sources)
+    stages = sources + [("hedged", lambda: fetcher.fetch().price)]
+
+    passed = True
+    for name, fetch in stages:
+        ok = is_valid_price(fetch())
+        # The hedged fetch leaves the losing sources running, so let them finish around the memory trace
+        timing = time_calls(fetch, runs, settle=fetcher.wait_idle if name == "hedged" else None)
+        record(f"fetch.{name}", timing)
+        passed = passed and ok
+        print(f"fetch {name}: {describe(timing, 'fetches')} {'ok' if ok else 'FAIL, no valid price'}")
+
+    fetcher.shutdown()
+    upstream.shutdown()
+    return passed
+
+
+# Refresh ticks per second the replayed pipeline has to sustain
+REPLAY_TICKS_BUDGET = 1000
+
+
+def bench_replay(ticks=5000):
+    """Ticks per second of the refresh pipeline replaying the fixtures archive as fast as possible
+
+    Runs what the refresh loop does for each quote, short of drawing it: a
+    hedged fetch over the registered sources, the cache and scheduler
+    updates, the market stats, and both events through the UI queue.
+    """
+    import tempfile
+    import market_stats
+    import price_sources
+    from poll_scheduler import AdaptivePollScheduler
+    from price_cache import PriceCache
+    from price_fetcher import PriceFetcher
+    from quote_matrix import QuoteMatrix
+    from replay_transport import ReplayTransport, archive_from_fixtures
+    from source_registry import SourceRegistry
+    from ui_queue import UiUpdateQueue, QuoteEvent, StatsEvent
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "fixtures.jsonl.gz")
+        archive_from_fixtures(path)
+        transport = ReplayTransport(path, speed=0)
+
+    matrix = QuoteMatrix(ttl=0, transport=transport)
+    registry = SourceRegistry([
+        ("google", lambda: price_sources.get_price_from_google(transport)),
+        ("coingecko_api", lambda: price_sources.get_price_from_api(matrix)),
+        ("coingecko_web", lambda: price_sources.get_price_from_coingecko(transport)),
+    ])
+    fetcher = PriceFetcher(registry, hedge_delay=0.75)
+    cache = PriceCache(ttl=0)
+    scheduler = AdaptivePollScheduler(base_interval=30)
+    transport.add_listener(scheduler.observe_response)
+    feed = market_stats.MarketFeed(fetch=lambda: market_stats.fetch_market_stats(transport), ttl=0)
+    shown = []
+    ui_queue = UiUpdateQueue(root=None)
+    ui_queue.register(QuoteEvent, lambda events: shown.append(events[-1].price))
+    ui_queue.register(StatsEvent, lambda events: None)
+
+    def tick():
+        result = fetcher.fetch()
+        cache.put("ADA-CAD", result.price)
+        scheduler.record_price(result.price)
+        ui_queue.put(QuoteEvent(result.price, result.source, time.time()))
+        stats = feed.get()
+        ui_queue.put(StatsEvent(stats.market_cap, stats.volume, stats.supply, stats.max_supply, stats.change_24h))
+        ui_queue.drain()
+
+    timing = time_calls(tick, ticks)
+    record("replay.refresh", timing)
+    fetcher.shutdown()
+
+    passed = timing.per_second >= REPLAY_TICKS_BUDGET and len(set(shown)) == 1 and shown[0] is not None
+    print(f"replay refresh: {describe(timing, 'ticks')} (budget {REPLAY_TICKS_BUDGET} ticks/s) "
+          f"{'ok' if passed else 'FAIL'}")
+    return passed
+
+
+def bench_convert(size=1_000_000, runs=2000):
+    """Scalar exact conversions, and batched exact and float conversions of a large array"""
+    import numpy as np
+    from conversion import convert, convert_exact, convert_units, CAD_TO_ADA, PLACES
+
+    price = "0.912345"
+    cents = np.random.default_rng(1).integers(0, 10 ** 9, size=size)
+
+    exact = time_calls(lambda: convert_exact("1234.56", price, CAD_TO_ADA), runs)
+    batched = time_calls(lambda: convert_units(cents, price, CAD_TO_ADA), 10, items=size)
+    floats = time_calls(lambda: convert(cents / 100, float(price), CAD_TO_ADA), 10, items=size)
+    record("convert.exact", exact)
+    record("convert.units", batched)
+    record("convert.float", floats)
+
+    # The batched path has to agree with the scalar one to the lovelace
+    sample = cents[:1000]
+    lovelace = convert_units(sample, price, CAD_TO_ADA).tolist()
+    scale = 10 ** PLACES["ADA"]
+    passed = all(convert_exact(f"{cent / 100:.2f}", price, CAD_TO_ADA) * scale == value
+                 for cent, value in zip(sample.tolist(), lovelace))
+    # Amounts past the 28 significant digits of the default Decimal context stay exact
+    large = convert_exact("123456789012345678901234567890.12", "0.5", CAD_TO_ADA)
+    exact_large = str(large) == "246913578024691357802469135780.240000"
+
+    print(f"convert exact: {describe(exact, 'conversions')}")
+    print(f"convert batched exact: {describe(batched, 'rows')}")
+    print(f"convert batched float: {describe(floats, 'rows')} "
+          f"{'ok' if passed else 'FAIL, batched results differ from scalar ones'}")
+    print(f"convert exact large amount: {'ok' if exact_large else f'FAIL, got {large}'}")
+    return passed and exact_large
+
+
+def bench_server(clients=200, requests_per_client=50):
+    """Requests per second and tail latency of the quote server, with many clients sharing one upstream"""
+    import asyncio
+    from http_transport import HttpTransport
+    from poll_scheduler import AdaptivePollScheduler
+    from price_fetcher import PriceFetcher
+    from quote_matrix import QuoteMatrix
+    from quote_server import QuoteServer
+
+    upstream, hits = start_standin_upstream()
+    upstream_url = f"http://127.0.0.1:{upstream.server_address[1]}/simple/price"
+    transport = HttpTransport(retries=0)
+
+    def standin_price():
+        return str(transport.get(upstream_url, preset='json').json()["cardano"]["cad"])
+
+    fetcher = PriceFetcher([("standin", standin_price)])
+    matrix = QuoteMatrix(fetch=lambda urls: transport.get(upstream_url, preset='json').json())
+    scheduler = AdaptivePollScheduler(base_interval=1, min_interval=1, jitter=0, idle_after=0)
+    server = QuoteServer(fetcher, matrix, scheduler, port=0)
+    threading.Thread(target=asyncio.run, args=(server.serve(),), daemon=True).start()
+    server.ready.wait()
+
+    # Wait for the first quote, so the run measures serving rather than warm-up
+    while server.cache.peek() is None or matrix.cache.peek(matrix.KEY) is None:
+        time.sleep(0.01)
+
+    batch = json.dumps({"amounts": [1.5] * 100, "direction": "ada-to-cad"}).encode()
+    requests = [
+        b"GET /quote HTTP/1.1\r\nHost: bench\r\n\r\n",
+        b"GET /quote?pair=BTC/USD HTTP/1.1\r\nHost: bench\r\n\r\n",
+        b"GET /convert?amount=100&direction=cad-to-ada HTTP/1.1\r\nHost: bench\r\n\r\n",
+        b"POST /convert HTTP/1.1\r\nHost: bench\r\nContent-Length: %d\r\n\r\n%s" % (len(batch), batch),
+    ]
+
+    async def client(number, latencies, failures):
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        for i in range(requests_per_client):
+            began = time.perf_counter()
+            writer.write(requests[(number + i) % len(requests)])
+            status = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line == b"\r\n":
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - began)
+            if b" 200 " not in status:
+                failures.append(status)
+        writer.close()
+
+    async def run():
+        latencies, failures = [], []
+        await asyncio.gather(*(client(number, latencies, failures) for number in range(clients)))
+        return latencies, failures
+
+    upstream_before = len(hits)
+    began = time.perf_counter()
+    latencies, failures = asyncio.run(run())
+    elapsed = time.perf_counter() - began
+    upstream_calls = len(hits) - upstream_before
+
+    server.stop()
+    fetcher.shutdown()
+    upstream.shutdown()
+
+    timing = summarize(latencies)._replace(per_second=len(latencies) / elapsed)
+    record("server", timing)
+    p50, p99 = timing.p50, timing.p99
+    passed = not failures and p99 <= SERVER_P99_BUDGET
+    print(f"server: {len(latencies) / elapsed:,.0f} requests/s from {clients} clients, "
+          f"p50 {p50 * 1000:.2f} ms, p99 {p99 * 1000:.2f} ms (budget {SERVER_P99_BUDGET * 1000:.0f} ms), "
+          f"{len(failures)} failed, {upstream_calls} upstream calls for {len(latencies)} requests "
+          f"{'ok' if passed else 'FAIL'}")
+    return passed
+
+
+# Longest gap in streamed quotes allowed across a dropped connection, in seconds
+STREAM_GAP_BUDGET = 1.0
+
+
+def bench_stream(seconds=3.0, interval=0.02, drop_after=40):
+    """Ticks delivered and the longest gap across reconnects, streaming from the mock ticker"""
+    import asyncio
+    from mock_ticker import MockTicker
+    from price_stream import PriceStream
+
+    results = []
+    for kind in ("websocket", "sse"):
+        ticker = MockTicker(interval=interval, drop_after=drop_after).start()
+        arrivals = []
+        stream = PriceStream(lambda price, timestamp: arrivals.append(time.perf_counter()),
+                             url=ticker.websocket_url if kind == "websocket" else ticker.events_url,
+                             kind=kind, min_interval=0, min_backoff=0.05)
+        if not stream.is_available():
+            print("stream: skipped, aiohttp is not installed")
+            ticker.stop()
+            return True
+
+        async def run():
+            task = asyncio.ensure_future(stream.run())
+            await asyncio.sleep(seconds)
+            stream.stop()
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+        asyncio.run(run())
+        ticker.stop()
+
+        gap = max(later - earlier for earlier, later in zip(arrivals, arrivals[1:])) if len(arrivals) > 1 else seconds
+        passed = stream.reconnects > 0 and len(arrivals) >= ticker.sent - ticker.connections and gap <= STREAM_GAP_BUDGET
+        print(f"stream ({kind}): {len(arrivals)} of {ticker.sent} ticks over {ticker.connections} connections, "
+              f"longest gap {gap * 1000:.0f} ms (budget {STREAM_GAP_BUDGET * 1000:.0f} ms) "
+              f"{'ok' if passed else 'FAIL'}")
+        results.append(passed)
+    return all(results)
+
+
+BENCHMARKS = {
+    "startup": bench_startup,
+    "fetch": bench_fetch,
+    "replay": bench_replay,
+    "convert": bench_convert,
+    "chart": bench_chart,
+    "extract": bench_extract,
+    "server": bench_server,
+    "stream": bench_stream,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Cardano Converter benchmarks")
+    parser.add_argument("names", nargs="*",
+                        help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--baseline", help="baseline file (default: benchmark_baseline.json in the data directory)")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run's results as the baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"percent a stage may regress against the baseline (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--memory-threshold", type=float, default=DEFAULT_MEMORY_THRESHOLD,
+                        help=f"percent a stage's peak memory may grow (default: {DEFAULT_MEMORY_THRESHOLD})")
+    parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS,
+                        help=f"times to run the benchmarks, keeping each stage's best (default: {DEFAULT_ROUNDS})")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+
+    # A benchmark passes when it keeps to its budgets in any round
+    passes = {name: False for name in args.names or BENCHMARKS}
+    for round_number in range(args.rounds):
+        if args.rounds > 1:
+            print(f"Round {round_number + 1} of {args.rounds}")
+        calibrate()
+        for name in passes:
+            passes[name] = BENCHMARKS[name]() or passes[name]
+    results = list(passes.values())
+
+    path = args.baseline or data_path("benchmark_baseline.json")
+    if args.save_baseline:
+        save_baseline(path, METRICS)
+        print(f"Saved the baseline of {len(METRICS)} stages to {path}")
+    else:
+        baseline = load_baseline(path)
+        regressions = compare(baseline, METRICS, args.threshold, args.memory_threshold)
+        for stage, metric, before, now, change in regressions:
+            print(f"REGRESSION {stage} {metric}: {before:.6g} -> {now:.6g} ({change:+.0%} worse)")
+        if baseline:
+            print(f"{len(regressions)} regressions over {args.threshold:g}% "
+                  f"({args.memory_threshold:g}% for memory) against {path}")
+        results.append(not regressions)
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
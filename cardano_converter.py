@@ -1,42 +1,52 @@
 import tkinter as tk
-from tkinter import ttk
-import requests
-from bs4 import BeautifulSoup
 from datetime import datetime
 import threading
 import time
-from PIL import Image, ImageTk
+import argparse
 import os
-import io
-import sys
 import webbrowser
-import json
-import re
 import customtkinter as ctk
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import matplotlib.pyplot as plt
-import random
+from price_fetcher import PriceFetcher
+from source_registry import SourceRegistry
+from market_stats import MarketFeed, load_fixture_stats
+from quote_matrix import QuoteMatrix, load_fixture_prices
+import price_sources
+import market_stats
+from http_transport import get_transport
+from price_cache import PriceCache, DEFAULT_QUOTE
+from last_quote import load_last_quote, save_last_quote
+from ui_queue import UiUpdateQueue, QuoteEvent, StatsEvent
+from price_history import PriceHistory
+from tick_store import TickStore
+from app_paths import data_path
+from conversion import convert_exact, to_decimal, CAD_TO_ADA, ADA_TO_CAD
+from poll_scheduler import AdaptivePollScheduler
+from metrics import get_metrics
+from quote_broker import get_broker
+from image_assets import photo_image, LOGO, LOGO_SIZE
 
 # Set customtkinter appearance
 ctk.set_appearance_mode("light")  # Modes: "System" (standard), "Dark", "Light"
 ctk.set_default_color_theme("blue")  # Themes: "blue" (standard), "green", "dark-blue"
 
+# Points of price history the chart shows: a day at the base 30 second poll interval
+HISTORY_SIZE = 2880
+
 class CardanoConverter:
-    def __init__(self, root):
+    def __init__(self, root, fast_start=True, history_size=HISTORY_SIZE, use_asyncio=False, stream_url=None):
         # Root window configuration
         self.root = root
+        self.fast_start = fast_start
         self.root.title("Cardano Converter")
         self.root.geometry("900x980")
         self.root.configure(bg="#f5f5f7")
         self.root.resizable(False, False)
         
-        # Set app icon if available
+        # Set app icon if available, from the same pre-scaled logo the header shows
         try:
-            self.icon = Image.open("ada_logo.png")
-            self.icon = ImageTk.PhotoImage(self.icon)
+            self.icon = photo_image(LOGO, LOGO_SIZE, master=self.root)
             self.root.iconphoto(True, self.icon)
-        except:
+        except Exception:
             pass
 
         # Colors - Apple inspired
@@ -51,23 +61,151 @@ class CardanoConverter:
         # Counter for conversions
         self.count = 0
         
-        # Historical price data for chart
-        self.price_history = []
-        self.time_history = []
+        # Historical price data for chart, as (epoch timestamp, price) pairs
+        # Keep the last HISTORY_SIZE points by default, which is far more than the chart is wide,
+        # so it is drawn from the pre-aggregated pyramid once enough ticks are recorded
+        self.price_history = PriceHistory(capacity=history_size)
+        
+        # Every fetched tick is also kept on disk, so restarts resume the full history
+        self.tick_store = self.open_tick_store()
+        if self.tick_store:
+            for timestamp, price in zip(*self.tick_store.tail(history_size)):
+                self.price_history.append(timestamp, price)
+        self.price_chart = None
+        self.price_pyramid = None
         
         # Create custom fonts
         self.create_fonts()
         
         # Current price storage
         self.current_price = "0.00"
+        self.price_source = None
+        
+        # Pooled HTTP sessions shared by every price source
+        self.transport = get_transport()
+        
+        # Asyncio loop stepped by Tk, when polling with the async engine, and the
+        # worker that writes each quote's files so the loop never waits on the disk
+        self.loop_driver = None
+        self.io_executor = None
+        
+        # Market stats, fetched in the same request as the CoinGecko API price
+        offline = bool(os.environ.get("CARDANO_CONVERTER_OFFLINE"))
+        self.market_feed = MarketFeed(fetch=load_fixture_stats if offline else self.fetch_market_stats)
+        
+        # ADA and other assets in several currencies, all from one batched /simple/price request.
+        # It is separate from the price and stats request above, which needs /coins/markets for
+        # the supply figures, so the other currencies cost one more request per refresh
+        self.quote_matrix = QuoteMatrix(ttl=120, fetch=load_fixture_prices if offline else None,
+                                        transport=self.transport)
+        
+        # Price sources with their health stats and circuit breakers
+        if use_asyncio:
+            sources = self.create_async_sources(offline)
+        elif offline:
+            # Serve the price and stats from the saved fixture, without touching the network
+            sources = [("fixture", self.market_feed.fetch_price)]
+        else:
+            sources = [
+                ("google", self.get_price_from_google),
+                ("coingecko_api", self.get_price_from_api),
+                ("coingecko_web", self.get_price_from_coingecko),
+            ]
+        self.source_registry = SourceRegistry(sources)
+        
+        # Fetch engine that tries the fastest healthy source first and hedges with the rest
+        if use_asyncio:
+            from async_fetch import AsyncPriceFetcher
+            self.price_fetcher = AsyncPriceFetcher(self.source_registry, hedge_delay=0.75)
+        else:
+            self.price_fetcher = PriceFetcher(self.source_registry, hedge_delay=0.75)
+        
+        # Quote cache shared by the refresh loop and the conversion buttons
+        self.price_cache = PriceCache(ttl=30)
+        
+        # Poll interval that adapts to volatility, failures and rate limits
+        self.poll_scheduler = AdaptivePollScheduler(base_interval=30)
+        self.transport.add_listener(self.poll_scheduler.observe_response)
+        
+        # Quote slot shared with the other instances on the machine, so only one of them polls;
+        # offline and replayed quotes are not real, so they are kept to this instance
+        replaying = bool(os.environ.get("CARDANO_CONVERTER_REPLAY"))
+        self.quote_broker = None if offline or replaying else get_broker()
+        
+        # Offline and replayed quotes are not real, so they stay out of the saved quote and history
+        self.simulated = offline or replaying
+        self.shared_timestamp = None
+        
+        # Prices pushed by a streaming ticker, with polling as the fallback while it is down
+        self.price_stream = None
+        if stream_url and not offline:
+            from price_stream import PriceStream
+            self.price_stream = PriceStream(self.on_stream_tick, url=stream_url,
+                                            kind="sse" if stream_url.startswith("http") else "websocket",
+                                            on_state=self.on_stream_state, min_interval=5)
+        
+        # In fast-start mode show the last persisted quote until the first fetch lands
+        self.last_quote = load_last_quote() if fast_start else None
+        if self.last_quote:
+            self.current_price = self.last_quote["price"]
         
         # Build the UI
         self.create_ui()
         
-        # Start price update thread
-        self.update_price()
+        # Worker threads hand their results to the UI thread through this queue
+        self.ui_queue = UiUpdateQueue(self.root)
+        self.ui_queue.register(QuoteEvent, self.update_price)
+        self.ui_queue.register(StatsEvent, self.update_stats)
+        self.ui_queue.start()
+        
+        # Pause polling while the window is minimised or the user is away
+        self.root.bind("<Unmap>", self.on_window_unmap, add="+")
+        self.root.bind("<Map>", self.on_window_map, add="+")
+        for sequence in ("<Motion>", "<KeyPress>", "<ButtonPress>"):
+            self.root.bind_all(sequence, self.on_user_activity, add="+")
+        
+        # Draw the resumed history once the window is up
+        if len(self.price_history) >= 2:
+            self.root.after(200, self.create_price_chart)
+        
+        # Start price update thread, which does the first fetch
+        self.first_quote = threading.Event()
         self.start_price_thread()
+        self.start_price_stream()
+        
+        # Without fast start, wait for the first quote before showing the window
+        if not fast_start:
+            if self.loop_driver is not None:
+                # Tk is not stepping the loop yet, so step it here
+                self.loop_driver.run_until(self.first_quote.is_set, self.price_fetcher.timeout)
+            else:
+                self.first_quote.wait(timeout=self.price_fetcher.timeout)
+            self.ui_queue.drain()
 
+    def create_async_sources(self, offline):
+        """Set up the asyncio loop stepped by Tk, and the async price sources it runs"""
+        # Imported here so the threaded default does not pay for asyncio at startup
+        from async_fetch import (AsyncTransport, TkLoopDriver, run_in_executor,
+                                 async_price_from_google, async_price_from_markets,
+                                 async_price_from_coingecko)
+        
+        from concurrent.futures import ThreadPoolExecutor
+        self.loop_driver = TkLoopDriver(self.root)
+        self.loop_driver.start()
+        # One worker, so quotes are written in the order they came in
+        self.io_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="quote-io")
+        self.async_transport = AsyncTransport(sync_transport=self.transport)
+        self.async_transport.add_listener(self.poll_scheduler.observe_response)
+        
+        if offline:
+            return [("fixture", run_in_executor(self.market_feed.fetch_price))]
+        transport = self.async_transport
+        return [
+            ("google", lambda: async_price_from_google(transport)),
+            ("coingecko_api", lambda: async_price_from_markets(transport, self.market_feed)),
+            ("coingecko_web", lambda: async_price_from_coingecko(transport)),
+        ]
+    
     def create_fonts(self):
         """Create custom fonts for the application"""
         # Use CTkFont for customtkinter compatibility
@@ -117,9 +255,7 @@ class CardanoConverter:
         
         # Logo
         try:
-            logo_img = Image.open("ada_logo.png")
-            logo_img = logo_img.resize((60, 60), Image.LANCZOS)
-            self.logo = ImageTk.PhotoImage(logo_img)
+            self.logo = photo_image(LOGO, LOGO_SIZE, master=self.root)
             self.logo_label = tk.Label(self.header_frame, image=self.logo, bg=self.bg_color)
             self.logo_label.pack(side="left", padx=(0, 10))
         except Exception as e:
@@ -172,16 +308,24 @@ class CardanoConverter:
         
         self.price_value = ctk.CTkLabel(
             self.price_frame,
-            text="$0.00 CAD",
+            text=f"${self.current_price} CAD",
             font=self.price_font,
             text_color=self.dark_blue,
             fg_color="transparent"
         )
         self.price_value.pack(pady=5)
         
+        if self.last_quote:
+            saved_at = datetime.fromtimestamp(self.last_quote["time"])
+            price_time = f"Last saved: {saved_at.strftime('%Y/%m/%d %I:%M:%S %p')}"
+        elif self.fast_start:
+            price_time = "Fetching latest price..."
+        else:
+            price_time = f"Last updated: {self.get_date_time()}"
+        
         self.price_time = ctk.CTkLabel(
             self.price_frame,
-            text=f"Last updated: {self.get_date_time()}",
+            text=price_time,
             font=self.tiny_font,
             text_color=self.text_color,
             fg_color="transparent"
@@ -361,8 +505,20 @@ class CardanoConverter:
         )
         self.chart_frame.pack(fill="both", expand=True, padx=1, pady=1)
         
-        # Create initial chart
-        self.create_price_chart()
+        # Create initial chart, or a lightweight placeholder until there is data to plot
+        if self.fast_start:
+            self.chart_placeholder = ctk.CTkLabel(
+                self.chart_frame,
+                text="Price data will appear here",
+                font=self.small_font,
+                text_color=self.text_color,
+                fg_color="transparent",
+                width=400,
+                height=300
+            )
+            self.chart_placeholder.pack(fill="both", expand=True, padx=10, pady=10)
+        else:
+            self.create_price_chart()
         
         # Stats container with shadow effect
         self.stats_container = tk.Frame(self.right_pane, bg="#DDDDDD", padx=2, pady=2)
@@ -405,7 +561,7 @@ class CardanoConverter:
         
         self.market_cap_value = ctk.CTkLabel(
             self.stats_grid,
-            text="$11.2B",
+            text="-",
             font=self.small_font,
             text_color=self.dark_blue,
             fg_color="transparent",
@@ -426,7 +582,7 @@ class CardanoConverter:
         
         self.volume_value = ctk.CTkLabel(
             self.stats_grid,
-            text="$245.1M",
+            text="-",
             font=self.small_font,
             text_color=self.dark_blue,
             fg_color="transparent",
@@ -447,7 +603,7 @@ class CardanoConverter:
         
         self.supply_value = ctk.CTkLabel(
             self.stats_grid,
-            text="35.4B ADA",
+            text="-",
             font=self.small_font,
             text_color=self.dark_blue,
             fg_color="transparent",
@@ -476,6 +632,52 @@ class CardanoConverter:
         )
         self.max_supply_value.grid(row=3, column=1, sticky="e", pady=5)
         
+        # 24h Change
+        self.change_label = ctk.CTkLabel(
+            self.stats_grid,
+            text="24h Change:",
+            font=self.small_font,
+            text_color=self.text_color,
+            fg_color="transparent",
+            anchor="w"
+        )
+        self.change_label.grid(row=4, column=0, sticky="w", pady=5)
+        
+        self.change_value = ctk.CTkLabel(
+            self.stats_grid,
+            text="-",
+            font=self.small_font,
+            text_color=self.dark_blue,
+            fg_color="transparent",
+            anchor="e"
+        )
+        self.change_value.grid(row=4, column=1, sticky="e", pady=5)
+        
+        # ADA in the other currencies of the quote matrix
+        self.rate_values = {}
+        other_fiats = [fiat for fiat in self.quote_matrix.fiats if fiat != "CAD"]
+        for row, fiat in enumerate(other_fiats, start=5):
+            rate_label = ctk.CTkLabel(
+                self.stats_grid,
+                text=f"ADA/{fiat}:",
+                font=self.small_font,
+                text_color=self.text_color,
+                fg_color="transparent",
+                anchor="w"
+            )
+            rate_label.grid(row=row, column=0, sticky="w", pady=5)
+            
+            rate_value = ctk.CTkLabel(
+                self.stats_grid,
+                text="-",
+                font=self.small_font,
+                text_color=self.dark_blue,
+                fg_color="transparent",
+                anchor="e"
+            )
+            rate_value.grid(row=row, column=1, sticky="e", pady=5)
+            self.rate_values[fiat] = rate_value
+        
         # Configure grid columns
         self.stats_grid.columnconfigure(0, weight=1)
         self.stats_grid.columnconfigure(1, weight=1)
@@ -532,267 +734,368 @@ class CardanoConverter:
         self.website_button.pack(pady=(0, 15))
         
     def create_price_chart(self):
-        """Create price chart with matplotlib"""
-        # If we already have a chart, clear the frame first
-        for widget in self.chart_frame.winfo_children():
-            widget.destroy()
+        """Create the price chart on first use, then update it in place"""
+        if self.price_chart is None:
+            # Import matplotlib on first use, it is the slowest import in the app
+            from price_chart import PriceChart
+            from downsample import OhlcPyramid
             
-        # Create figure
-        fig = Figure(figsize=(4, 3), dpi=100)
-        fig.patch.set_facecolor('#FFFFFF')
-        
-        # Adjust the subplot params to make more room for the plot
-        plt.subplots_adjust(left=0.1, right=0.9, top=0.9, bottom=0.1)
-        
-        # Add subplot
-        plot = fig.add_subplot(111)
-        
-        # If we have price history, plot it
-        if len(self.price_history) > 1:
-            # Create x values (number of data points)
-            x_values = list(range(len(self.price_history)))
+            # Remove the startup placeholder
+            for widget in self.chart_frame.winfo_children():
+                widget.destroy()
             
-            # Plot the price history
-            plot.plot(x_values, self.price_history, color=self.dark_blue, linewidth=2)
+            self.price_chart = PriceChart(
+                self.chart_frame,
+                line_color=self.dark_blue,
+                fill_color=self.light_blue,
+                text_color=self.text_color
+            )
+            self.price_chart.canvas.get_tk_widget().pack(fill="both", expand=True, padx=10, pady=10)
             
-            # Add a subtle fill below the line
-            plot.fill_between(x_values, self.price_history, color=self.light_blue, alpha=0.2)
+            # Pre-aggregated buckets for histories far longer than the chart is wide
+            self.price_pyramid = OhlcPyramid()
+            self.price_pyramid.extend(self.price_history.timestamps(), self.price_history.prices())
+        
+        with get_metrics().time("chart_redraw_seconds"):
+            times = self.price_history.timestamps()
+            prices = self.price_history.prices()
+            width = self.price_chart.pixel_width()
+            if len(prices) > 4 * width:
+                times, prices = self.price_pyramid.series(times[0], times[-1] + 1, width)
             
-            # Set the labels for x-axis ticks (time)
-            if len(self.time_history) > 0:
-                # Show only a reasonable number of labels to avoid crowding
-                max_labels = 5
-                step_size = max(1, len(self.time_history) // max_labels)
-                
-                # Get indices for the labels
-                indices = list(range(0, len(self.time_history), step_size))
-                
-                # If the last point isn't included, add it
-                if len(self.time_history) - 1 not in indices:
-                    indices.append(len(self.time_history) - 1)
-                
-                # Convert datetime strings to more readable format
-                formatted_times = []
-                for i in indices:
-                    if i < len(self.time_history):
-                        try:
-                            dt = datetime.strptime(self.time_history[i], '%Y/%m/%d %I:%M:%S %p')
-                            formatted_times.append(dt.strftime('%H:%M'))
-                        except:
-                            formatted_times.append('')
-                
-                plot.set_xticks([i for i in indices if i < len(x_values)])
-                plot.set_xticklabels(formatted_times)
-        else:
-            # If no data yet, show a placeholder message
-            plot.text(0.5, 0.5, 'Price data will appear here', 
-                     horizontalalignment='center', verticalalignment='center',
-                     transform=plot.transAxes)
-            
-        # Style the plot to match the app
-        plot.spines['top'].set_visible(False)
-        plot.spines['right'].set_visible(False)
-        plot.spines['bottom'].set_color('#CCCCCC')
-        plot.spines['left'].set_color('#CCCCCC')
-        
-        plot.tick_params(axis='both', colors='#1D1D1F', labelsize=8)
-        plot.grid(axis='y', linestyle='--', alpha=0.3)
-        
-        plot.set_title('ADA Price (CAD)', fontsize=10, color='#1D1D1F')
-        
-        # Set y-axis to start from 0 or slightly lower than the min price
-        if len(self.price_history) > 0:
-            min_price = min(self.price_history)
-            max_price = max(self.price_history)
-            y_min = max(0, min_price * 0.9)  # Start at 0 or 90% of min price
-            y_max = max_price * 1.1  # Go to 110% of max price
-            plot.set_ylim(y_min, y_max)
-        
-        # Create the canvas
-        canvas = FigureCanvasTkAgg(fig, master=self.chart_frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill="both", expand=True, padx=10, pady=10)
-        
-    def get_date_time(self):
-        """Get current formatted date and time"""
-        now = datetime.now()
+            self.price_chart.update(times, prices)
+        
+    def get_date_time(self, timestamp=None):
+        """Get current (or the given epoch timestamp's) formatted date and time"""
+        now = datetime.fromtimestamp(timestamp) if timestamp else datetime.now()
         return now.strftime('%Y/%m/%d %I:%M:%S %p')
     
     def get_realtime_cardano_price(self):
         """Get real-time Cardano price from multiple sources with fallbacks"""
-        # Try multiple methods to get the price
-        price = self.get_price_from_google()
-        
-        if not price or price == "0.00":
-            price = self.get_price_from_api()
-            
-        if not price or price == "0.00":
-            price = self.get_price_from_coingecko()
-            
-        if not price or price == "0.00":
-            return self.current_price
-            
-        return price
+        # Refresh through the cache so concurrent callers share one fetch
+        price = self.price_cache.refresh(DEFAULT_QUOTE, self.fetch_price)
+        return price or self.current_price
+    
+    def get_cached_price(self):
+        """Get the cached price at once, refreshing it in the background when stale"""
+        price = self.price_cache.get(DEFAULT_QUOTE, self.fetch_price, block=False)
+        return price or self.current_price
+    
+    def fetch_price(self):
+        """Fetch a fresh price, or None if every source failed"""
+        # Query the sources hedged, keeping the first valid quote
+        if self.loop_driver is not None:
+            # Called from a cache worker thread: run the fetch on the loop Tk is stepping,
+            # waiting a little past the fetcher's own deadline in case the loop is stalled
+            import asyncio
+            import concurrent.futures
+            future = asyncio.run_coroutine_threadsafe(
+                self.price_fetcher.fetch(), self.loop_driver.loop)
+            try:
+                result = future.result(timeout=self.price_fetcher.timeout + 1.0)
+            except concurrent.futures.TimeoutError:
+                future.cancel()
+                print("Timed out waiting for the event loop to fetch a price")
+                return None
+        else:
+            result = self.price_fetcher.fetch()
+        self.price_source = result.source
+        return result.price
         
     def get_price_from_google(self):
         """Get price from Google search"""
-        try:
-            url = "https://www.google.ca/search?q=ADA+to+CAD"
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            response = requests.get(url, headers=headers, timeout=5)
-            
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # Method 1: Try to find the price element
-                price_element = soup.find("div", attrs={'class': 'BNeawe iBp4i AP7Wnd'})
-                if price_element:
-                    text = price_element.find("div", attrs={'class': 'BNeawe iBp4i AP7Wnd'})
-                    if text:
-                        price_text = text.text
-                        # Extract numbers using regex
-                        match = re.search(r'\d+\.\d+', price_text)
-                        if match:
-                            return match.group(0)
-                
-                # Method 2: Alternative class
-                price_element = soup.select_one(".DFlfde.SwHCTb")
-                if price_element:
-                    return price_element.text
-                    
-                # Method 3: Look for specific pattern
-                for div in soup.find_all('div'):
-                    if div.text and 'CAD' in div.text and '$' in div.text:
-                        match = re.search(r'\$(\d+\.\d+)', div.text)
-                        if match:
-                            return match.group(1)
-            
-            return None
-        except Exception as e:
-            print(f"Error fetching price from Google: {e}")
-            return None
+        return price_sources.get_price_from_google(self.transport)
             
     def get_price_from_api(self):
-        """Get price from CoinGecko API"""
-        try:
-            url = "https://api.coingecko.com/api/v3/simple/price?ids=cardano&vs_currencies=cad"
-            response = requests.get(url, timeout=5)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if 'cardano' in data and 'cad' in data['cardano']:
-                    return str(data['cardano']['cad'])
-            
-            return None
-        except Exception as e:
-            print(f"Error fetching price from CoinGecko API: {e}")
-            return None
+        """Get price from CoinGecko API, refreshing the market stats in the same request"""
+        return self.market_feed.fetch_price()
+    
+    def fetch_market_stats(self):
+        """Get the market stats from CoinGecko API over the shared transport"""
+        return market_stats.fetch_market_stats(self.transport)
             
     def get_price_from_coingecko(self):
         """Get price from CoinGecko website as fallback"""
+        return price_sources.get_price_from_coingecko(self.transport)
+    
+    def poll_price(self):
+        """Fetch the price on the worker thread and queue it for the UI"""
+        if self.price_stream is not None and self.price_stream.is_live():
+            # The stream is pushing quotes, so there is nothing to poll for
+            return
+        if self.read_shared_quote():
+            return
+        price = self.get_realtime_cardano_price()
+        self.publish_quote(price, self.price_source)
+    
+    def publish_quote(self, price, source):
+        """Record a polled quote, persist it and queue it for the UI"""
+        timestamp = time.time()
+        if self.owns_data_files():
+            if self.io_executor is not None:
+                # The asyncio loop runs on the Tk thread, so the files are written on a worker
+                self.io_executor.submit(self.persist_quote, price, source, timestamp)
+            else:
+                self.persist_quote(price, source, timestamp)
+        if not source:
+            # Every source failed, keep showing the last quote and back off
+            self.poll_scheduler.record_failure()
+            return
+        
+        self.poll_scheduler.record_price(price)
+        if self.quote_broker is not None and self.quote_broker.leading:
+            self.quote_broker.publish_quote(price, source, timestamp, self.poll_scheduler.next_poll_time())
+        self.ui_queue.put(QuoteEvent(price, source, timestamp))
+        self.first_quote.set()
+    
+    def persist_quote(self, price, source, timestamp):
+        """Save the source health, and the quote and its tick when a source answered"""
+        self.source_registry.save(data_path("source_health.json"))
+        if source:
+            save_last_quote(price, source)
+            self.record_tick(timestamp, price)
+    
+    def owns_data_files(self):
+        """Check whether this instance writes the quote, tick and health files
+        
+        With a shared quote slot only the polling instance does, so the
+        files in the data directory have one writer. Offline and replayed
+        quotes are never written.
+        """
+        if self.simulated:
+            return False
+        return self.quote_broker is None or self.quote_broker.leading
+    
+    def release_lead(self):
+        """Stop polling for the other instances while this one's polling is paused"""
+        if self.quote_broker is not None:
+            self.quote_broker.step_down()
+    
+    def read_shared_quote(self):
+        """Show the quote another instance polled, returning False when this instance has to poll"""
+        if self.quote_broker is None or self.quote_broker.try_lead():
+            return False
+        quote = self.quote_broker.read_fresh()
+        if quote is None:
+            # The polling instance has no recent quote, so fetch one here
+            return False
+        if quote.timestamp != self.shared_timestamp:
+            self.shared_timestamp = quote.timestamp
+            self.price_cache.put(DEFAULT_QUOTE, quote.price)
+            self.price_source = quote.source
+            self.publish_quote(quote.price, quote.source)
+        return True
+    
+    def open_tick_store(self):
+        """Open the on-disk tick history, or return None if it cannot be used"""
         try:
-            url = "https://www.coingecko.com/en/coins/cardano"
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            response = requests.get(url, headers=headers, timeout=5)
-            
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'html.parser')
-                # Try to find the price in CAD
-                for span in soup.find_all('span'):
-                    if 'C$' in span.text:
-                        match = re.search(r'C\$(\d+\.\d+)', span.text)
-                        if match:
-                            return match.group(1)
-            
-            return None
-        except Exception as e:
-            print(f"Error fetching price from CoinGecko website: {e}")
+            return TickStore(data_path("ticks.bin"))
+        except (OSError, ValueError) as e:
+            print(f"Could not open price history: {e}")
             return None
     
-    def update_price(self):
-        """Update the displayed price and chart data"""
-        price = self.get_realtime_cardano_price()
-        if price:
-            self.current_price = price
-            self.price_value.configure(text=f"${price} CAD")
-            self.price_time.configure(text=f"Last updated: {self.get_date_time()}")
-            
-            # Update price history for the chart
+    def record_tick(self, timestamp, price):
+        """Append a fetched price to the on-disk tick history"""
+        if not self.tick_store:
+            return
+        try:
+            self.tick_store.append(timestamp, float(price))
+        except (OSError, ValueError) as e:
+            print(f"Could not record price tick: {e}")
+    
+    def update_price(self, events):
+        """Update the displayed price and chart data from queued quotes"""
+        # Record every quote in the history, but only render the latest one
+        for event in events:
             try:
-                price_float = float(price)
-                self.price_history.append(price_float)
-                self.time_history.append(self.get_date_time())
-                
-                # Keep only the last 24 data points (2 hours if updating every 5 minutes)
-                if len(self.price_history) > 24:
-                    self.price_history.pop(0)
-                    self.time_history.pop(0)
-                
-                # Update chart if we have at least 2 data points
-                if len(self.price_history) >= 2:
-                    self.create_price_chart()
+                price_float = float(event.price)
             except ValueError:
-                pass  # Skip chart update if price isn't a valid float
+                continue  # Skip chart data if price isn't a valid float
+            
+            # The oldest point is evicted once the history is full
+            self.price_history.append(event.timestamp, price_float)
+            if self.price_pyramid:
+                self.price_pyramid.add(event.timestamp, price_float)
+        
+        latest = events[-1]
+        metrics = get_metrics()
+        metrics.observe("ui_update_lag_seconds", time.time() - latest.timestamp)
+        metrics.set("last_quote_timestamp_seconds", latest.timestamp)
+        self.current_price = latest.price
+        self.price_value.configure(text=f"${latest.price} CAD")
+        self.price_time.configure(
+            text=f"Last updated: {self.get_date_time(latest.timestamp)} via {latest.source}"
+        )
+        
+        # Update chart if we have at least 2 data points
+        if len(self.price_history) >= 2:
+            self.create_price_chart()
     
     def start_price_thread(self):
-        """Start a thread to update price periodically"""
+        """Start a thread to fetch the price periodically"""
+        if self.loop_driver is not None:
+            # Poll on the asyncio loop instead, with no thread of its own
+            self.loop_driver.submit(self.poll_prices_async())
+            return
+        
         def price_updater():
             while True:
+                metrics = get_metrics()
                 try:
-                    # Update the price display and chart
-                    self.update_price()
+                    # Fetch the price for the display and chart
+                    with metrics.time("refresh_seconds", stage="price"):
+                        self.poll_price()
                     
-                    # Update stats with some randomized data for demo purposes
-                    # In a real app, you'd fetch actual data
-                    self.update_stats()
+                    # Update the market stats, usually from the price request itself
+                    with metrics.time("refresh_seconds", stage="stats"):
+                        self.poll_stats()
                 except Exception as e:
                     print(f"Error in price update thread: {e}")
+                    metrics.error("price_update", e)
                 
-                # Sleep for 30 seconds before next update
-                time.sleep(30)
+                # Sleep until the scheduler says the next update is due, letting
+                # another instance poll for everyone while this one is paused
+                if not self.poll_scheduler.sleep(on_pause=self.release_lead):
+                    break
         
         thread = threading.Thread(target=price_updater, daemon=True)
         thread.start()
     
-    def update_stats(self):
-        """Update cryptocurrency stats with demo data"""
-        # In a real application, you would fetch this data from an API
-        # Here we're just using random variations for demonstration
-        
-        try:
-            # Market cap: base 11.2B with ±5% variation
-            market_cap = 11.2 + (random.random() * 1.12 - 0.56)  # ±5% variation
-            self.market_cap_value.configure(text=f"${market_cap:.1f}B")
-            
-            # Volume: base 245.1M with ±10% variation
-            volume = 245.1 + (random.random() * 49.02 - 24.51)  # ±10% variation
-            self.volume_value.configure(text=f"${volume:.1f}M")
+    async def poll_prices_async(self):
+        """Fetch the price periodically on the asyncio loop, the async counterpart of the price thread"""
+        import asyncio
+        loop = asyncio.get_event_loop()
+        while not self.poll_scheduler.stopped:
+            metrics = get_metrics()
+            try:
+                if (self.price_stream is None or not self.price_stream.is_live()) and not self.read_shared_quote():
+                    with metrics.time("refresh_seconds", stage="price"):
+                        result = await self.price_fetcher.fetch()
+                        if result.price:
+                            self.price_cache.put(DEFAULT_QUOTE, result.price)
+                        self.price_source = result.source
+                        self.publish_quote(result.price, result.source)
+                
+                # Update the market stats, usually from the price request itself
+                with metrics.time("refresh_seconds", stage="stats"):
+                    await loop.run_in_executor(None, self.poll_stats)
+            except Exception as e:
+                print(f"Error in price update loop: {e}")
+                metrics.error("price_update", e)
             
-            # Circulating supply: base 35.4B with very small variation
-            supply = 35.4 + (random.random() * 0.1 - 0.05)  # very small variation
-            self.supply_value.configure(text=f"{supply:.1f}B ADA")
-        except Exception as e:
-            print(f"Error updating stats: {e}")
+            # Sleep until the scheduler says the next update is due, and polling is not paused
+            deadline = time.monotonic() + self.poll_scheduler.next_interval()
+            while time.monotonic() < deadline and not self.poll_scheduler.due:
+                await asyncio.sleep(min(1, max(0, deadline - time.monotonic())))
+            self.poll_scheduler.due = False
+            if self.poll_scheduler.is_paused():
+                self.release_lead()
+            while self.poll_scheduler.is_paused() and not self.poll_scheduler.stopped:
+                await asyncio.sleep(1)
+    
+    def start_price_stream(self):
+        """Connect the streaming ticker, on the loop Tk steps or on a thread of its own"""
+        if self.price_stream is None:
+            return
+        if self.loop_driver is not None:
+            self.loop_driver.submit(self.price_stream.run())
+            return
+        
+        import asyncio
+        thread = threading.Thread(target=asyncio.run, args=(self.price_stream.run(),), daemon=True)
+        thread.start()
+    
+    def on_stream_tick(self, price, timestamp):
+        """Publish a streamed price through the same path as a polled one"""
+        price = str(price)
+        self.price_cache.put(DEFAULT_QUOTE, price)
+        self.price_source = "stream"
+        self.publish_quote(price, "stream")
+    
+    def on_stream_state(self, live):
+        """Poll at once when the stream drops, so quotes keep coming"""
+        if not live:
+            self.poll_scheduler.poll_now()
+    
+    def on_window_unmap(self, event):
+        """Pause polling when the main window is minimised"""
+        if event.widget is self.root:
+            self.poll_scheduler.pause()
+    
+    def on_window_map(self, event):
+        """Resume polling when the main window is shown again"""
+        if event.widget is self.root:
+            self.poll_scheduler.resume()
+    
+    def on_user_activity(self, event):
+        """Keep polling while the user interacts with the window"""
+        self.poll_scheduler.touch()
+    
+    def poll_stats(self):
+        """Get the market stats on the worker thread and queue them for the UI"""
+        quote = self.quote_broker.read_fresh() if self.quote_broker is not None else None
+        if quote is not None and not self.quote_broker.leading and quote.stats.market_cap is not None:
+            # Another instance fetched the stats for everyone
+            stats = quote.stats
+        else:
+            stats = self.market_feed.get()
+            if stats is None:
+                # Keep showing the last stats
+                return
+            if self.quote_broker is not None and self.quote_broker.leading:
+                self.quote_broker.publish_stats(stats)
+        
+        self.ui_queue.put(StatsEvent(stats.market_cap, stats.volume, stats.supply,
+                                     stats.max_supply, stats.change_24h))
+    
+    def update_stats(self, events):
+        """Update cryptocurrency stats from the latest queued stats"""
+        stats = events[-1]
+        if stats.market_cap is not None:
+            self.market_cap_value.configure(text=f"${self.format_amount(stats.market_cap)}")
+        if stats.volume is not None:
+            self.volume_value.configure(text=f"${self.format_amount(stats.volume)}")
+        if stats.supply is not None:
+            self.supply_value.configure(text=f"{self.format_amount(stats.supply)} ADA")
+        if stats.max_supply is not None:
+            self.max_supply_value.configure(text=f"{self.format_amount(stats.max_supply)} ADA")
+        if stats.change_24h is not None:
+            self.change_value.configure(
+                text=f"{stats.change_24h:+.2f}%",
+                text_color=self.success_green if stats.change_24h >= 0 else self.accent
+            )
+        
+        # Reading the matrix never fetches, it refreshes itself in the background when stale
+        for fiat, rate_value in self.rate_values.items():
+            rate = self.quote_matrix.price("ADA", fiat)
+            if rate is not None:
+                rate_value.configure(text=f"{rate:.4f} {fiat}")
+    
+    def format_amount(self, value):
+        """Format a large number with a B, M or K suffix"""
+        for size, suffix in ((1e9, "B"), (1e6, "M"), (1e3, "K")):
+            if abs(value) >= size:
+                return f"{value / size:.1f}{suffix}"
+        return f"{value:.0f}"
     
     def cad_to_ada(self):
         """Convert CAD to ADA"""
         try:
+            # Get values
+            cad = to_decimal(self.input_var.get() or "0")
+            cardano_price = self.get_cached_price()
+            if not self.price_loaded(cardano_price):
+                self.update_output_box("Price not loaded yet, try again in a moment", self.accent)
+                return
+            
             # Count conversions
             self.count += 1
             
-            # Get values
-            cad = float(self.input_var.get() or 0)
-            cardano_price = float(self.current_price)
-            
-            # Calculate conversion
-            ada = cad / cardano_price
+            # Calculate conversion exactly, to the lovelace
+            ada = convert_exact(cad, cardano_price, CAD_TO_ADA)
             
             # Update result
-            self.update_output_box(f"{cad:.2f} CAD → {ada:.2f} ADA", self.dark_blue)
+            self.update_output_box(f"{cad} CAD → {ada} ADA", self.dark_blue)
             self.conversion_count.configure(text=f"Conversions: {self.count}")
             
             # Add a subtle animation flash for the output box
@@ -803,18 +1106,21 @@ class CardanoConverter:
     def ada_to_cad(self):
         """Convert ADA to CAD"""
         try:
+            # Get values
+            ada = to_decimal(self.input_var.get() or "0")
+            cardano_price = self.get_cached_price()
+            if not self.price_loaded(cardano_price):
+                self.update_output_box("Price not loaded yet, try again in a moment", self.accent)
+                return
+            
             # Count conversions
             self.count += 1
             
-            # Get values
-            ada = float(self.input_var.get() or 0)
-            cardano_price = float(self.current_price)
-            
-            # Calculate conversion
-            cad = ada * cardano_price
+            # Calculate conversion exactly, to the cent
+            cad = convert_exact(ada, cardano_price, ADA_TO_CAD)
             
             # Update result
-            self.update_output_box(f"{ada:.2f} ADA → {cad:.2f} CAD", self.dark_blue)
+            self.update_output_box(f"{ada} ADA → {cad} CAD", self.dark_blue)
             self.conversion_count.configure(text=f"Conversions: {self.count}")
             
             # Add a subtle animation flash for the output box
@@ -822,6 +1128,13 @@ class CardanoConverter:
         except ValueError:
             self.update_output_box("Please enter a valid number", self.accent)
     
+    def price_loaded(self, price):
+        """Check whether price is a real quote, not the placeholder shown before the first one"""
+        try:
+            return to_decimal(price) > 0
+        except ValueError:
+            return False
+    
     def update_output_box(self, text, color):
         """Update the output text box with given text and color"""
         self.output_box.configure(state="normal")
@@ -851,8 +1164,34 @@ class CardanoConverter:
         self.update_output_box("Enter an amount and press convert", self.text_color)
 
 def main():
+    from price_stream import KRAKEN_URL
+    parser = argparse.ArgumentParser(description="Convert between Cardano (ADA) and Canadian Dollars")
+    parser.add_argument("--asyncio", action="store_true",
+                        help="poll the price sources on one asyncio loop instead of a worker thread")
+    parser.add_argument("--stream", nargs="?", const=KRAKEN_URL, metavar="URL",
+                        help="take pushed quotes from a WebSocket (ws://) or SSE (http://) ticker, "
+                             "polling only while it is down (default: Kraken's ADA/CAD feed)")
+    parser.add_argument("--history", type=int, default=HISTORY_SIZE, metavar="POINTS",
+                        help=f"price points the chart shows, resumed from the recorded history "
+                             f"(default: {HISTORY_SIZE})")
+    parser.add_argument("--metrics", action="store_true",
+                        help="time every refresh stage and write metrics.json to the data directory each minute")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="time every refresh stage and serve them for Prometheus at :PORT/metrics")
+    args = parser.parse_args()
+    if args.history < 2:
+        parser.error("--history must be at least 2")
+    
+    if args.metrics or args.metrics_port:
+        metrics = get_metrics()
+        metrics.enable()
+        if args.metrics:
+            metrics.start_dump(data_path("metrics.json"))
+        if args.metrics_port:
+            metrics.serve(port=args.metrics_port)
+    
     root = tk.Tk()
-    app = CardanoConverter(root)
+    app = CardanoConverter(root, history_size=args.history, use_asyncio=args.asyncio, stream_url=args.stream)
     root.mainloop()
 
 if __name__ == "__main__":
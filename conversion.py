@@ -0,0 +1,289 @@
+from decimal import (Decimal, InvalidOperation, ROUND_CEILING, ROUND_DOWN, ROUND_FLOOR,
+                     ROUND_HALF_DOWN, ROUND_HALF_EVEN, ROUND_HALF_UP, ROUND_UP)
+from fractions import Fraction
+from math import gcd
+
+# Conversion directions
+CAD_TO_ADA = "cad-to-ada"
+ADA_TO_CAD = "ada-to-cad"
+
+# Currency converted from and to in each direction
+DIRECTIONS = {
+    CAD_TO_ADA: ("CAD", "ADA"),
+    ADA_TO_CAD: ("ADA", "CAD"),
+}
+
+
+def convert(amounts, price, direction):
+    """Convert an amount, or a whole numpy array of amounts, at price in CAD per ADA"""
+    if direction == CAD_TO_ADA:
+        return amounts / price
+    if direction == ADA_TO_CAD:
+        return amounts * price
+    raise ValueError(f"Unknown conversion direction: {direction}")
+
+
+# Decimal places of the smallest unit of each currency: lovelace for ADA, cents for CAD
+PLACES = {"ADA": 6, "CAD": 2}
+
+# Rounding modes of the exact conversions, by the name used on command lines
+ROUNDINGS = {
+    "half-even": ROUND_HALF_EVEN,
+    "half-up": ROUND_HALF_UP,
+    "half-down": ROUND_HALF_DOWN,
+    "up": ROUND_UP,
+    "down": ROUND_DOWN,
+    "ceiling": ROUND_CEILING,
+    "floor": ROUND_FLOOR,
+}
+
+
+# Most significant digits, and largest power of ten either way, an exact number may have.
+# Exact arithmetic costs time in proportion to both, so 1e-10000000 would take seconds
+MAX_DIGITS = 60
+MAX_EXPONENT = 60
+
+
+def to_decimal(value, name="amount"):
+    """Parse a number exactly, from a string, int, float or Decimal
+
+    Floats are read from their shortest repr, so 0.1 is 0.1 and not the
+    binary value nearest to it. Numbers with more than MAX_DIGITS digits or
+    an exponent past MAX_EXPONENT are refused.
+    """
+    text = repr(value) if isinstance(value, float) else str(value).strip()
+    shown = repr(value) if len(text) <= 40 else repr(text[:37] + "...")
+    try:
+        number = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"{name} must be a number, not {shown}")
+    if not number.is_finite():
+        raise ValueError(f"{name} must be a finite number, not {shown}")
+    _, digits, exponent = number.as_tuple()
+    if len(digits) > MAX_DIGITS or not -MAX_EXPONENT <= exponent <= MAX_EXPONENT:
+        raise ValueError(f"{name} must have at most {MAX_DIGITS} digits and an exponent "
+                         f"from -{MAX_EXPONENT} to {MAX_EXPONENT}, not {shown}")
+    return number
+
+
+def unit_ratio(price, direction, source_places=None, target_places=None):
+    """Get (numerator, denominator) turning source units into target units at price
+
+    Units are 10 ** -places of a currency, by default its smallest unit, so
+    from CAD to ADA this converts cents to lovelace.
+    """
+    if direction not in DIRECTIONS:
+        raise ValueError(f"Unknown conversion direction: {direction}")
+    price = to_decimal(price, "price")
+    if price <= 0:
+        raise ValueError(f"price must be positive, not {price}")
+
+    source, target = DIRECTIONS[direction]
+    source_places = PLACES[source] if source_places is None else source_places
+    target_places = PLACES[target] if target_places is None else target_places
+    # Plain integers rather than Fractions, as this runs once per distinct price of a batch
+    price_numerator, price_denominator = price.as_integer_ratio()
+    if direction == CAD_TO_ADA:
+        price_numerator, price_denominator = price_denominator, price_numerator
+    numerator = 10 ** target_places * price_numerator
+    denominator = 10 ** source_places * price_denominator
+    common = gcd(numerator, denominator)
+    return numerator // common, denominator // common
+
+
+def round_quotient(numerator, denominator, rounding=ROUND_HALF_EVEN):
+    """Round numerator / denominator to an integer, exactly
+
+    Works on Python ints and on numpy integer or object arrays alike, so the
+    scalar and batched conversions share every rounding decision. The
+    denominator must be positive.
+    """
+    floor = numerator // denominator
+    remainder = numerator % denominator
+    inexact = remainder != 0
+    twice = 2 * remainder
+    if rounding == ROUND_FLOOR:
+        return floor
+    if rounding == ROUND_CEILING:
+        return floor + inexact
+    if rounding == ROUND_DOWN:
+        return floor + (inexact & (numerator < 0))
+    if rounding == ROUND_UP:
+        return floor + (inexact & (numerator > 0))
+    if rounding == ROUND_HALF_UP:
+        return floor + ((twice > denominator) | ((twice == denominator) & (numerator > 0)))
+    if rounding == ROUND_HALF_DOWN:
+        return floor + ((twice > denominator) | ((twice == denominator) & (numerator < 0)))
+    if rounding == ROUND_HALF_EVEN:
+        return floor + ((twice > denominator) | ((twice == denominator) & (floor % 2 == 1)))
+    raise ValueError(f"Unknown rounding mode: {rounding}")
+
+
+def convert_exact(amount, price, direction, rounding=ROUND_HALF_EVEN, places=None):
+    """Convert one amount with no binary floating point, rounded once to the target's smallest unit
+
+    The amount and price keep every digit they were given, and the result
+    is a Decimal with places decimals (6 for ADA, 2 for CAD by default).
+    """
+    amount = Fraction(to_decimal(amount))
+    target = DIRECTIONS.get(direction, (None, None))[1]
+    places = PLACES.get(target) if places is None else places
+    numerator, denominator = unit_ratio(price, direction, 0, places)
+    units = round_quotient(amount.numerator * numerator, amount.denominator * denominator, rounding)
+    return units_to_decimal(units, places)
+
+
+def units_to_decimal(units, places):
+    """Make the Decimal of integer units of 10 ** -places, from its digits
+
+    Built from the digits rather than with scaleb, which would round to the
+    28 significant digits of the default context.
+    """
+    digits = tuple(int(digit) for digit in str(abs(units)))
+    return Decimal((int(units < 0), digits, -places))
+
+
+def decimal_to_units(number, places):
+    """Get a Decimal as an integer of 10 ** -places, exactly, when it has no more decimals"""
+    sign, digits, exponent = number.as_tuple()
+    units = int("".join(map(str, digits))) * 10 ** (exponent + places)
+    return -units if sign else units
+
+
+def parse_units(values):
+    """Parse decimal strings into integers of one common unit, exactly
+
+    Returns (numpy integer array, places), where places is the most decimals
+    any value has, so every value is a whole number of 10 ** -places.
+    """
+    numbers = [to_decimal(value, f"amounts[{row}]") for row, value in enumerate(values)]
+    places = max([-number.as_tuple().exponent for number in numbers] + [0])
+    units = [decimal_to_units(number, places) for number in numbers]
+    return as_int_array(units), places
+
+
+def as_int_array(values):
+    """Make an int64 array, or an array of Python ints when a value does not fit in 64 bits"""
+    import numpy as np
+
+    try:
+        return np.array(values, dtype=np.int64)
+    except OverflowError:
+        return np.array(values, dtype=object)
+
+
+def convert_units(units, price, direction, rounding=ROUND_HALF_EVEN, source_places=None, target_places=None):
+    """Convert a numpy array of integer units exactly, the batched counterpart of convert_exact
+
+    Each unit is 10 ** -source_places of the source currency, and the
+    result is an array of 10 ** -target_places of the target, by default
+    both smallest units. Rounding happens once per value, with the same
+    integer arithmetic as convert_exact, so results are identical. The
+    work stays in int64 while the products fit, and moves to Python ints
+    when they would overflow. price may be an array with one price per
+    unit, which are then converted in groups of equal price.
+    """
+    import numpy as np
+
+    units = np.asarray(units)
+    if np.ndim(price):
+        # One ratio per distinct price, spread back over the rows through the inverse index
+        prices = np.asarray(price).ravel()
+        values, inverse = np.unique(prices, return_inverse=True)
+        ratios = [unit_ratio(value.item(), direction, source_places, target_places) for value in values]
+        numerators = as_int_array([numerator for numerator, _ in ratios])[inverse]
+        denominators = as_int_array([denominator for _, denominator in ratios])[inverse]
+        results = scaled_quotient(units.ravel(), numerators, denominators, rounding)
+        return as_int_array(results.tolist()).reshape(units.shape)
+
+    numerator, denominator = unit_ratio(price, direction, source_places, target_places)
+    return scaled_quotient(units, numerator, denominator, rounding)
+
+
+def scaled_quotient(units, numerator, denominator, rounding):
+    """Round units * numerator / denominator, elementwise for array ratios
+
+    Stays in int64 while the products fit, and moves to Python ints when
+    they would overflow.
+    """
+    import numpy as np
+
+    largest = int(np.abs(units).max()) if units.size else 0
+    most = int(np.max(numerator)) if np.size(numerator) else 0
+    limit = np.iinfo(np.int64).max // 2
+    if (units.dtype == object or np.asarray(numerator).dtype == object or largest * most > limit
+            or int(np.max(denominator)) > limit):
+        units = units.astype(object)
+        if np.ndim(numerator):
+            numerator = np.asarray(numerator).astype(object)
+            denominator = np.asarray(denominator).astype(object)
+    else:
+        units = units.astype(np.int64)
+    return round_quotient(units * numerator, denominator, rounding)
+
+
+def format_units(units, places):
+    """Write integer units of 10 ** -places as decimal strings, without going through float"""
+    if not places:
+        return [str(unit) for unit in units.tolist()]
+    scale = 10 ** places
+    return [f"{'-' if unit < 0 else ''}{abs(unit) // scale}.{abs(unit) % scale:0{places}d}"
+            for unit in units.tolist()]
+
+
+# How a timestamp between two ticks is priced
+PREVIOUS = "previous"  # the last tick at or before it, the price in effect at the time
+LINEAR = "linear"      # the straight line between the ticks either side
+NEAREST = "nearest"    # whichever tick is closest in time
+INTERPOLATIONS = (PREVIOUS, LINEAR, NEAREST)
+
+
+def prices_as_of(timestamps, tick_times, tick_prices, interpolation=PREVIOUS):
+    """Look up the price at each timestamp from recorded ticks sorted by time
+
+    Every timestamp is located with a single vectorised binary search over
+    the ticks, so millions of lookups cost O(m log n) without any network
+    access. Timestamps before the first tick have no price (NaN), except
+    with nearest, which uses the first tick.
+    """
+    # Imported here so the GUI does not pay for numpy at startup
+    import numpy as np
+
+    timestamps = np.asarray(timestamps, dtype=float)
+    tick_times = np.asarray(tick_times, dtype=float)
+    tick_prices = np.asarray(tick_prices, dtype=float)
+
+    prices = np.full(len(timestamps), np.nan)
+    if not len(tick_times):
+        return prices
+
+    # Position of the first tick after each timestamp, so the one before is in effect
+    after = np.searchsorted(tick_times, timestamps, side="right")
+    before = after - 1
+    known = before >= 0
+
+    if interpolation == PREVIOUS:
+        prices[known] = tick_prices[before[known]]
+    elif interpolation == LINEAR:
+        prices[known] = np.interp(timestamps[known], tick_times, tick_prices)
+    elif interpolation == NEAREST:
+        next_tick = np.minimum(after, len(tick_times) - 1)
+        previous_tick = np.maximum(before, 0)
+        use_next = tick_times[next_tick] - timestamps < timestamps - tick_times[previous_tick]
+        prices = np.where(use_next, tick_prices[next_tick], tick_prices[previous_tick])
+    else:
+        raise ValueError(f"Unknown interpolation: {interpolation}")
+
+    return prices
+
+
+def convert_as_of(timestamps, amounts, tick_times, tick_prices, direction, interpolation=PREVIOUS):
+    """Convert each amount at the price in effect at its own timestamp
+
+    Returns (converted amounts, prices used). Amounts with no known price
+    convert to NaN.
+    """
+    import numpy as np
+
+    prices = prices_as_of(timestamps, tick_times, tick_prices, interpolation)
+    return convert(np.asarray(amounts, dtype=float), prices, direction), prices
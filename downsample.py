@@ -0,0 +1,179 @@
+import numpy as np
+
+# Bucket sizes of the pyramid levels, in seconds: 1 minute, 5 minutes, 1 hour and 1 day
+RESOLUTIONS = (60, 300, 3600, 86400)
+
+
+class OhlcLevel:
+    """Open/high/low/close buckets of one resolution, in growable arrays"""
+
+    FIELDS = ("start", "open", "high", "low", "close")
+
+    def __init__(self, resolution, capacity=1024):
+        self.resolution = resolution
+        self.count = 0
+        self.arrays = {field: np.empty(capacity) for field in self.FIELDS}
+
+    def __len__(self):
+        return self.count
+
+    def view(self, field):
+        """Get the filled part of a field's array"""
+        return self.arrays[field][:self.count]
+
+    @property
+    def start(self):
+        return self.view("start")
+
+    @property
+    def open(self):
+        return self.view("open")
+
+    @property
+    def high(self):
+        return self.view("high")
+
+    @property
+    def low(self):
+        return self.view("low")
+
+    @property
+    def close(self):
+        return self.view("close")
+
+    def reserve(self, size):
+        """Grow the arrays to hold at least size buckets, doubling to keep appends O(1)"""
+        capacity = len(self.arrays["start"])
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for field, values in self.arrays.items():
+            grown = np.empty(capacity)
+            grown[:self.count] = values[:self.count]
+            self.arrays[field] = grown
+
+    def add(self, timestamp, price):
+        """Fold a tick into the latest bucket, or open a new one"""
+        bucket = timestamp - timestamp % self.resolution
+        arrays = self.arrays
+        last = self.count - 1
+
+        if self.count and bucket == arrays["start"][last]:
+            arrays["high"][last] = max(arrays["high"][last], price)
+            arrays["low"][last] = min(arrays["low"][last], price)
+            arrays["close"][last] = price
+        elif not self.count or bucket > arrays["start"][last]:
+            self.reserve(self.count + 1)
+            for field, value in zip(self.FIELDS, (bucket, price, price, price, price)):
+                self.arrays[field][self.count] = value
+            self.count += 1
+        # Ticks older than the latest bucket are ignored
+
+    def extend(self, timestamps, prices):
+        """Fold a sorted batch of ticks in at once, vectorised"""
+        timestamps = np.asarray(timestamps, dtype=float)
+        prices = np.asarray(prices, dtype=float)
+        if not len(timestamps):
+            return
+
+        # Ticks that fall into the current last bucket are folded in one by one
+        buckets = timestamps - timestamps % self.resolution
+        if self.count:
+            overlap = np.searchsorted(buckets, self.arrays["start"][self.count - 1], side="right")
+            for timestamp, price in zip(timestamps[:overlap], prices[:overlap]):
+                self.add(timestamp, price)
+            timestamps, prices, buckets = timestamps[overlap:], prices[overlap:], buckets[overlap:]
+            if not len(timestamps):
+                return
+
+        # Every run of equal bucket starts becomes one new bucket
+        firsts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        lasts = np.r_[firsts[1:] - 1, len(buckets) - 1]
+
+        size = len(firsts)
+        self.reserve(self.count + size)
+        new = slice(self.count, self.count + size)
+        self.arrays["start"][new] = buckets[firsts]
+        self.arrays["open"][new] = prices[firsts]
+        self.arrays["high"][new] = np.maximum.reduceat(prices, firsts)
+        self.arrays["low"][new] = np.minimum.reduceat(prices, firsts)
+        self.arrays["close"][new] = prices[lasts]
+        self.count += size
+
+
+class OhlcPyramid:
+    """OHLC buckets at several resolutions, kept up to date as ticks arrive
+
+    Ticks must arrive in timestamp order. series() picks the finest level
+    that covers a time range in a few buckets per pixel, so a chart never
+    has to look at much more data than it can draw, however long the history.
+    """
+
+    def __init__(self, resolutions=RESOLUTIONS):
+        self.levels = [OhlcLevel(resolution) for resolution in sorted(resolutions)]
+
+    def add(self, timestamp, price):
+        """Fold one tick into every level"""
+        for level in self.levels:
+            level.add(timestamp, price)
+
+    def extend(self, timestamps, prices):
+        """Fold a sorted batch of ticks into every level"""
+        for level in self.levels:
+            level.extend(timestamps, prices)
+
+    def level(self, resolution):
+        """Get the level with the given resolution in seconds"""
+        for level in self.levels:
+            if level.resolution == resolution:
+                return level
+        raise KeyError(resolution)
+
+    def series(self, start, end, max_points, oversample=4):
+        """Get (bucket start times, closes) covering start <= time < end
+
+        Uses the finest level with no more than oversample * max_points
+        buckets in the range, leaving lttb() to bring it down to max_points.
+        """
+        for level in self.levels:
+            # Include the bucket that start falls into
+            low = max(0, np.searchsorted(level.start, start, side="right") - 1)
+            high = np.searchsorted(level.start, end)
+            if high - low <= oversample * max_points or level is self.levels[-1]:
+                return level.start[low:high], level.close[low:high]
+
+
+def lttb(x, y, threshold):
+    """Downsample a series to threshold points with Largest-Triangle-Three-Buckets
+
+    Keeps the first and last points, and from every bucket in between the
+    point that forms the largest triangle with the previously kept point and
+    the average of the next bucket, which preserves the visual shape.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    every = (n - 2) / (threshold - 2)
+    kept = np.empty(threshold, dtype=np.intp)
+    kept[0], kept[-1] = 0, n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) -
+                      (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        kept[i + 1] = a
+
+    return x[kept], y[kept]
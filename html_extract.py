@@ -0,0 +1,114 @@
+from html import unescape
+import re
+from metrics import get_metrics
+
+# Targeted patterns, compiled once and run on the raw response bytes
+GOOGLE_NESTED_PRICE = re.compile(
+    rb'<div class="BNeawe iBp4i AP7Wnd">\s*<div class="BNeawe iBp4i AP7Wnd">([^<]*)')
+GOOGLE_CONVERTER_VALUE = re.compile(
+    rb'<[a-zA-Z]+\s[^>]*class="(?=[^"]*\bDFlfde\b)(?=[^"]*\bSwHCTb\b)[^"]*"[^>]*>([^<]*)')
+
+DECIMAL = re.compile(r'\d+\.\d+')
+DOLLAR_AMOUNT = re.compile(r'\$(\d+\.\d+)')
+CAD_AMOUNT = re.compile(r'C\$(\d+\.\d+)')
+
+# Comments, tags and runs of text, for the streaming scan
+TOKEN = re.compile(r'<!--.*?-->|<(/?)([a-zA-Z][^\s/>]*)[^>]*>|[^<]+|<', re.S)
+
+# Elements whose content is not page text, skipped whole
+RAW_TEXT_END = {
+    "script": re.compile(r'</script\s*>', re.I),
+    "style": re.compile(r'</style\s*>', re.I),
+}
+
+
+class TextScanner:
+    """Streaming search of the text inside the outermost elements of one tag
+
+    The page is tokenised with one compiled pattern and text is matched as
+    it goes by, so the scan stops at the first match instead of building a
+    tree and searching every element's full text. Script and style content
+    is skipped, as it is not page text. With required set, a match only
+    counts once that string has also been seen in the same outermost element.
+    """
+
+    # Characters kept from the previous run of text, so matches split by inline tags are still found
+    CARRY = 32
+
+    def __init__(self, tag, pattern, required=None):
+        self.tag = tag
+        self.pattern = pattern
+        self.required = required
+
+    def scan(self, html):
+        """Get the first match's group in the page text, or None"""
+        depth = 0
+        carry = ""
+        found = None
+        seen_required = self.required is None
+
+        position = 0
+        while position < len(html):
+            token = TOKEN.match(html, position)
+            position = token.end()
+            closing, tag = token.group(1, 2)
+
+            if tag:
+                tag = tag.lower()
+                if tag in RAW_TEXT_END and not closing:
+                    end = RAW_TEXT_END[tag].search(html, position)
+                    position = end.end() if end else len(html)
+                elif tag == self.tag:
+                    if not closing:
+                        depth += 1
+                    elif depth:
+                        depth -= 1
+                        if not depth:
+                            # The outermost element closed, so start afresh
+                            carry, found, seen_required = "", None, self.required is None
+                continue
+
+            if not depth or token.group(0).startswith("<!--"):
+                continue
+
+            text = carry + unescape(token.group(0))
+            if found is None:
+                match = self.pattern.search(text)
+                if match:
+                    found = match.group(1)
+            if not seen_required:
+                seen_required = self.required in text
+            if found is not None and seen_required:
+                return found
+            carry = text[-self.CARRY:]
+        return None
+
+
+def decode(content, encoding=None):
+    """Decode a response body for the parser without charset sniffing"""
+    return content.decode(encoding or "utf-8", errors="replace")
+
+
+def extract_google_price(content, encoding=None):
+    """Find the ADA price in CAD in a Google search results page, given as bytes"""
+    with get_metrics().time("parse_seconds", page="google"):
+        # Method 1: Nested price divs of the currency converter card
+        match = GOOGLE_NESTED_PRICE.search(content)
+        if match:
+            price = DECIMAL.search(decode(match.group(1), encoding))
+            if price:
+                return price.group(0)
+
+        # Method 2: Alternative class
+        match = GOOGLE_CONVERTER_VALUE.search(content)
+        if match:
+            return decode(match.group(1), encoding)
+
+        # Method 3: Look for a dollar amount in a div that mentions CAD
+        return TextScanner("div", DOLLAR_AMOUNT, required="CAD").scan(decode(content, encoding))
+
+
+def extract_coingecko_price(content, encoding=None):
+    """Find the ADA price in CAD in a CoinGecko coin page, given as bytes"""
+    with get_metrics().time("parse_seconds", page="coingecko"):
+        return TextScanner("span", CAD_AMOUNT).scan(decode(content, encoding))
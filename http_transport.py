@@ -0,0 +1,152 @@
+import threading
+from urllib.parse import urlsplit
+
+# Header presets shared by every source
+HEADER_PRESETS = {
+    # Browser-like headers for pages that reject the default requests agent
+    'browser': {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+    },
+    # Plain JSON API requests
+    'json': {
+        'Accept': 'application/json'
+    },
+}
+
+
+def request_headers(preset=None, headers=None):
+    """Merge a header preset with any extra headers for one request"""
+    merged = dict(HEADER_PRESETS[preset]) if preset else {}
+    if headers:
+        merged.update(headers)
+    return merged
+
+
+class HttpTransport:
+    """Pooled HTTP sessions, one per host, so connections are kept alive and reused
+
+    Each host gets its own requests.Session with a connection pool of
+    pool_maxsize sockets. Failed connections and retryable server errors are
+    retried with a short exponential backoff. Timed-out reads are not
+    retried, but every connect or status retry gets the full timeout again,
+    so a request can take up to (retries + 1) * timeout plus the backoff;
+    the price fetcher's own deadline is what bounds a poll. 429 responses
+    are handed straight to the listeners, so the poll scheduler does the
+    backing off instead of a sleep inside the request.
+    """
+
+    def __init__(self, pool_connections=4, pool_maxsize=8, retries=2,
+                 backoff_factor=0.3, status_forcelist=(500, 502, 503, 504),
+                 keep_alive=True, timeout=5):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.status_forcelist = status_forcelist
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+        # Callbacks that see every response, e.g. to pick up rate-limit headers
+        self.listeners = []
+
+    def create_session(self):
+        """Create a session with a pooled, retrying adapter"""
+        # Import requests on first use to keep startup fast
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=self.retries,
+            connect=self.retries,
+            # A retried read would wait out the timeout again
+            read=0,
+            status=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=self.status_forcelist,
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            # Retry-After is the poll scheduler's to honour, not a reason to block here
+            respect_retry_after_header=False,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=retry
+        )
+
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    def session_for(self, url):
+        """Get the pooled session for the host of url"""
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+
+        session = self.sessions.get(key)
+        if session is None:
+            with self.lock:
+                session = self.sessions.get(key)
+                if session is None:
+                    session = self.create_session()
+                    self.sessions[key] = session
+        return session
+
+    def get(self, url, preset=None, headers=None, timeout=None, **kwargs):
+        """Send a GET request through the pooled session for url's host"""
+        response = self.session_for(url).get(
+            url,
+            headers=request_headers(preset, headers),
+            timeout=self.timeout if timeout is None else timeout,
+            **kwargs
+        )
+
+        for listener in self.listeners:
+            try:
+                listener(response)
+            except Exception as e:
+                print(f"Error in response listener: {e}")
+        return response
+
+    def add_listener(self, listener):
+        """Call listener(response) for every response"""
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Stop calling a listener added with add_listener"""
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def close(self):
+        """Close every pooled session"""
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
+
+
+# Shared transport used by both apps
+_default_transport = None
+_default_lock = threading.Lock()
+
+
+def get_transport():
+    """Get the shared transport, creating it on first use
+
+    The transport records or replays its traffic when CARDANO_CONVERTER_RECORD
+    or CARDANO_CONVERTER_REPLAY is set, see replay_transport.
+    """
+    global _default_transport
+    if _default_transport is None:
+        with _default_lock:
+            if _default_transport is None:
+                from replay_transport import wrap_transport
+                _default_transport = wrap_transport(HttpTransport())
+    return _default_transport
@@ -0,0 +1,102 @@
+"""Pre-scaled copies of the app's images, cached on disk
+
+Each size an image is shown at is rendered once, saved as a small PNG named
+after the source's hash and the size, and loaded straight into Tk on later
+launches. Tk reads PNG itself, so the full-size image is only decoded and
+resized when a variant is missing or the source has changed.
+"""
+import hashlib
+import os
+import re
+import threading
+from app_paths import data_path
+
+# Folder of the data directory the scaled variants are kept in
+CACHE_DIR = "image_cache"
+
+# The logo, and the one size it is shown at, as both the window icon and in the header
+LOGO = "ada_logo.png"
+LOGO_SIZE = (60, 60)
+
+# Source hashes and Tk images already made in this process
+_hashes = {}
+_photos = {}
+_lock = threading.Lock()
+
+
+def source_hash(path):
+    """Get a short hash of an image file's contents, reading the file once per process"""
+    if path not in _hashes:
+        with open(path, "rb") as f:
+            _hashes[path] = hashlib.sha1(f.read()).hexdigest()[:16]
+    return _hashes[path]
+
+
+def variant_path(path, size):
+    """Get where the variant of path at size is cached"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return data_path(CACHE_DIR, f"{stem}-{source_hash(path)}-{size[0]}x{size[1]}.png")
+
+
+def render_variant(path, size):
+    """Decode path and resize it to size with Pillow, returning the PIL image"""
+    from PIL import Image
+    with Image.open(path) as image:
+        return image.resize(size, Image.LANCZOS)
+
+
+def scaled_image(path, size):
+    """Get the path of a PNG of path scaled to size, rendering and caching it on first use
+
+    Falls back to the original path when the variant can neither be found
+    nor made, e.g. without Pillow, so callers can still show the image.
+    """
+    try:
+        cached = variant_path(path, size)
+        if os.path.exists(cached):
+            return cached
+        image = render_variant(path, size)
+    except (ImportError, OSError) as e:
+        print(f"Could not scale {path}: {e}")
+        return path
+
+    try:
+        # Write under a temporary name so a half-written variant is never loaded
+        tmp_path = cached + ".tmp"
+        image.save(tmp_path, format="PNG", optimize=True)
+        os.replace(tmp_path, cached)
+    except OSError as e:
+        print(f"Could not cache {path}: {e}")
+        return path
+    prune_variants(path, cached)
+    return cached
+
+
+def prune_variants(path, keep):
+    """Delete cached variants of path made from an older version of it"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    variant = re.compile(rf"{re.escape(stem)}-([0-9a-f]{{16}})-\d+x\d+\.png")
+    folder = os.path.dirname(keep)
+    for name in os.listdir(folder):
+        match = variant.fullmatch(name)
+        if match and match.group(1) != source_hash(path):
+            try:
+                os.remove(os.path.join(folder, name))
+            except OSError:
+                pass
+
+
+def photo_image(path, size, master=None):
+    """Get a Tk image of path at size, made once per process and shared by every widget that shows it"""
+    key = (path, tuple(size))
+    with _lock:
+        if key not in _photos:
+            file = scaled_image(path, size)
+            if file != path:
+                import tkinter as tk
+                _photos[key] = tk.PhotoImage(master=master, file=file)
+            else:
+                # The variant could not be cached, so scale it in memory this time
+                from PIL import ImageTk
+                _photos[key] = ImageTk.PhotoImage(render_variant(path, size), master=master)
+        return _photos[key]
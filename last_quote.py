@@ -0,0 +1,34 @@
+import json
+import os
+import tempfile
+import time
+from app_paths import data_path
+
+QUOTE_FILE = "last_quote.json"
+
+
+def load_last_quote(path=None):
+    """Load the last persisted quote as a dict with price, source and time, or None"""
+    try:
+        with open(path or data_path(QUOTE_FILE), "r") as f:
+            quote = json.load(f)
+        if quote.get("price"):
+            return quote
+    except (OSError, ValueError, AttributeError):
+        pass
+    return None
+
+
+def save_last_quote(price, source=None, path=None):
+    """Persist a quote so the next launch can show it straight away"""
+    path = path or data_path(QUOTE_FILE)
+    quote = {"price": str(price), "source": source, "time": time.time()}
+    try:
+        # Write to a temporary file first so a crash never leaves a torn quote,
+        # named uniquely so other instances saving at the same time cannot clobber it
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(quote, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not save last quote: {e}")
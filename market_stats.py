@@ -0,0 +1,82 @@
+from collections import namedtuple
+import json
+import os
+from http_transport import get_transport
+from price_cache import PriceCache
+
+# Market data of one coin, in the quote currency: the price, 24h change in percent and supply in coins
+MarketStats = namedtuple(
+    "MarketStats",
+    ["price", "market_cap", "volume", "supply", "max_supply", "change_24h"]
+)
+
+# One request for the price and the market stats together
+MARKETS_URL = "https://api.coingecko.com/api/v3/coins/markets?vs_currency={currency}&ids={coin}"
+
+# Saved /coins/markets response, served by the offline stand-in
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "coingecko_markets.json")
+
+
+def parse_markets(data, coin="cardano"):
+    """Get MarketStats for coin out of a /coins/markets response, or None if it is missing"""
+    for market in data:
+        if market.get("id") == coin:
+            return MarketStats(
+                market.get("current_price"),
+                market.get("market_cap"),
+                market.get("total_volume"),
+                market.get("circulating_supply"),
+                market.get("max_supply"),
+                market.get("price_change_percentage_24h"),
+            )
+    return None
+
+
+def fetch_market_stats(transport=None, coin="cardano", currency="cad"):
+    """Get MarketStats from the CoinGecko markets API"""
+    url = MARKETS_URL.format(coin=coin, currency=currency)
+    response = (transport or get_transport()).get(url, preset='json', timeout=5)
+    response.raise_for_status()
+    return parse_markets(response.json(), coin)
+
+
+def load_fixture_stats(path=FIXTURE_PATH, coin="cardano"):
+    """Get MarketStats from a saved markets response, for running without a network"""
+    with open(path, "r") as f:
+        return parse_markets(json.load(f), coin)
+
+
+class MarketFeed:
+    """Cached market stats that double as a price source
+
+    fetch_price() loads fresh stats and returns the price from them, so when
+    it is registered as a price source every poll it wins refreshes the
+    stats too, with no extra round trip. get() only goes upstream when the
+    stats are older than their own ttl.
+    """
+
+    KEY = "market stats"
+
+    def __init__(self, fetch=None, ttl=120.0):
+        # fetch is called with no arguments and returns MarketStats or None
+        self.fetch = fetch or fetch_market_stats
+        self.cache = PriceCache(ttl=ttl)
+
+    def fetch_price(self):
+        """Price source: refresh the stats and return the price in them as a string"""
+        stats = self.cache.refresh(self.KEY, self.fetch)
+        if stats is None or stats.price is None:
+            return None
+        return str(stats.price)
+
+    def get(self):
+        """Get the stats, loading them when stale, or None if they could not be fetched"""
+        try:
+            return self.cache.get(self.KEY, self.fetch)
+        except Exception as e:
+            print(f"Error fetching market stats: {e}")
+            return None
+
+    def peek(self):
+        """Get the cached stats without loading them, or None"""
+        return self.cache.peek(self.KEY)
@@ -0,0 +1,269 @@
+"""Timers and counters for the refresh loop, exported for Prometheus or as JSON
+
+Instrumented code calls get_metrics() and records what it did:
+
+    with get_metrics().time("chart_redraw_seconds"):
+        redraw()
+    get_metrics().count("errors_total", stage="stats", type="KeyError")
+
+Metrics are off unless CARDANO_CONVERTER_METRICS is set or enable() is
+called, and while off every call returns at once without taking a lock or
+allocating, so the instrumentation can stay in the hot paths.
+"""
+from bisect import bisect_left
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Prefix of every exported metric name
+PREFIX = "cardano_converter_"
+
+# Upper bounds of the histogram buckets, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Help text of the metrics the app records, shown in the Prometheus export
+DESCRIPTIONS = {
+    "source_fetch_seconds": "Time each price source took, by source and outcome",
+    "quote_fetch_seconds": "Time from starting a fetch to its first valid quote, by winning source",
+    "quote_failures_total": "Fetches where every source failed",
+    "parse_seconds": "Time spent extracting a price from a page, by page",
+    "chart_redraw_seconds": "Time spent redrawing the price chart",
+    "ui_update_lag_seconds": "Time from a quote being published to it being shown",
+    "refresh_seconds": "Time one refresh stage took, by stage",
+    "errors_total": "Errors caught in the refresh loop, by stage and exception type",
+    "last_quote_timestamp_seconds": "Epoch time of the last quote shown",
+}
+
+
+class NullTimer:
+    """Timer handed out while metrics are off, which records nothing"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class Timer:
+    """Context manager that observes the time spent inside it"""
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Histogram:
+    """Counts of observations per bucket, with their sum"""
+
+    def __init__(self, buckets):
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+def label_key(labels):
+    """Turn keyword labels into a hashable, ordered key"""
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def format_labels(labels, extra=()):
+    """Format labels the Prometheus way, e.g. {source="google"}"""
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Metrics:
+    """Counters, gauges and timing histograms, keyed by name and labels"""
+
+    def __init__(self, enabled=False, buckets=BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.started = time.time()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def count(self, name, amount=1, **labels):
+        """Add amount to a counter"""
+        if not self.enabled:
+            return
+        key = (name, label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        """Set a gauge to value"""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.gauges[(name, label_key(labels))] = value
+
+    def observe(self, name, seconds, **labels):
+        """Add a duration to a timing histogram"""
+        if not self.enabled:
+            return
+        key = (name, label_key(labels))
+        position = bisect_left(self.buckets, seconds)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.counts[position] += 1
+            histogram.sum += seconds
+            histogram.count += 1
+
+    def time(self, name, **labels):
+        """Get a context manager that observes how long its block takes"""
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self, name, labels)
+
+    def error(self, stage, error):
+        """Count an exception caught in a stage"""
+        self.count("errors_total", stage=stage, type=type(error).__name__)
+
+    def snapshot(self):
+        """Get every metric as a JSON-friendly dict"""
+        with self.lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            gauges = [{"name": name, "labels": dict(labels), "value": value}
+                      for (name, labels), value in sorted(self.gauges.items())]
+            histograms = []
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                histograms.append({
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "buckets": dict(zip([str(bound) for bound in self.buckets] + ["+Inf"],
+                                        self.cumulative(histogram))),
+                })
+        return {"time": time.time(), "started": self.started,
+                "counters": counters, "gauges": gauges, "histograms": histograms}
+
+    def cumulative(self, histogram):
+        """Get the running totals of a histogram's bucket counts"""
+        total = 0
+        totals = []
+        for count in histogram.counts:
+            total += count
+            totals.append(total)
+        return totals
+
+    def render(self):
+        """Format every metric in the Prometheus text exposition format"""
+        lines = []
+        described = set()
+
+        def header(name, kind):
+            if name in described:
+                return
+            described.add(name)
+            if name in DESCRIPTIONS:
+                lines.append(f"# HELP {PREFIX}{name} {DESCRIPTIONS[name]}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                header(name, "counter")
+                lines.append(f"{PREFIX}{name}{format_labels(labels)} {value}")
+            for (name, labels), value in sorted(self.gauges.items()):
+                header(name, "gauge")
+                lines.append(f"{PREFIX}{name}{format_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                header(name, "histogram")
+                bounds = [repr(bound) for bound in self.buckets] + ["+Inf"]
+                for bound, total in zip(bounds, self.cumulative(histogram)):
+                    lines.append(f"{PREFIX}{name}_bucket{format_labels(labels, [('le', bound)])} {total}")
+                lines.append(f"{PREFIX}{name}_sum{format_labels(labels)} {histogram.sum}")
+                lines.append(f"{PREFIX}{name}_count{format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """Write a JSON snapshot, replacing the file atomically"""
+        try:
+            # A temporary name of its own, so processes dumping at once do not clobber each other
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.snapshot(), f, indent=2)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not write metrics: {e}")
+
+    def start_dump(self, path, interval=60.0):
+        """Dump a JSON snapshot every interval seconds on a daemon thread, returning an Event that stops it"""
+        stop = threading.Event()
+
+        def dump_loop():
+            while not stop.wait(interval):
+                self.dump(path)
+
+        threading.Thread(target=dump_loop, daemon=True).start()
+        return stop
+
+    def serve(self, host="127.0.0.1", port=9464):
+        """Serve the Prometheus export at /metrics on a daemon thread, returning the server"""
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+# Metrics shared by every module in the process
+_default_metrics = None
+_default_lock = threading.Lock()
+
+
+def get_metrics():
+    """Get the shared metrics, creating them on first use"""
+    global _default_metrics
+    if _default_metrics is None:
+        with _default_lock:
+            if _default_metrics is None:
+                _default_metrics = Metrics(enabled=bool(os.environ.get("CARDANO_CONVERTER_METRICS")))
+    return _default_metrics
@@ -0,0 +1,142 @@
+"""Local stand-in for a streaming ticker feed
+
+Serves a random-walk ADA/CAD price over a WebSocket that speaks the subset
+of Kraken's v2 ticker protocol the price stream uses, and as server-sent
+events. With --drop-after, every connection is closed after that many ticks,
+to exercise reconnecting and the polling fallback. Needs aiohttp.
+
+    python mock_ticker.py --port 8765 --drop-after 20
+    python cardano_converter.py --stream ws://localhost:8765/v2
+    python cardano_converter.py --stream http://localhost:8765/events
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+from price_stream import KRAKEN_SYMBOL
+
+
+class MockTicker:
+    """Ticker server on its own thread and event loop, started with start()"""
+
+    def __init__(self, host="127.0.0.1", port=0, interval=1.0, drop_after=None, price=0.9):
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self.drop_after = drop_after
+        self.price = price
+
+        # Counters for checking what a client saw against what was sent
+        self.connections = 0
+        self.sent = 0
+
+        self.loop = None
+        self.runner = None
+        self.ready = threading.Event()
+
+    def next_price(self):
+        """Move the price a small random step"""
+        self.price = round(self.price * (1 + random.gauss(0, 0.001)), 6)
+        return self.price
+
+    async def ticks(self):
+        """Yield a new price every interval, until drop_after ticks have gone out"""
+        count = 0
+        while self.drop_after is None or count < self.drop_after:
+            await asyncio.sleep(self.interval)
+            count += 1
+            self.sent += 1
+            yield self.next_price()
+
+    async def handle_websocket(self, request):
+        from aiohttp import web
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+
+        # Wait for the subscription, and confirm it the way Kraken does
+        message = await ws.receive_json()
+        symbols = message.get("params", {}).get("symbol", [])
+        await ws.send_json({"method": "subscribe", "success": True,
+                            "result": {"channel": "ticker", "symbol": symbols[0] if symbols else None}})
+        if KRAKEN_SYMBOL not in symbols:
+            await ws.close()
+            return ws
+
+        try:
+            async for price in self.ticks():
+                await ws.send_json({"channel": "ticker", "type": "update",
+                                    "data": [{"symbol": KRAKEN_SYMBOL, "last": price}]})
+            await ws.close()
+        except ConnectionError:
+            pass  # The client went away
+        return ws
+
+    async def handle_events(self, request):
+        from aiohttp import web
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        self.connections += 1
+
+        try:
+            async for price in self.ticks():
+                await response.write(f"data: {json.dumps({'price': price})}\n\n".encode())
+        except ConnectionError:
+            pass  # The client went away
+        return response
+
+    async def serve(self):
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get("/v2", self.handle_websocket)
+        app.router.add_get("/events", self.handle_events)
+
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.port = self.runner.addresses[0][1]
+        self.ready.set()
+
+    def start(self):
+        """Start serving on a daemon thread, and return once the port is bound"""
+        self.loop = asyncio.new_event_loop()
+        self.loop.create_task(self.serve())
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.ready.wait()
+        return self
+
+    def stop(self):
+        """Close every connection and stop the server thread"""
+        future = asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop)
+        future.result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    @property
+    def websocket_url(self):
+        return f"ws://{self.host}:{self.port}/v2"
+
+    @property
+    def events_url(self):
+        return f"http://{self.host}:{self.port}/events"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a fake ADA/CAD ticker over WebSocket and SSE")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between ticks")
+    parser.add_argument("--drop-after", type=int, help="close each connection after this many ticks")
+    args = parser.parse_args(argv)
+
+    ticker = MockTicker(args.host, args.port, args.interval, args.drop_after).start()
+    print(f"Ticker on {ticker.websocket_url} and {ticker.events_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        ticker.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+from email.utils import parsedate_to_datetime
+import random
+import threading
+import time
+
+
+class AdaptivePollScheduler:
+    """Decide how long to wait before the next price poll
+
+    The interval shrinks towards min_interval while the price moves fast and
+    grows towards max_interval while it is calm, based on a smoothed average
+    of the relative change between polls compared with target_move. Failed
+    polls back off exponentially, rate-limit headers push the next poll past
+    the reset time, and every interval gets random jitter so many clients do
+    not poll in lockstep. Polling pauses while the window is minimised or has
+    seen no user activity for idle_after seconds.
+    """
+
+    def __init__(self, base_interval=30, min_interval=5, max_interval=300,
+                 target_move=0.002, smoothing=0.3, jitter=0.1, idle_after=900):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_move = target_move
+        self.smoothing = smoothing
+        self.jitter = jitter
+        self.idle_after = idle_after
+
+        self.lock = threading.Lock()
+        self.last_price = None
+        self.volatility = None
+        self.failures = 0
+        self.rate_limited_until = 0
+        self.paused = False
+        self.stopped = False
+        self.due = False
+        self.last_activity = time.monotonic()
+
+        # Set to cut a sleep short: resume, user activity, poll_now or stop
+        self.wake = threading.Event()
+
+    def record_price(self, price):
+        """Record a successful poll and how far the price moved since the last one"""
+        with self.lock:
+            self.failures = 0
+            price = float(price)
+            if self.last_price:
+                move = abs(price - self.last_price) / self.last_price
+                if self.volatility is None:
+                    self.volatility = move
+                else:
+                    self.volatility += self.smoothing * (move - self.volatility)
+            self.last_price = price
+
+    def record_failure(self):
+        """Record a poll where every source failed"""
+        with self.lock:
+            self.failures += 1
+
+    def record_rate_limit(self, seconds):
+        """Hold off polling for at least seconds"""
+        with self.lock:
+            self.rate_limited_until = max(self.rate_limited_until, time.monotonic() + seconds)
+
+    def observe_response(self, response):
+        """Pick up rate-limit hints from an upstream response's headers"""
+        headers = response.headers
+        retry_after = headers.get("Retry-After")
+        if retry_after:
+            self.record_rate_limit(self.parse_retry_after(retry_after))
+        elif response.status_code == 429:
+            self.record_rate_limit(self.base_interval)
+
+        if headers.get("X-RateLimit-Remaining") == "0":
+            try:
+                reset = float(headers.get("X-RateLimit-Reset", ""))
+            except ValueError:
+                return
+            # Reset is either seconds from now or an epoch timestamp
+            self.record_rate_limit(reset - time.time() if reset > 1e9 else reset)
+
+    def parse_retry_after(self, value):
+        """Parse a Retry-After header given in seconds or as an HTTP date"""
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return self.base_interval
+
+    def next_interval(self, jitter=True):
+        """Get the number of seconds to wait before the next poll"""
+        with self.lock:
+            if self.failures:
+                # Exponential backoff while sources are unhealthy
+                interval = self.base_interval * 2 ** min(self.failures, 10)
+            elif self.volatility is not None:
+                # Poll more often the faster the price moves, and less often while it is flat
+                interval = self.base_interval * self.target_move / max(self.volatility, 1e-9)
+            else:
+                interval = self.base_interval
+
+            interval = min(self.max_interval, max(self.min_interval, interval))
+            if jitter:
+                interval *= 1 + random.uniform(-self.jitter, self.jitter)
+
+            rate_limit = self.rate_limited_until - time.monotonic()
+            return max(interval, rate_limit)
+
+    def next_poll_time(self):
+        """Get the latest epoch time the next poll can be due, jitter included, to tell other instances"""
+        return time.time() + self.next_interval(jitter=False) * (1 + self.jitter)
+
+    def pause(self):
+        """Stop polling, e.g. while the window is minimised"""
+        self.paused = True
+
+    def resume(self):
+        """Start polling again"""
+        self.paused = False
+        self.wake.set()
+
+    def poll_now(self):
+        """Make the next poll due at once, e.g. when a push feed drops"""
+        self.due = True
+        self.wake.set()
+
+    def touch(self):
+        """Record user activity, resuming polling if it was idle"""
+        was_idle = self.is_idle()
+        self.last_activity = time.monotonic()
+        if was_idle:
+            self.wake.set()
+
+    def is_idle(self):
+        """Check whether the user has been away for longer than idle_after"""
+        return bool(self.idle_after) and time.monotonic() - self.last_activity > self.idle_after
+
+    def is_paused(self):
+        """Check whether polling is paused or idle"""
+        return self.paused or self.is_idle()
+
+    def stop(self):
+        """Make sleep() return False so the poll loop ends"""
+        self.stopped = True
+        self.wake.set()
+
+    def sleep(self, on_pause=None):
+        """Wait until the next poll is due and polling is not paused, return False once stopped
+
+        on_pause is called once a due poll is held back by a pause, e.g. to
+        hand polling over to another instance.
+        """
+        deadline = time.monotonic() + self.next_interval()
+        held = False
+        while not self.stopped:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self.due:
+                if not self.is_paused():
+                    self.due = False
+                    return True
+                if on_pause is not None and not held:
+                    on_pause()
+                held = True
+
+            # Paused or idle: wait for a wake-up, rechecking idleness now and then
+            timeout = remaining if remaining > 0 else min(60, self.idle_after or 60)
+            self.wake.wait(timeout)
+            self.wake.clear()
+        return False
@@ -0,0 +1,126 @@
+from collections import namedtuple
+import threading
+import time
+
+# Key of the only quote both apps currently show
+DEFAULT_QUOTE = "ADA/CAD"
+
+# A cached value and the monotonic time it was fetched at
+CachedQuote = namedtuple("CachedQuote", ["value", "fetched_at"])
+
+
+class _Flight:
+    """A load in progress that concurrent callers wait on instead of starting their own"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class PriceCache:
+    """TTL quote cache with stale-while-revalidate and request collapsing
+
+    A quote younger than ttl is served straight from memory. An older quote is
+    still served at once, while a background refresh replaces it, unless it is
+    older than max_stale. Concurrent loads of the same key share a single
+    upstream call.
+    """
+
+    def __init__(self, ttl=10.0, max_stale=None):
+        self.ttl = ttl
+        self.max_stale = max_stale
+
+        self.entries = {}
+        self.flights = {}
+        self.lock = threading.Lock()
+
+    def peek(self, key=DEFAULT_QUOTE):
+        """Get the cached value for key without loading it, or None"""
+        entry = self.entries.get(key)
+        return entry.value if entry else None
+
+    def age(self, key=DEFAULT_QUOTE):
+        """Get the age of the cached value in seconds, or None if there is none"""
+        entry = self.entries.get(key)
+        return time.monotonic() - entry.fetched_at if entry else None
+
+    def put(self, key, value):
+        """Store a value fetched elsewhere"""
+        with self.lock:
+            self.entries[key] = CachedQuote(value, time.monotonic())
+
+    def get(self, key, loader, block=True):
+        """Get the value for key, refreshing it in the background when stale
+
+        loader is called with no arguments and returns the new value, or None
+        when it could not fetch one. If nothing usable is cached, the load
+        happens in the calling thread, unless block is False, in which case
+        the load is started in the background and None is returned.
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry.fetched_at
+            if age < self.ttl:
+                return entry.value
+            if self.max_stale is None or age < self.ttl + self.max_stale:
+                self.refresh_async(key, loader)
+                return entry.value
+
+        if not block:
+            self.refresh_async(key, loader)
+            return None
+
+        return self.refresh(key, loader)
+
+    def refresh(self, key, loader):
+        """Load a fresh value now, joining a load already in flight for key"""
+        flight, leader = self.join_flight(key)
+        if leader:
+            self.run_flight(key, loader, flight)
+
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def refresh_async(self, key, loader):
+        """Start a background load for key unless one is already in flight"""
+        flight, leader = self.join_flight(key)
+        if leader:
+            thread = threading.Thread(
+                target=self.run_flight,
+                args=(key, loader, flight, True),
+                daemon=True
+            )
+            thread.start()
+
+    def join_flight(self, key):
+        """Get the load in flight for key, and whether the caller has to run it"""
+        with self.lock:
+            flight = self.flights.get(key)
+            if flight is not None:
+                return flight, False
+
+            flight = _Flight()
+            self.flights[key] = flight
+            return flight, True
+
+    def run_flight(self, key, loader, flight, background=False):
+        """Run loader for a flight and hand the result to every waiter"""
+        try:
+            value = loader()
+            if value is not None:
+                self.put(key, value)
+            # Fall back to the stale value when the load came back empty
+            flight.value = value if value is not None else self.peek(key)
+        except Exception as e:
+            if background:
+                print(f"Error refreshing {key}: {e}")
+                flight.value = self.peek(key)
+            else:
+                flight.error = e
+        finally:
+            with self.lock:
+                self.flights.pop(key, None)
+            flight.done.set()
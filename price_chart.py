@@ -0,0 +1,162 @@
+from datetime import datetime
+import time
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.collections import PolyCollection
+from matplotlib import dates as mdates
+from downsample import lttb
+
+# Matplotlib date numbers count days since the Unix epoch
+SECONDS_PER_DAY = 86400.0
+
+
+class PriceChart:
+    """Price chart that keeps one figure and updates its artists in place
+
+    The line and the fill below it are animated artists. When a new point
+    still fits the current axes, only those two are redrawn over a cached
+    background and blitted. Axes are rescaled (with headroom) and the whole
+    figure redrawn only when the data leaves the visible range.
+
+    Series longer than the plot is wide are downsampled with LTTB to about
+    one point per pixel before drawing.
+
+    Without a Tk master the chart renders off-screen with the Agg canvas,
+    which is what the benchmarks use.
+    """
+
+    def __init__(self, master=None, line_color="#007AFF", fill_color="#5AC8FA",
+                 text_color="#1D1D1F", figsize=(4, 3), dpi=100):
+        # Create figure
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        self.figure.patch.set_facecolor('#FFFFFF')
+
+        if master is not None:
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+            self.canvas = FigureCanvasTkAgg(self.figure, master=master)
+        else:
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            self.canvas = FigureCanvasAgg(self.figure)
+
+        # Add subplot
+        self.plot = self.figure.add_subplot(111)
+
+        # Style the plot to match the app
+        self.plot.spines['top'].set_visible(False)
+        self.plot.spines['right'].set_visible(False)
+        self.plot.spines['bottom'].set_color('#CCCCCC')
+        self.plot.spines['left'].set_color('#CCCCCC')
+
+        self.plot.tick_params(axis='both', colors=text_color, labelsize=8)
+        self.plot.grid(axis='y', linestyle='--', alpha=0.3)
+
+        self.plot.set_title('ADA Price (CAD)', fontsize=10, color=text_color)
+
+        # Time axis with at most 5 local-time labels, formatted only when drawn
+        tz = datetime.now().astimezone().tzinfo
+        self.plot.xaxis.set_major_locator(mdates.AutoDateLocator(minticks=2, maxticks=5, tz=tz))
+        self.plot.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M', tz=tz))
+        now = time.time() / SECONDS_PER_DAY
+        self.plot.set_xlim(now - 600 / SECONDS_PER_DAY, now)
+
+        # The price line and a subtle fill below it, both redrawn by blitting
+        self.line, = self.plot.plot([], [], color=line_color, linewidth=2, animated=True)
+        self.fill = PolyCollection([], facecolor=fill_color, alpha=0.2,
+                                   edgecolor='none', animated=True)
+        self.plot.add_collection(self.fill, autolim=False)
+
+        # If no data yet, show a placeholder message
+        self.placeholder = self.plot.text(
+            0.5, 0.5, 'Price data will appear here',
+            horizontalalignment='center', verticalalignment='center',
+            transform=self.plot.transAxes
+        )
+
+        # Background without the animated artists, captured after every full draw
+        self.background = None
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+        self.canvas.draw()
+
+    def update(self, timestamps, prices):
+        """Show prices at the given epoch timestamps"""
+        if len(prices) < 2:
+            self.line.set_visible(False)
+            self.fill.set_visible(False)
+            if not self.placeholder.get_visible():
+                self.placeholder.set_visible(True)
+                self.canvas.draw()
+            return
+
+        x = np.asarray(timestamps, dtype=float) / SECONDS_PER_DAY
+        y = np.asarray(prices, dtype=float)
+        x, y = lttb(x, y, self.pixel_width())
+
+        self.line.set_data(x, y)
+        self.fill.set_verts([self.fill_vertices(x, y)])
+        self.line.set_visible(True)
+        self.fill.set_visible(True)
+
+        rescaled = self.rescale(x, y)
+        if self.placeholder.get_visible():
+            self.placeholder.set_visible(False)
+            rescaled = True
+
+        if rescaled or self.background is None:
+            self.canvas.draw()
+        else:
+            self.blit()
+
+    def pixel_width(self):
+        """Get the width of the plot area in pixels"""
+        return max(3, int(self.plot.bbox.width))
+
+    def fill_vertices(self, x, y):
+        """Get the polygon between the price line and zero"""
+        vertices = np.empty((len(x) + 2, 2))
+        vertices[0] = (x[0], 0)
+        vertices[1:-1, 0] = x
+        vertices[1:-1, 1] = y
+        vertices[-1] = (x[-1], 0)
+        return vertices
+
+    def rescale(self, x, y):
+        """Move the axes limits only when the data leaves them, return True if they moved"""
+        rescaled = False
+
+        x_min, x_max = x[0], x[-1]
+        left, right = self.plot.get_xlim()
+        span = max(x_max - x_min, 60 / SECONDS_PER_DAY)
+        if x_min < left or x_max > right or x_min - left > (right - left) / 2:
+            # Leave room on the right so the next few points fit without a redraw
+            self.plot.set_xlim(x_min, x_max + span * 0.25)
+            rescaled = True
+
+        # Set y-axis to start from 0 or slightly lower than the min price
+        y_min, y_max = y.min(), y.max()
+        bottom, top = self.plot.get_ylim()
+        new_bottom, new_top = max(0, y_min * 0.9), y_max * 1.1
+        if y_min < bottom or y_max > top or (top - bottom) > 2 * (new_top - new_bottom):
+            self.plot.set_ylim(new_bottom, new_top)
+            rescaled = True
+
+        return rescaled
+
+    def on_draw(self, event):
+        """Capture the static background and draw the animated artists over it"""
+        self.background = self.canvas.copy_from_bbox(self.plot.bbox)
+        self.draw_animated()
+
+    def draw_animated(self):
+        """Draw the line and fill, the only artists that change between ticks"""
+        self.plot.draw_artist(self.fill)
+        self.plot.draw_artist(self.line)
+
+    def blit(self):
+        """Redraw only the animated artists over the cached background"""
+        self.canvas.restore_region(self.background)
+        self.draw_animated()
+        self.canvas.blit(self.plot.bbox)
+
+    def destroy(self):
+        """Release the figure"""
+        self.figure.clear()
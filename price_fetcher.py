@@ -0,0 +1,132 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import time
+from metrics import get_metrics
+from source_registry import SourceRegistry
+
+# Outcome of a fetch: the winning price, which source produced it and how long it took
+FetchResult = namedtuple("FetchResult", ["price", "source", "elapsed"])
+
+
+def is_valid_price(price):
+    """Check whether a source returned a usable price"""
+    if not price or price == "0.00":
+        return False
+    try:
+        return float(price) > 0
+    except (TypeError, ValueError):
+        return False
+
+
+class PriceFetcher:
+    """Fetch a price from several sources at once and keep the first valid quote
+
+    With hedge_delay=0 every source is queried at the same time. A positive
+    hedge_delay staggers the requests instead: the next source is only started
+    if no valid quote arrived within hedge_delay seconds, or as soon as every
+    running source has failed. Either way the wait is bounded by the fastest
+    healthy source rather than the sum of all timeouts.
+
+    Sources are taken from a SourceRegistry, fastest healthy source first,
+    and every attempt is recorded there, including the ones abandoned after
+    another source won, so the order and the circuit breakers stay current.
+    """
+
+    def __init__(self, sources, hedge_delay=0.0, timeout=6.0, max_workers=None):
+        # Sources are a SourceRegistry or (name, callable) pairs, where the callable returns a price string or None
+        if isinstance(sources, SourceRegistry):
+            self.registry = sources
+        else:
+            self.registry = SourceRegistry(sources)
+        self.hedge_delay = hedge_delay
+        self.timeout = timeout
+
+        # A long-lived pool, so abandoned slow requests never hold up the caller
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or max(4, len(self.registry) * 2),
+            thread_name_prefix="price-fetch"
+        )
+        
+        # Requests still running, including the ones abandoned after another source won
+        self.pending = set()
+
+    def fetch(self):
+        """Return a FetchResult for the first valid quote, or one with price None"""
+        start = time.monotonic()
+        sources = self.registry.ordered()
+        deadline = start + self.timeout
+        next_launch = start
+        launched = 0
+        running = {}
+
+        while True:
+            now = time.monotonic()
+
+            # Start the next source when its hedge slot is due
+            while launched < len(sources) and now >= next_launch:
+                name, fetch = sources[launched]
+                future = self.executor.submit(self.run_source, name, fetch)
+                self.pending.add(future)
+                future.add_done_callback(self.pending.discard)
+                running[future] = name
+                launched += 1
+                next_launch = now + self.hedge_delay
+
+            if not running or now >= deadline:
+                break
+
+            wake_at = next_launch if launched < len(sources) else deadline
+            done, _ = wait(running, timeout=max(0, min(wake_at, deadline) - now),
+                           return_when=FIRST_COMPLETED)
+
+            for future in done:
+                name = running.pop(future)
+                try:
+                    price = future.result()
+                except Exception as e:
+                    print(f"Error fetching price from {name}: {e}")
+                    price = None
+
+                if is_valid_price(price):
+                    self.cancel(running)
+                    elapsed = time.monotonic() - start
+                    get_metrics().observe("quote_fetch_seconds", elapsed, source=name)
+                    return FetchResult(price, name, elapsed)
+
+            # Every running source failed, so there is no point waiting for the next slot
+            if not running:
+                next_launch = time.monotonic()
+
+        self.cancel(running)
+        get_metrics().count("quote_failures_total")
+        return FetchResult(None, None, time.monotonic() - start)
+
+    def run_source(self, name, fetch):
+        """Call one source on a worker thread and record the outcome in the registry"""
+        start = time.monotonic()
+        try:
+            price = fetch()
+        except Exception as e:
+            self.registry.record_error(name, time.monotonic() - start, e)
+            raise
+
+        elapsed = time.monotonic() - start
+        if is_valid_price(price):
+            self.registry.record_success(name, elapsed)
+        else:
+            self.registry.record_parse_failure(name, elapsed)
+        return price
+
+    def cancel(self, running):
+        """Cancel sources that have not started and abandon the ones in flight"""
+        for future in running:
+            future.cancel()
+        running.clear()
+
+    def wait_idle(self, timeout=None):
+        """Wait for every request to finish, abandoned ones included"""
+        wait(list(self.pending), timeout=timeout)
+
+    def shutdown(self):
+        """Stop the worker pool without waiting for abandoned requests"""
+        self.executor.shutdown(wait=False)
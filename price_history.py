@@ -0,0 +1,63 @@
+from array import array
+
+
+class PriceHistory:
+    """Fixed-size circular buffer of (epoch timestamp, price) pairs
+
+    Every point is written twice, at its slot and at the same slot plus
+    capacity. That keeps the latest points contiguous in memory, so append
+    and eviction are O(1) and timestamps()/prices() return views with no
+    copying, whatever the capacity. Views are memoryviews over compact
+    double arrays, so numpy.asarray() wraps them without a copy too.
+
+    The views stay valid until the next append.
+    """
+
+    def __init__(self, capacity=24):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.times = array('d', [0.0]) * (2 * capacity)
+        self.values = array('d', [0.0]) * (2 * capacity)
+        self.times_view = memoryview(self.times)
+        self.values_view = memoryview(self.values)
+        self.count = 0
+        self.next = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, timestamp, price):
+        """Add a point, evicting the oldest one when the buffer is full"""
+        slot = self.next
+        self.times[slot] = self.times[slot + self.capacity] = timestamp
+        self.values[slot] = self.values[slot + self.capacity] = price
+
+        self.next = (slot + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def window(self):
+        """Get the slice of the backing arrays holding the points, oldest first"""
+        start = self.next if self.count == self.capacity else 0
+        return slice(start, start + self.count)
+
+    def timestamps(self):
+        """Get a view of the epoch timestamps, oldest first"""
+        return self.times_view[self.window()]
+
+    def prices(self):
+        """Get a view of the prices, oldest first"""
+        return self.values_view[self.window()]
+
+    def latest(self):
+        """Get the newest (timestamp, price) pair, or None when empty"""
+        if not self.count:
+            return None
+        slot = (self.next - 1) % self.capacity
+        return self.times[slot], self.values[slot]
+
+    def clear(self):
+        """Remove every point"""
+        self.count = 0
+        self.next = 0
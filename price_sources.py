@@ -0,0 +1,50 @@
+from http_transport import get_transport
+from html_extract import extract_google_price, extract_coingecko_price
+from quote_matrix import get_quote_matrix
+
+
+# Pages the scraped sources read, shared with the async sources in async_fetch
+GOOGLE_URL = "https://www.google.ca/search?q=ADA+to+CAD"
+COINGECKO_URL = "https://www.coingecko.com/en/coins/cardano"
+
+
+# Sources raise on network and HTTP errors and return None when the page has
+# no price, so the source registry can tell the two apart
+
+
+def google_price(response):
+    """Get the price out of a Google search response"""
+    response.raise_for_status()
+    return extract_google_price(response.content, response.encoding)
+
+
+def coingecko_price(response):
+    """Get the price out of a CoinGecko page response"""
+    response.raise_for_status()
+    return extract_coingecko_price(response.content, response.encoding)
+
+
+def get_price_from_google(transport=None):
+    """Get price from Google search"""
+    return google_price((transport or get_transport()).get(GOOGLE_URL, preset='browser', timeout=5))
+
+
+def get_price_from_api(matrix=None):
+    """Get price from CoinGecko API, refreshing every pair of the quote matrix in the same request"""
+    matrix = matrix or get_quote_matrix()
+    matrix.refresh()
+    price = matrix.price("ADA", "CAD")
+    return str(price) if price is not None else None
+
+
+def get_price_from_coingecko(transport=None):
+    """Get price from CoinGecko website as fallback"""
+    return coingecko_price((transport or get_transport()).get(COINGECKO_URL, preset='browser', timeout=5))
+
+
+# Sources in their preferred order, as (name, fetcher) pairs
+DEFAULT_SOURCES = [
+    ("google", get_price_from_google),
+    ("coingecko_api", get_price_from_api),
+    ("coingecko_web", get_price_from_coingecko),
+]
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import random
+import time
+
+# Kraken's public ticker feed, which trades ADA against CAD directly
+KRAKEN_URL = "wss://ws.kraken.com/v2"
+KRAKEN_SYMBOL = "ADA/CAD"
+
+# Connection states
+CONNECTING = "connecting"
+LIVE = "live"
+DOWN = "down"
+
+
+def kraken_subscribe(symbol=KRAKEN_SYMBOL):
+    """Get the message that subscribes to a symbol's ticker on Kraken's v2 feed"""
+    return {"method": "subscribe", "params": {"channel": "ticker", "symbol": [symbol]}}
+
+
+def parse_kraken_ticker(message, symbol=KRAKEN_SYMBOL):
+    """Get the last trade price out of a Kraken v2 ticker message, or None for other messages"""
+    if message.get("channel") != "ticker":
+        return None
+    for ticker in message.get("data", ()):
+        if ticker.get("symbol") == symbol and ticker.get("last") is not None:
+            return float(ticker["last"])
+    return None
+
+
+def parse_price_event(message):
+    """Get the price out of a plain {"price": ...} event, as sent by SSE feeds, or None"""
+    price = message.get("price")
+    return float(price) if price is not None else None
+
+
+class PriceStream:
+    """Persistent WebSocket or SSE ticker connection that pushes prices as they trade
+
+    Each price the parser finds is handed to on_tick(price, timestamp),
+    at most once per min_interval with the latest price winning, so a busy
+    feed cannot flood the UI. The connection is re-established after any
+    drop, with exponential backoff and jitter. on_state(live) is called
+    with True when prices start arriving and False when a live stream
+    drops, so callers can fall back to polling. A stream that connects but
+    sends no price for stale_after seconds counts as dropped.
+
+    Needs aiohttp. Without it is_available() is False and run() returns at once.
+    """
+
+    def __init__(self, on_tick, url=KRAKEN_URL, kind="websocket", subscribe=None, parse=None,
+                 on_state=None, min_interval=1.0, stale_after=60.0, min_backoff=1.0, max_backoff=60.0):
+        self.on_tick = on_tick
+        self.url = url
+        self.kind = kind
+        self.subscribe = subscribe if subscribe is not None else (kraken_subscribe() if kind == "websocket" else None)
+        self.parse = parse or (parse_kraken_ticker if kind == "websocket" else parse_price_event)
+        self.on_state = on_state
+        self.min_interval = min_interval
+        self.stale_after = stale_after
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+
+        self.state = DOWN
+        self.last_tick_at = None
+        self.reconnects = 0
+        self.stopped = False
+
+        # Throttling of deliveries: when the last one went out, and a newer tick held back
+        self.delivered_at = 0
+        self.pending = None
+        self.flush_handle = None
+
+    def is_available(self):
+        """Check whether aiohttp is installed, which the stream needs"""
+        try:
+            import aiohttp  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def is_live(self):
+        """Check whether the stream is connected and has delivered a price recently"""
+        return (self.state == LIVE and self.last_tick_at is not None
+                and time.monotonic() - self.last_tick_at < self.stale_after)
+
+    def set_state(self, state):
+        was_live = self.state == LIVE
+        self.state = state
+        if self.on_state is not None and was_live != (state == LIVE):
+            try:
+                self.on_state(state == LIVE)
+            except Exception as e:
+                print(f"Error in stream state callback: {e}")
+
+    async def run(self):
+        """Keep the stream connected until stop() is called"""
+        if not self.is_available():
+            print("Price streaming needs aiohttp, polling only")
+            return
+
+        import aiohttp
+        backoff = self.min_backoff
+        async with aiohttp.ClientSession() as session:
+            while not self.stopped:
+                self.set_state(CONNECTING)
+                try:
+                    if self.kind == "websocket":
+                        await self.read_websocket(session)
+                    else:
+                        await self.read_sse(session)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"Price stream error: {e}")
+                finally:
+                    self.set_state(DOWN)
+
+                if self.stopped:
+                    break
+                if self.last_tick_at is not None and time.monotonic() - self.last_tick_at < self.stale_after:
+                    # The connection was healthy before it dropped, so retry quickly
+                    backoff = self.min_backoff
+                self.reconnects += 1
+                await asyncio.sleep(backoff * random.uniform(0.5, 1.0))
+                backoff = min(self.max_backoff, backoff * 2)
+
+    async def read_websocket(self, session):
+        """Read ticker messages from a WebSocket until it closes or goes quiet"""
+        import aiohttp
+        async with session.ws_connect(self.url, heartbeat=self.stale_after / 2) as ws:
+            if self.subscribe is not None:
+                await ws.send_json(self.subscribe)
+            while not self.stopped:
+                message = await ws.receive(timeout=self.stale_after)
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    return
+                self.handle(json.loads(message.data))
+
+    async def read_sse(self, session):
+        """Read server-sent events until the response ends or goes quiet"""
+        import aiohttp
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=self.stale_after)
+        async with session.get(self.url, headers={"Accept": "text/event-stream"}, timeout=timeout) as response:
+            response.raise_for_status()
+            data = []
+            async for line in response.content:
+                line = line.decode("utf-8").rstrip("\r\n")
+                if line.startswith("data:"):
+                    data.append(line[5:].strip())
+                elif not line and data:
+                    # A blank line ends the event
+                    self.handle(json.loads("\n".join(data)))
+                    data = []
+                if self.stopped:
+                    return
+
+    def handle(self, message):
+        """Pass a message's price on, throttled to one delivery per min_interval"""
+        if not isinstance(message, dict):
+            return
+        price = self.parse(message)
+        if price is None:
+            return
+
+        now = time.monotonic()
+        self.last_tick_at = now
+        self.set_state(LIVE)
+
+        self.pending = (price, time.time())
+        wait = self.delivered_at + self.min_interval - now
+        if wait <= 0:
+            self.flush()
+        elif self.flush_handle is None:
+            # Deliver the latest held-back tick once the interval is up
+            self.flush_handle = asyncio.get_event_loop().call_later(wait, self.flush)
+
+    def flush(self):
+        """Deliver the held-back tick, if any"""
+        self.flush_handle = None
+        if self.pending is None:
+            return
+        price, timestamp = self.pending
+        self.pending = None
+        self.delivered_at = time.monotonic()
+        try:
+            self.on_tick(price, timestamp)
+        except Exception as e:
+            print(f"Error handling streamed price: {e}")
+
+    def stop(self):
+        """Stop reconnecting; the connection closes at its next message"""
+        self.stopped = True
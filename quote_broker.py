@@ -0,0 +1,216 @@
+"""Share the latest quote between every converter running on the machine
+
+One process, the leader, polls upstream and writes each quote into a small
+memory-mapped file. Every other instance reads the quote from there and
+never touches the network. The leader is whichever process holds an
+exclusive lock on the file; the OS drops the lock when that process exits,
+and the leader gives it up while its polling is paused, so the next instance
+to poll takes over. With each quote the leader publishes when its next poll
+is due, so the others know how long the quote stays current however far
+apart its polls are.
+
+Reads are lock-free, guarded by a sequence counter (a seqlock): the writer
+makes it odd before changing the slot and even again after, and a reader
+retries when the counter was odd or moved while it copied the slot.
+
+The broker lives in the data directory, so one user's windows share it.
+Point CARDANO_CONVERTER_BROKER at a file in a directory every user can
+write to share it across users, or set it to "off" to poll separately.
+"""
+from collections import namedtuple
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from app_paths import data_path
+
+# File name of the shared slot in the data directory
+BROKER_FILE = "quote_broker.bin"
+
+# Slot layout: magic, sequence counter, leader pid, quote time, write time, next poll
+# time, the five market stats (NaN when unknown), then the price and source text
+MAGIC = b"ADQ2"
+HEADER = struct.Struct("<4sxxxxQQddd5d")
+TEXT_SIZE = 32
+PRICE_OFFSET = HEADER.size
+SOURCE_OFFSET = PRICE_OFFSET + TEXT_SIZE
+SLOT_SIZE = SOURCE_OFFSET + TEXT_SIZE
+SEQUENCE = struct.Struct("<Q")
+SEQUENCE_OFFSET = 8
+
+# Reads retried this many times while the leader is writing before giving up
+READ_RETRIES = 100
+
+SharedQuote = namedtuple("SharedQuote", ["price", "source", "timestamp", "written", "pid", "next_poll", "stats"])
+SharedStats = namedtuple("SharedStats", ["market_cap", "volume", "supply", "max_supply", "change_24h"])
+
+
+def encode_text(text):
+    """Pack text into a fixed-size, NUL-padded field, cutting it to fit"""
+    return (text or "").encode("utf-8")[:TEXT_SIZE].ljust(TEXT_SIZE, b"\0")
+
+
+def decode_text(field):
+    return bytes(field).rstrip(b"\0").decode("utf-8", errors="replace")
+
+
+def lock_file(fd):
+    """Take an exclusive lock on fd without waiting, returning whether it was taken"""
+    try:
+        import fcntl
+    except ImportError:
+        import msvcrt
+        try:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def unlock_file(fd):
+    """Release a lock taken with lock_file"""
+    try:
+        import fcntl
+    except ImportError:
+        import msvcrt
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        return
+    fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+class QuoteBroker:
+    """A memory-mapped quote slot, written by one leader process and read by all the others
+
+    Call try_lead() before each poll. While it returns True this process
+    polls and publishes what it gets, with the time its next poll is due,
+    and calls step_down() when it stops polling. Otherwise read() gives the
+    leader's latest quote; callers should poll for themselves when it is
+    missing or the leader's next poll is over grace seconds late, e.g.
+    because the leader's sources are failing.
+    """
+
+    def __init__(self, path=None, grace=30.0):
+        self.path = path or data_path(BROKER_FILE)
+        self.grace = grace
+        self.leading = False
+        self.lock = threading.Lock()
+
+        # Last values written, so quotes and stats can be published separately
+        self.price = None
+        self.source = None
+        self.timestamp = 0.0
+        self.next_poll = 0.0
+        self.stats = SharedStats(*[math.nan] * 5)
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o664)
+        try:
+            if os.fstat(fd).st_size < SLOT_SIZE:
+                os.ftruncate(fd, SLOT_SIZE)
+            self.map = mmap.mmap(fd, SLOT_SIZE)
+        except OSError:
+            os.close(fd)
+            raise
+        self.fd = fd
+
+    def try_lead(self):
+        """Become the leader if no other process is, returning whether this process leads"""
+        if not self.leading:
+            self.leading = lock_file(self.fd)
+        return self.leading
+
+    def step_down(self):
+        """Give up the lead, e.g. while polling is paused, so another instance takes over"""
+        if self.leading:
+            self.leading = False
+            unlock_file(self.fd)
+
+    def publish_quote(self, price, source, timestamp=None, next_poll=None):
+        """Write a quote and the epoch time of the next poll to the slot; only the leader should call this
+
+        Without next_poll the quote is only current for grace seconds.
+        """
+        with self.lock:
+            self.price, self.source = str(price), source
+            self.timestamp = timestamp or time.time()
+            self.next_poll = next_poll or self.timestamp
+            self.write()
+
+    def publish_stats(self, stats):
+        """Write market stats (anything with the SharedStats fields) to the slot"""
+        with self.lock:
+            self.stats = SharedStats(*[math.nan if value is None else float(value)
+                                       for value in (stats.market_cap, stats.volume, stats.supply,
+                                                     stats.max_supply, stats.change_24h)])
+            self.write()
+
+    def write(self):
+        sequence = SEQUENCE.unpack_from(self.map, SEQUENCE_OFFSET)[0]
+        # Odd while the slot is being changed, so readers know to retry
+        SEQUENCE.pack_into(self.map, SEQUENCE_OFFSET, sequence + 1)
+        HEADER.pack_into(self.map, 0, MAGIC, sequence + 1, os.getpid(), self.timestamp, time.time(),
+                         self.next_poll, *self.stats)
+        self.map[PRICE_OFFSET:SOURCE_OFFSET] = encode_text(self.price)
+        self.map[SOURCE_OFFSET:SLOT_SIZE] = encode_text(self.source)
+        SEQUENCE.pack_into(self.map, SEQUENCE_OFFSET, sequence + 2)
+
+    def read(self):
+        """Get the latest SharedQuote, or None when nothing has been published yet"""
+        for _ in range(READ_RETRIES):
+            before = SEQUENCE.unpack_from(self.map, SEQUENCE_OFFSET)[0]
+            if before % 2:
+                time.sleep(0)
+                continue
+            slot = self.map[:SLOT_SIZE]
+            if SEQUENCE.unpack_from(self.map, SEQUENCE_OFFSET)[0] != before:
+                continue
+
+            magic, _, pid, timestamp, written, next_poll, *stats = HEADER.unpack_from(slot)
+            price = decode_text(slot[PRICE_OFFSET:SOURCE_OFFSET])
+            if magic != MAGIC or not price:
+                return None
+            stats = SharedStats(*[None if math.isnan(value) else value for value in stats])
+            return SharedQuote(price, decode_text(slot[SOURCE_OFFSET:]), timestamp, written, pid, next_poll, stats)
+        return None
+
+    def read_fresh(self):
+        """Get the leader's quote unless its next poll is over grace seconds late, else None"""
+        quote = self.read()
+        if quote is None or time.time() - quote.next_poll > self.grace:
+            return None
+        return quote
+
+    def close(self):
+        """Unmap the slot, giving up the lead"""
+        self.map.close()
+        os.close(self.fd)
+        self.leading = False
+
+
+# Broker shared by everything in the process
+_default_broker = None
+_default_lock = threading.Lock()
+
+
+def get_broker():
+    """Get the shared broker, or None when it is turned off or the slot cannot be opened"""
+    global _default_broker
+    setting = os.environ.get("CARDANO_CONVERTER_BROKER", "")
+    if setting.lower() in ("off", "0", "false"):
+        return None
+    if _default_broker is None:
+        with _default_lock:
+            if _default_broker is None:
+                try:
+                    _default_broker = QuoteBroker(setting or None)
+                except (OSError, ValueError) as e:
+                    print(f"Could not open the shared quote slot, polling separately: {e}")
+                    # Remember the failure so it is not retried on every poll
+                    _default_broker = False
+    return _default_broker or None
@@ -0,0 +1,223 @@
+from array import array
+import json
+import math
+import os
+import threading
+from http_transport import get_transport
+from price_cache import PriceCache
+
+# CoinGecko ids of the assets we can price, by ticker
+ASSET_IDS = {
+    "ADA": "cardano",
+    "BTC": "bitcoin",
+    "ETH": "ethereum",
+    "SOL": "solana",
+    "DOT": "polkadot",
+}
+
+DEFAULT_ASSETS = ("ADA", "BTC", "ETH")
+DEFAULT_FIATS = ("CAD", "USD", "EUR")
+
+# One request prices many ids in many currencies at once
+SIMPLE_PRICE_URL = "https://api.coingecko.com/api/v3/simple/price?ids={ids}&vs_currencies={fiats}"
+
+# Most ids per request, to keep the URL well under common length limits
+MAX_IDS_PER_REQUEST = 100
+
+NAN = float("nan")
+
+# Saved /simple/price response, served by the offline stand-in
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "coingecko_simple_price.json")
+
+
+def split_pair(pair):
+    """Split a pair such as 'ADA/CAD' into its (base, quote) symbols"""
+    base, quote = pair.upper().split("/")
+    return base, quote
+
+
+def load_fixture_prices(urls=None, path=FIXTURE_PATH):
+    """Get /simple/price data from a saved response, for running without a network"""
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+class MatrixTables:
+    """One consistent set of quotes: direct prices and every cross rate, as flat arrays"""
+
+    def __init__(self, prices, rates):
+        # prices is row-major by asset, rates row-major by base symbol, NaN where unknown
+        self.prices = prices
+        self.rates = rates
+
+
+class QuoteMatrix:
+    """Prices of several assets in several fiat currencies, from as few requests as possible
+
+    Every asset is priced in every fiat by one /simple/price request per
+    MAX_IDS_PER_REQUEST assets. The prices are kept in a flat array of
+    doubles, and a table of rates between every pair of symbols, assets and
+    fiats alike, is derived from them on each refresh. Reading any pair is
+    then two dict lookups and one array index, with no fetch. A refresh
+    swaps in new tables whole, so readers never see half an update.
+    """
+
+    KEY = "quote matrix"
+
+    def __init__(self, assets=DEFAULT_ASSETS, fiats=DEFAULT_FIATS, ttl=30.0, fetch=None, transport=None):
+        self.assets = [asset.upper() for asset in assets]
+        self.fiats = [fiat.upper() for fiat in fiats]
+        unknown = [asset for asset in self.assets if asset not in ASSET_IDS]
+        if unknown:
+            raise ValueError(f"No CoinGecko id for {', '.join(unknown)}")
+
+        self.symbols = self.assets + self.fiats
+        self.asset_index = {asset: i for i, asset in enumerate(self.assets)}
+        self.fiat_index = {fiat: i for i, fiat in enumerate(self.fiats)}
+        self.symbol_index = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+        # fetch is called with a list of request URLs and returns the merged /simple/price data
+        self.fetch = fetch or self.fetch_prices
+        self.transport = transport
+        self.cache = PriceCache(ttl=ttl)
+
+    def batches(self):
+        """Get the request URLs that together price every asset in every fiat"""
+        ids = [ASSET_IDS[asset] for asset in self.assets]
+        fiats = ",".join(fiat.lower() for fiat in self.fiats)
+        return [
+            SIMPLE_PRICE_URL.format(ids=",".join(ids[start:start + MAX_IDS_PER_REQUEST]), fiats=fiats)
+            for start in range(0, len(ids), MAX_IDS_PER_REQUEST)
+        ]
+
+    def fetch_prices(self, urls):
+        """Get the merged /simple/price data of every batch from CoinGecko"""
+        transport = self.transport or get_transport()
+        data = {}
+        for url in urls:
+            response = transport.get(url, preset='json', timeout=5)
+            response.raise_for_status()
+            data.update(response.json())
+        return data
+
+    def load(self):
+        """Fetch every price and build new tables"""
+        return self.build(self.fetch(self.batches()))
+
+    def build(self, data):
+        """Build tables from a /simple/price response"""
+        fiat_count = len(self.fiats)
+        prices = array('d', [NAN]) * (len(self.assets) * fiat_count)
+        for asset, row in self.asset_index.items():
+            quotes = data.get(ASSET_IDS[asset], {})
+            for fiat, column in self.fiat_index.items():
+                price = quotes.get(fiat.lower())
+                if price:
+                    prices[row * fiat_count + column] = float(price)
+        return MatrixTables(prices, self.cross_rates(prices))
+
+    def cross_rates(self, prices):
+        """Derive the rate between every pair of symbols from the direct prices
+
+        Every symbol is valued in a common unit, the first fiat that has a
+        price. Fiats are valued through the first asset priced in both, and
+        assets through any fiat they are priced in. Direct prices are then
+        written over their triangulated rates, so quoted pairs stay exact.
+        """
+        fiat_count = len(self.fiats)
+        symbol_count = len(self.symbols)
+        asset_count = len(self.assets)
+
+        def price(row, column):
+            return prices[row * fiat_count + column]
+
+        # Value of every fiat in units of the reference fiat
+        reference = next((column for column in range(fiat_count)
+                          if any(not math.isnan(price(row, column)) for row in range(asset_count))), None)
+        fiat_values = [NAN] * fiat_count
+        if reference is not None:
+            for column in range(fiat_count):
+                for row in range(asset_count):
+                    if not math.isnan(price(row, column)) and not math.isnan(price(row, reference)):
+                        fiat_values[column] = price(row, reference) / price(row, column)
+                        break
+
+        # Value of every asset in units of the reference fiat
+        asset_values = [NAN] * asset_count
+        for row in range(asset_count):
+            for column in range(fiat_count):
+                value = price(row, column) * fiat_values[column]
+                if not math.isnan(value):
+                    asset_values[row] = value
+                    break
+
+        values = asset_values + fiat_values
+        rates = array('d', [NAN]) * (symbol_count * symbol_count)
+        for base in range(symbol_count):
+            for quote in range(symbol_count):
+                if values[quote]:
+                    rates[base * symbol_count + quote] = values[base] / values[quote]
+
+        for row in range(asset_count):
+            for column in range(fiat_count):
+                direct = price(row, column)
+                if not math.isnan(direct):
+                    fiat = asset_count + column
+                    rates[row * symbol_count + fiat] = direct
+                    rates[fiat * symbol_count + row] = 1 / direct
+        return rates
+
+    def refresh(self):
+        """Fetch fresh prices now, sharing a fetch already in flight"""
+        self.cache.refresh(self.KEY, self.load)
+
+    def tables(self):
+        """Get the current tables without waiting, refreshing them in the background when stale"""
+        return self.cache.get(self.KEY, self.load, block=False)
+
+    def price(self, asset, fiat):
+        """Get the quoted price of asset in fiat, or None when it is unknown"""
+        tables = self.tables()
+        row = self.asset_index.get(asset.upper())
+        column = self.fiat_index.get(fiat.upper())
+        if tables is None or row is None or column is None:
+            return None
+        price = tables.prices[row * len(self.fiats) + column]
+        return None if math.isnan(price) else price
+
+    def rate(self, base, quote):
+        """Get how many quote units one base unit is worth, for any two symbols, or None"""
+        tables = self.tables()
+        row = self.symbol_index.get(base.upper())
+        column = self.symbol_index.get(quote.upper())
+        if tables is None or row is None or column is None:
+            return None
+        rate = tables.rates[row * len(self.symbols) + column]
+        return None if math.isnan(rate) else rate
+
+    def quote(self, pair):
+        """Get the rate of a pair written as 'BASE/QUOTE', or None"""
+        return self.rate(*split_pair(pair))
+
+    def snapshot(self):
+        """Get every known direct price as a {'ADA/CAD': price} dict"""
+        return {
+            f"{asset}/{fiat}": self.price(asset, fiat)
+            for asset in self.assets for fiat in self.fiats
+            if self.price(asset, fiat) is not None
+        }
+
+
+# Matrix shared by every consumer in the process
+_default_matrix = None
+_default_lock = threading.Lock()
+
+
+def get_quote_matrix():
+    """Get the shared quote matrix, creating it on first use"""
+    global _default_matrix
+    if _default_matrix is None:
+        with _default_lock:
+            if _default_matrix is None:
+                _default_matrix = QuoteMatrix()
+    return _default_matrix
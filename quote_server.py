@@ -0,0 +1,400 @@
+"""Headless HTTP/JSON quote server
+
+Serves quotes and conversions to any number of local clients from one
+shared cache. A single async fetch loop keeps the ADA/CAD quote fresh, and
+other pairs come from the quote matrix, so upstream traffic does not grow
+with the number of clients.
+
+    python quote_server.py --port 8080
+    curl 'localhost:8080/quote?pair=ADA/CAD'
+    curl 'localhost:8080/convert?amount=100&direction=cad-to-ada'
+    curl -d '{"amounts": [1, 2.5], "direction": "ada-to-cad"}' localhost:8080/convert
+    curl 'localhost:8080/convert?amount=100&direction=cad-to-ada&rounding=half-up'
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import threading
+from urllib.parse import urlsplit, parse_qs
+from conversion import (convert, convert_exact, convert_units, format_units, parse_units, to_decimal,
+                        DIRECTIONS, CAD_TO_ADA, PLACES, ROUNDINGS)
+from price_cache import PriceCache, DEFAULT_QUOTE
+from price_fetcher import PriceFetcher
+from metrics import get_metrics
+from poll_scheduler import AdaptivePollScheduler
+from quote_matrix import QuoteMatrix, get_quote_matrix, load_fixture_prices, split_pair
+
+# Status lines of the responses the server sends
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+# Largest request body accepted, enough for about a million amounts in a batch convert
+MAX_BODY = 16 * 1024 * 1024
+
+# Most header lines, and most bytes of them, accepted before a request is refused with 431
+MAX_HEADERS = 100
+MAX_HEADER_BYTES = 64 * 1024
+
+
+class HttpError(Exception):
+    """An error response, with its status code"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class QuoteServer:
+    """Asyncio HTTP/1.1 server for /quote, /convert, /health and /metrics
+
+    Handlers only ever read the shared cache and the quote matrix, so a
+    request costs no upstream call. The fetch loop runs the blocking price
+    fetcher in a worker thread and sleeps for as long as the adaptive poll
+    scheduler says between polls.
+    """
+
+    def __init__(self, fetcher, matrix=None, scheduler=None, host="127.0.0.1", port=8080):
+        self.fetcher = fetcher
+        self.matrix = matrix or get_quote_matrix()
+        self.scheduler = scheduler or AdaptivePollScheduler(base_interval=30, idle_after=0)
+        self.host = host
+        self.port = port
+
+        self.cache = PriceCache()
+        self.routes = {
+            "/quote": self.handle_quote,
+            "/convert": self.handle_convert,
+            "/health": self.handle_health,
+            "/metrics": self.handle_metrics,
+        }
+
+        self.loop = None
+        self.stopping = None
+        # Set once the socket is bound, so port holds the real port when 0 was asked for
+        self.ready = threading.Event()
+
+    async def fetch_loop(self):
+        """Keep the cached quote fresh, one upstream poll at a time"""
+        while True:
+            result = await self.loop.run_in_executor(None, self.fetcher.fetch)
+            if result.price:
+                self.cache.put(DEFAULT_QUOTE, result)
+                self.scheduler.record_price(result.price)
+            else:
+                self.scheduler.record_failure()
+            await asyncio.sleep(self.scheduler.next_interval())
+
+    async def serve(self):
+        """Serve until stop() is called"""
+        self.loop = asyncio.get_event_loop()
+        self.stopping = asyncio.Event()
+        server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+
+        fetch_task = self.loop.create_task(self.fetch_loop())
+        # Prime the matrix in the background so the first other-pair quote is not empty
+        self.matrix.tables()
+        self.ready.set()
+        try:
+            await self.stopping.wait()
+        finally:
+            fetch_task.cancel()
+            server.close()
+
+    def stop(self):
+        """Stop serving, from any thread"""
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.stopping.set)
+
+    async def handle_connection(self, reader, writer):
+        """Answer requests on one keep-alive connection until the client is done"""
+        try:
+            while True:
+                try:
+                    request_line, headers = await self.read_head(reader)
+                except ValueError:
+                    # A line longer than the stream's limit, which cannot be skipped past
+                    await self.respond(writer, 431, {"error": "Request line or header too long"}, False)
+                    break
+                except HttpError as e:
+                    # The rest of the head is never read, so the connection cannot be reused
+                    await self.respond(writer, e.status, {"error": str(e)}, False)
+                    break
+                if not request_line:
+                    break
+
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                    keep_alive = keep_alive and version == "HTTP/1.1"
+                    length = int(headers.get("content-length") or 0)
+                    if length > MAX_BODY:
+                        keep_alive = False
+                        raise HttpError(413, f"Request body is over {MAX_BODY} bytes")
+                    body = await reader.readexactly(length) if length else b""
+                    if self.runs_in_worker(target, body):
+                        # Batches and exact conversions are parsed, converted and encoded in
+                        # a worker thread, so a costly one does not stall every other connection
+                        payload = await self.loop.run_in_executor(None, self.render, method, target, body)
+                    else:
+                        payload = self.dispatch(method, target, body)
+                    status = 200
+                except HttpError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except ValueError:
+                    status, payload = 400, {"error": "Malformed request"}
+                    keep_alive = False
+                except Exception as e:
+                    print(f"Error handling {request_line!r}: {e}")
+                    status, payload = 500, {"error": "Internal error"}
+
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def read_head(self, reader):
+        """Read a request line and its headers, returning (request_line, headers)
+
+        The request line is empty when the client has closed the connection.
+        Raises ValueError when a line is over the reader's limit, and a 431
+        HttpError past MAX_HEADERS lines or MAX_HEADER_BYTES bytes of headers.
+        """
+        request_line = await reader.readline()
+        headers = {}
+        if not request_line:
+            return request_line, headers
+        count = size = 0
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            count += 1
+            size += len(line)
+            if count > MAX_HEADERS or size > MAX_HEADER_BYTES:
+                raise HttpError(431, f"Over {MAX_HEADERS} header lines or {MAX_HEADER_BYTES} bytes of headers")
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return request_line, headers
+
+    async def respond(self, writer, status, payload, keep_alive):
+        """Write a JSON response, from a payload or the bytes render already encoded"""
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+        )
+        await writer.drain()
+
+    def runs_in_worker(self, target, body):
+        """Check whether a request is a batch or an exact conversion, to keep off the event loop"""
+        return bool(body) or "rounding" in parse_qs(urlsplit(target).query)
+
+    def render(self, method, target, body):
+        """Dispatch a request and encode its JSON payload, for running in a worker thread"""
+        return json.dumps(self.dispatch(method, target, body)).encode()
+
+    def dispatch(self, method, target, body):
+        """Route a request to its handler and return the JSON payload"""
+        url = urlsplit(target)
+        handler = self.routes.get(url.path)
+        if handler is None:
+            raise HttpError(404, f"No such endpoint: {url.path}")
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        return handler(method, query, body)
+
+    def current_quote(self):
+        """Get the cached ADA/CAD FetchResult, or fail with 503 before the first fetch lands"""
+        result = self.cache.peek(DEFAULT_QUOTE)
+        if result is None:
+            raise HttpError(503, "No quote yet, try again shortly")
+        return result
+
+    def handle_quote(self, method, query, body):
+        """GET /quote?pair=ADA/CAD"""
+        if method != "GET":
+            raise HttpError(405, "Use GET for /quote")
+
+        pair = query.get("pair", DEFAULT_QUOTE).upper()
+        if pair == DEFAULT_QUOTE:
+            result = self.current_quote()
+            return {"pair": pair, "price": float(result.price), "source": result.source,
+                    "age": round(self.cache.age(DEFAULT_QUOTE), 3)}
+
+        try:
+            base, quote = split_pair(pair)
+        except ValueError:
+            raise HttpError(400, f"Pairs look like ADA/CAD, not {pair}")
+        unknown = [symbol for symbol in (base, quote) if symbol not in self.matrix.symbol_index]
+        if unknown:
+            raise HttpError(404, f"Unknown symbol: {', '.join(unknown)}")
+
+        rate = self.matrix.rate(base, quote)
+        if rate is None:
+            raise HttpError(503, f"No quote for {pair} yet, try again shortly")
+        return {"pair": pair, "price": rate, "source": "coingecko_api",
+                "age": round(self.matrix.cache.age(self.matrix.KEY), 3)}
+
+    def handle_convert(self, method, query, body):
+        """GET /convert?amount=100&direction=cad-to-ada, or POST a batch of amounts as JSON
+
+        With a rounding mode, the conversion is exact, the amount is echoed
+        as a decimal string and results are decimal strings rounded to the
+        target currency's smallest unit.
+        """
+        if method == "GET":
+            direction = self.direction(query.get("direction", CAD_TO_ADA))
+            rounding = self.rounding(query.get("rounding"))
+            if rounding:
+                # Checked for size first, as a float would read 1e-10000000 as 0
+                try:
+                    exact_amount = to_decimal(query.get("amount"))
+                except ValueError as e:
+                    raise HttpError(400, str(e))
+                # Echoed as the exact string the result was converted from, like the results
+                amount = format(exact_amount, "f")
+            else:
+                amount = self.number(query.get("amount"), "amount")
+            quote = self.current_quote().price
+            if rounding:
+                # Fixed-point, as str() switches to exponent notation for some values
+                result = format(convert_exact(exact_amount, quote, direction, rounding), "f")
+            else:
+                result = convert(amount, float(quote), direction)
+            return {"amount": amount, "direction": direction, "price": float(quote), "result": result}
+
+        if method == "POST":
+            try:
+                request = json.loads(body or b"{}")
+                amounts = request["amounts"]
+            except (ValueError, KeyError, TypeError):
+                raise HttpError(400, 'POST a JSON object like {"amounts": [1, 2.5], "direction": "cad-to-ada"}')
+            self.check_amounts(amounts)
+            direction = self.direction(request.get("direction", CAD_TO_ADA))
+            rounding = self.rounding(request.get("rounding"))
+            quote = self.current_quote().price
+            price = float(quote)
+
+            if rounding:
+                try:
+                    units, places = parse_units(amounts)
+                except ValueError as e:
+                    raise HttpError(400, str(e))
+                target_places = PLACES[DIRECTIONS[direction][1]]
+                results = convert_units(units, quote, direction, rounding, places, target_places)
+                return {"direction": direction, "price": price,
+                        "results": format_units(results, target_places)}
+
+            # Imported here so single conversions do not pay for numpy
+            import numpy as np
+            try:
+                values = np.array(amounts, dtype=float)
+            except ValueError:
+                values = None
+            if values is None or not np.isfinite(values).all():
+                # Find the first bad row, to name it in the error
+                for row, value in enumerate(amounts):
+                    self.number(value, f"amounts[{row}]")
+            return {"direction": direction, "price": price,
+                    "results": convert(values, price, direction).tolist()}
+
+        raise HttpError(405, "Use GET or POST for /convert")
+
+    def handle_health(self, method, query, body):
+        """GET /health: quote age and the health of every price source"""
+        return {"quote_age": self.cache.age(DEFAULT_QUOTE),
+                "next_poll": self.scheduler.next_interval(),
+                "sources": self.fetcher.registry.stats()}
+
+    def handle_metrics(self, method, query, body):
+        """GET /metrics: the timers and counters as JSON, empty unless metrics are enabled"""
+        return get_metrics().snapshot()
+
+    def number(self, value, name):
+        """Parse a query parameter as a finite number, or fail with 400"""
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise HttpError(400, f"{name} must be a number")
+        if not math.isfinite(number):
+            raise HttpError(400, f"{name} must be a finite number")
+        return number
+
+    def check_amounts(self, amounts):
+        """Check a POSTed batch is a list of numbers or numeric strings, or fail with 400 naming the bad row
+
+        null, booleans and empty strings are rejected rather than read as 0.
+        """
+        if not isinstance(amounts, list):
+            raise HttpError(400, "amounts must be a list of numbers")
+        for row, value in enumerate(amounts):
+            if isinstance(value, bool) or not isinstance(value, (int, float, str)) or value == "":
+                raise HttpError(400, f"amounts[{row}] must be a number, not {json.dumps(value)}")
+
+    def rounding(self, value):
+        """Look up an optional rounding mode by name, or fail with 400"""
+        if value is None:
+            return None
+        if not isinstance(value, str) or value not in ROUNDINGS:
+            raise HttpError(400, f"rounding must be one of {', '.join(ROUNDINGS)}")
+        return ROUNDINGS[value]
+
+    def direction(self, value):
+        """Check a conversion direction, or fail with 400"""
+        if not isinstance(value, str) or value not in DIRECTIONS:
+            raise HttpError(400, f"direction must be one of {', '.join(DIRECTIONS)}")
+        return value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve ADA quotes and conversions over HTTP")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: localhost only)")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--interval", type=float, default=30, help="base seconds between upstream polls")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="time fetches and parsing and serve them for Prometheus at :PORT/metrics")
+    args = parser.parse_args(argv)
+
+    if args.metrics_port:
+        metrics = get_metrics()
+        metrics.enable()
+        metrics.serve(args.host, args.metrics_port)
+
+    if os.environ.get("CARDANO_CONVERTER_OFFLINE"):
+        # Serve the saved fixtures, without touching the network
+        from market_stats import MarketFeed, load_fixture_stats
+        fetcher = PriceFetcher([("fixture", MarketFeed(fetch=load_fixture_stats).fetch_price)])
+        matrix = QuoteMatrix(fetch=load_fixture_prices)
+    else:
+        from price_sources import DEFAULT_SOURCES
+        fetcher = PriceFetcher(DEFAULT_SOURCES, hedge_delay=0.75)
+        matrix = None
+
+    scheduler = AdaptivePollScheduler(base_interval=args.interval, idle_after=0)
+    server = QuoteServer(fetcher, matrix, scheduler, args.host, args.port)
+    print(f"Serving quotes on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fetcher.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""Record upstream responses to an archive, and replay them without a network
+
+Set CARDANO_CONVERTER_RECORD to an archive path to save every response the
+app gets, with its timing, while it runs as usual. Set
+CARDANO_CONVERTER_REPLAY to play an archive back instead of touching the
+network, at the recorded speed or, with CARDANO_CONVERTER_REPLAY_SPEED=0,
+as fast as possible.
+
+    python replay_transport.py record prices.jsonl.gz --rounds 20 --interval 30
+    python replay_transport.py fixtures fixtures.jsonl.gz
+    CARDANO_CONVERTER_REPLAY=prices.jsonl.gz python cardano_converter.py
+
+Archives are gzipped JSON Lines. Each distinct body is stored once and
+referred to by hash, so polling the same pages over and over stays small.
+"""
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Headers left out of archives, as they identify the client
+PRIVATE_HEADERS = {"set-cookie", "cookie"}
+
+# Saved pages the fixtures archive is built from, with the URL each stands in for
+FIXTURE_URLS = (
+    ("google_converter.html", "https://www.google.ca/search?q=ADA+to+CAD", "text/html; charset=UTF-8"),
+    ("google_results.html", "https://www.google.ca/search?q=ADA+price", "text/html; charset=UTF-8"),
+    ("coingecko_cardano.html", "https://www.coingecko.com/en/coins/cardano", "text/html; charset=utf-8"),
+    ("coingecko_markets.json", "https://api.coingecko.com/api/v3/coins/markets?vs_currency=cad&ids=cardano",
+     "application/json"),
+    ("coingecko_simple_price.json",
+     "https://api.coingecko.com/api/v3/simple/price?ids=cardano,bitcoin,ethereum&vs_currencies=cad,usd,eur",
+     "application/json"),
+)
+
+
+class ReplayMiss(ConnectionError):
+    """A request with no recorded response, which sources treat like a network error"""
+
+
+class Headers(dict):
+    """Response headers looked up without regard to case"""
+
+    def __init__(self, headers=()):
+        super().__init__((name.lower(), value) for name, value in dict(headers).items())
+
+    def __getitem__(self, name):
+        return super().__getitem__(name.lower())
+
+    def __contains__(self, name):
+        return super().__contains__(name.lower())
+
+    def get(self, name, default=None):
+        return super().get(name.lower(), default)
+
+
+class RecordedResponse:
+    """A response read from an archive, shaped like the requests one the sources get"""
+
+    def __init__(self, url, status_code, headers, content, encoding=None):
+        self.url = url
+        self.status_code = status_code
+        self.headers = Headers(headers)
+        self.content = content
+        self.encoding = encoding
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise ConnectionError(f"HTTP {self.status_code} from {self.url}")
+
+
+def body_id(content):
+    """Get the short hash a body is stored under"""
+    return hashlib.sha1(content).hexdigest()[:16]
+
+
+class ArchiveWriter:
+    """Appends responses to an archive, storing each distinct body once"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.stored = set()
+        self.started = time.monotonic()
+        self.file = gzip.open(path, "at", encoding="utf-8")
+
+    def write(self, url, status_code, headers, content, encoding, elapsed):
+        """Add one response, taken elapsed seconds after the request was sent"""
+        key = body_id(content)
+        headers = {name: value for name, value in dict(headers).items() if name.lower() not in PRIVATE_HEADERS}
+        with self.lock:
+            if key not in self.stored:
+                self.stored.add(key)
+                self.file.write(json.dumps({"type": "body", "id": key,
+                                            "data": base64.b64encode(content).decode("ascii")}) + "\n")
+            self.file.write(json.dumps({"type": "response", "at": round(time.monotonic() - self.started, 6),
+                                        "elapsed": round(elapsed, 6), "url": url, "status": status_code,
+                                        "headers": headers, "encoding": encoding, "body": key}) + "\n")
+            # Keep the archive readable even if the app is killed
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def read_archive(path):
+    """Get the recorded responses of an archive, in order, with their bodies resolved"""
+    bodies = {}
+    responses = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                record = json.loads(line)
+                if record["type"] == "body":
+                    bodies[record["id"]] = base64.b64decode(record["data"])
+                else:
+                    record["content"] = bodies[record["body"]]
+                    responses.append(record)
+        except (EOFError, ValueError):
+            # The recording was cut off mid-write, so keep what was complete
+            pass
+    return responses
+
+
+class RecordingTransport:
+    """Passes requests to a real transport and records every response in an archive"""
+
+    # Requests have to come through here to be recorded, so the async transport should not go around it
+    intercepts = True
+
+    def __init__(self, transport, path):
+        self.transport = transport
+        self.writer = ArchiveWriter(path)
+
+    def get(self, url, **kwargs):
+        start = time.perf_counter()
+        response = self.transport.get(url, **kwargs)
+        self.writer.write(url, response.status_code, response.headers, response.content,
+                          response.encoding, time.perf_counter() - start)
+        return response
+
+    def add_listener(self, listener):
+        self.transport.add_listener(listener)
+
+    def remove_listener(self, listener):
+        self.transport.remove_listener(listener)
+
+    def close(self):
+        self.writer.close()
+        self.transport.close()
+
+
+class ReplayTransport:
+    """Answers requests from an archive, without a network
+
+    Each URL gets its recorded responses in the order they were recorded,
+    starting over after the last one when loop is set. With speed 1 every
+    response takes as long as it did when recorded, with 2 half as long,
+    and with 0 it comes back at once. URLs never recorded with their exact
+    query fall back to responses for the same host and path.
+    """
+
+    intercepts = True
+
+    def __init__(self, path, speed=1.0, loop=True):
+        self.speed = speed
+        self.loop = loop
+        self.lock = threading.Lock()
+        self.by_url = {}
+        self.by_path = {}
+        for record in read_archive(path):
+            self.by_url.setdefault(record["url"], []).append(record)
+            self.by_path.setdefault(record["url"].split("?")[0], []).append(record)
+        self.positions = {}
+        self.listeners = []
+
+    def next_record(self, url):
+        """Take the next recorded response for url, or None when there is none left"""
+        records = self.by_url.get(url) or self.by_path.get(url.split("?")[0])
+        if not records:
+            return None
+        with self.lock:
+            position = self.positions.get(url, 0)
+            if position >= len(records):
+                if not self.loop:
+                    return None
+                position = 0
+            self.positions[url] = position + 1
+        return records[position]
+
+    def get(self, url, **kwargs):
+        record = self.next_record(url)
+        if record is None:
+            raise ReplayMiss(f"No recorded response for {url}")
+        if self.speed:
+            time.sleep(record["elapsed"] / self.speed)
+
+        response = RecordedResponse(url, record["status"], record["headers"], record["content"], record["encoding"])
+        for listener in self.listeners:
+            try:
+                listener(response)
+            except Exception as e:
+                print(f"Error in response listener: {e}")
+        return response
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def close(self):
+        pass
+
+
+def wrap_transport(transport):
+    """Record or replay a transport's traffic when the environment asks for it"""
+    replay = os.environ.get("CARDANO_CONVERTER_REPLAY")
+    if replay:
+        return ReplayTransport(replay, speed=float(os.environ.get("CARDANO_CONVERTER_REPLAY_SPEED", "1")))
+    record = os.environ.get("CARDANO_CONVERTER_RECORD")
+    if record:
+        return RecordingTransport(transport, record)
+    return transport
+
+
+def archive_from_fixtures(path, fixtures_dir=None):
+    """Write an archive of the saved pages in fixtures/, for replaying on a machine that never went online"""
+    fixtures_dir = fixtures_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+    writer = ArchiveWriter(path)
+    try:
+        for filename, url, content_type in FIXTURE_URLS:
+            with open(os.path.join(fixtures_dir, filename), "rb") as f:
+                writer.write(url, 200, {"Content-Type": content_type}, f.read(), "utf-8", 0.1)
+    finally:
+        writer.close()
+
+
+def record_sources(path, rounds, interval):
+    """Poll every upstream the app uses, rounds times, recording the responses"""
+    import market_stats
+    import price_sources
+    from http_transport import HttpTransport
+    from quote_matrix import QuoteMatrix
+
+    transport = RecordingTransport(HttpTransport(), path)
+    matrix = QuoteMatrix(transport=transport)
+    fetches = [
+        ("google", lambda: price_sources.get_price_from_google(transport)),
+        ("coingecko_web", lambda: price_sources.get_price_from_coingecko(transport)),
+        ("markets", lambda: market_stats.fetch_market_stats(transport)),
+        ("simple_price", matrix.load),
+    ]
+    try:
+        for round_number in range(rounds):
+            for name, fetch in fetches:
+                try:
+                    fetch()
+                except Exception as e:
+                    print(f"Error recording {name}: {e}")
+            print(f"Recorded round {round_number + 1} of {rounds}")
+            if round_number + 1 < rounds:
+                time.sleep(interval)
+    finally:
+        transport.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record and inspect archives of upstream responses")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="poll every upstream and record the responses")
+    record.add_argument("archive")
+    record.add_argument("--rounds", type=int, default=10, help="times to poll every upstream")
+    record.add_argument("--interval", type=float, default=30, help="seconds between rounds")
+
+    fixtures = commands.add_parser("fixtures", help="build an archive from the saved pages in fixtures/")
+    fixtures.add_argument("archive")
+
+    info = commands.add_parser("info", help="summarise an archive")
+    info.add_argument("archive")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        record_sources(args.archive, args.rounds, args.interval)
+    elif args.command == "fixtures":
+        archive_from_fixtures(args.archive)
+    else:
+        responses = read_archive(args.archive)
+        counts = {}
+        for record in responses:
+            counts.setdefault(record["url"], []).append(record["elapsed"])
+        for url, timings in sorted(counts.items()):
+            print(f"{len(timings):>6}  {sum(timings) / len(timings) * 1000:8.1f} ms  {url}")
+        print(f"{len(responses)} responses, {os.path.getsize(args.archive) / 1e3:.1f} kB")
+
+
+if __name__ == "__main__":
+    main()
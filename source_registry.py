@@ -0,0 +1,218 @@
+from collections import deque
+import json
+import os
+import tempfile
+import threading
+import time
+from metrics import get_metrics
+
+# Circuit breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+def percentile(values, fraction):
+    """Get the nearest-rank percentile of a list of numbers, or None when empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class SourceHealth:
+    """Rolling latency and outcome statistics of one price source, plus its circuit breaker
+
+    The breaker opens after failure_threshold failures in a row, and the
+    source is skipped until cooldown seconds have passed. Then a single
+    probe request is let through: success closes the breaker, failure opens
+    it again with the cooldown doubled, up to max_cooldown.
+    """
+
+    def __init__(self, name, fetch, position, window=50, failure_threshold=3,
+                 cooldown=30.0, max_cooldown=600.0):
+        self.name = name
+        self.fetch = fetch
+        self.position = position
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+
+        # Latest attempts, for the percentiles and the success rate
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+
+        # Totals since startup
+        self.successes = 0
+        self.errors = 0
+        self.parse_failures = 0
+        self.cancelled = 0
+
+        # Time an attempt ran before being cancelled, so a source that always loses is not unmeasured forever
+        self.lower_bound = 0.0
+
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.cooldown = cooldown
+        self.opened_at = 0
+        self.probe_started = None
+        self.last_error = None
+
+    def record(self, elapsed, ok, error=None):
+        """Record one attempt and move the breaker accordingly"""
+        self.latencies.append(elapsed)
+        self.outcomes.append(ok)
+
+        if ok:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.state = CLOSED
+            self.cooldown = self.base_cooldown
+        else:
+            self.consecutive_failures += 1
+            self.last_error = error
+            if self.state == HALF_OPEN:
+                # The probe failed, so wait longer before the next one
+                self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+                self.trip()
+            elif self.consecutive_failures >= self.failure_threshold:
+                self.trip()
+        self.probe_started = None
+
+    def trip(self):
+        """Open the breaker"""
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+
+    def available(self):
+        """Check whether the source may be queried now, letting one probe through after the cooldown"""
+        now = time.monotonic()
+        if self.state == OPEN and now - self.opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            # A probe that was never launched or never finished does not block the next one forever
+            if self.probe_started is not None and now - self.probe_started < self.cooldown:
+                return False
+            self.probe_started = now
+        return self.state != OPEN
+
+    def success_rate(self):
+        """Get the share of recent attempts that returned a valid price, or None before the first"""
+        if not self.outcomes:
+            return None
+        return sum(self.outcomes) / len(self.outcomes)
+
+    def expected_latency(self):
+        """Estimate the time to a valid price: the median successful latency divided by the success rate
+
+        Unmeasured sources score 0, or how long their cancelled attempts
+        ran, so they get tried, and sources that have never succeeded score
+        infinity so they go last.
+        """
+        if not self.outcomes:
+            return self.lower_bound
+        successful = [elapsed for elapsed, ok in zip(self.latencies, self.outcomes) if ok]
+        if not successful:
+            return float("inf")
+        return percentile(successful, 0.5) / self.success_rate()
+
+    def stats(self):
+        """Get a JSON-friendly summary of the source's health"""
+        latencies = list(self.latencies)
+        return {
+            "name": self.name,
+            "state": self.state,
+            "success_rate": self.success_rate(),
+            "p50": percentile(latencies, 0.5),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "successes": self.successes,
+            "errors": self.errors,
+            "parse_failures": self.parse_failures,
+            "cancelled": self.cancelled,
+            "consecutive_failures": self.consecutive_failures,
+            "cooldown": self.cooldown,
+            "last_error": self.last_error,
+        }
+
+
+class SourceRegistry:
+    """Price sources with their health, ordered fastest healthy source first
+
+    Sources are (name, callable) pairs. Sources with no attempts yet keep
+    their registration order ahead of the measured ones so they get
+    measured, and sources whose breaker is open are left out entirely, so
+    one broken upstream costs nothing until its probe is due.
+    """
+
+    def __init__(self, sources=(), **health_options):
+        self.lock = threading.Lock()
+        self.health_options = health_options
+        self.sources = {}
+        for name, fetch in sources:
+            self.register(name, fetch)
+
+    def register(self, name, fetch):
+        """Add a source, after the ones already registered"""
+        with self.lock:
+            self.sources[name] = SourceHealth(name, fetch, len(self.sources), **self.health_options)
+
+    def __len__(self):
+        return len(self.sources)
+
+    def ordered(self):
+        """Get the (name, callable) pairs to query now, best first"""
+        with self.lock:
+            healthy = [health for health in self.sources.values() if health.available()]
+            healthy.sort(key=lambda health: (health.expected_latency(), health.position))
+            return [(health.name, health.fetch) for health in healthy]
+
+    def record_success(self, name, elapsed):
+        """Record an attempt that returned a valid price"""
+        with self.lock:
+            self.sources[name].record(elapsed, True)
+        get_metrics().observe("source_fetch_seconds", elapsed, source=name, outcome="ok")
+
+    def record_error(self, name, elapsed, error):
+        """Record an attempt that raised, e.g. a timeout or an HTTP error"""
+        with self.lock:
+            health = self.sources[name]
+            health.errors += 1
+            health.record(elapsed, False, str(error))
+        metrics = get_metrics()
+        metrics.observe("source_fetch_seconds", elapsed, source=name, outcome="error")
+        metrics.error("fetch", error)
+
+    def record_parse_failure(self, name, elapsed):
+        """Record an attempt that got a response but no usable price out of it"""
+        with self.lock:
+            health = self.sources[name]
+            health.parse_failures += 1
+            health.record(elapsed, False, "no price in response")
+        get_metrics().observe("source_fetch_seconds", elapsed, source=name, outcome="parse_failure")
+
+    def record_cancelled(self, name, elapsed):
+        """Record an attempt cancelled after another source won, which took at least elapsed"""
+        with self.lock:
+            health = self.sources[name]
+            health.cancelled += 1
+            health.lower_bound = elapsed
+            health.probe_started = None
+        get_metrics().observe("source_fetch_seconds", elapsed, source=name, outcome="cancelled")
+
+    def stats(self):
+        """Get every source's health summary, in registration order"""
+        with self.lock:
+            return [health.stats() for health in self.sources.values()]
+
+    def save(self, path):
+        """Write the health summaries to a JSON file for operators to inspect"""
+        data = {"time": time.time(), "sources": self.stats()}
+        try:
+            # Write to a uniquely named temporary file first so readers never see a torn file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not save source health: {e}")
@@ -0,0 +1,193 @@
+from bisect import bisect_left
+import mmap
+import os
+import struct
+import threading
+
+# File header: magic, format version and record size
+HEADER = struct.Struct('<8sII')
+MAGIC = b'ADATICKS'
+VERSION = 1
+
+# One tick: epoch timestamp and price, both little-endian doubles
+RECORD = struct.Struct('<dd')
+
+
+class TickStore:
+    """Append-only on-disk store of (epoch timestamp, price) ticks
+
+    Ticks are fixed-size records in a binary file and must be appended in
+    timestamp order. A sidecar index file holds the first timestamp of every
+    block of block_size records and is small enough to keep in memory.
+    Reads go through a memory map, so a range query bisects the index and
+    then one block, touching O(log n) records rather than the whole file.
+    Results are zero-copy memoryviews into the map.
+    """
+
+    def __init__(self, path, block_size=1024):
+        self.path = path
+        self.index_path = path + '.idx'
+        self.block_size = block_size
+        self.lock = threading.Lock()
+
+        self.map = None
+        self.mapped_count = 0
+        self.times = None
+        self.prices = None
+
+        self.count = self.open_data_file()
+        self.index = self.open_index()
+        self.last_tick = self.read_tick(self.count - 1) if self.count else None
+
+    def open_data_file(self):
+        """Open the data file for appending and return the number of complete ticks"""
+        self.file = open(self.path, 'a+b')
+        self.file.seek(0, os.SEEK_END)
+        size = self.file.tell()
+
+        if size == 0:
+            self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+            self.file.flush()
+            return 0
+
+        self.file.seek(0)
+        magic, version, record_size = HEADER.unpack(self.file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            raise ValueError(f"{self.path} is not a version {VERSION} tick store")
+
+        return self.complete_ticks(size)
+
+    def complete_ticks(self, size):
+        """Count the whole ticks in a data file of size bytes, dropping a record torn by a crash mid-write"""
+        count, torn = divmod(size - HEADER.size, RECORD.size)
+        if torn:
+            self.file.truncate(HEADER.size + count * RECORD.size)
+        self.file.seek(0, os.SEEK_END)
+        return count
+
+    def sync(self):
+        """Catch up with ticks another process appended since this one last looked
+
+        Only one process writes at a time, but the writer changes when the
+        leading instance exits, so the count, last tick and index read at
+        open can be stale by the time this process starts appending.
+        """
+        size = os.fstat(self.file.fileno()).st_size
+        if size == HEADER.size + self.count * RECORD.size:
+            return
+        self.count = self.complete_ticks(size)
+        self.index_file.close()
+        self.index = self.open_index()
+        self.last_tick = self.read_tick(self.count - 1) if self.count else None
+
+    def open_index(self):
+        """Load the block index, rebuilding it if it does not match the data file"""
+        blocks = -(-self.count // self.block_size)
+        index = []
+        try:
+            with open(self.index_path, 'rb') as f:
+                data = f.read()
+            index = [t for (t,) in struct.iter_unpack('<d', data[:len(data) - len(data) % 8])]
+        except OSError:
+            pass
+
+        if len(index) != blocks:
+            # Read one timestamp per block, not the whole file
+            index = [self.read_tick(block * self.block_size)[0] for block in range(blocks)]
+            with open(self.index_path, 'wb') as f:
+                f.write(b''.join(struct.pack('<d', t) for t in index))
+
+        self.index_file = open(self.index_path, 'ab')
+        return index
+
+    def read_tick(self, position):
+        """Read a single tick straight from the file"""
+        with open(self.path, 'rb') as f:
+            f.seek(HEADER.size + position * RECORD.size)
+            return RECORD.unpack(f.read(RECORD.size))
+
+    def __len__(self):
+        return self.count
+
+    def append(self, timestamp, price):
+        """Add a tick, which must not be older than the last one"""
+        with self.lock:
+            self.sync()
+            if self.last_tick and timestamp < self.last_tick[0]:
+                raise ValueError("ticks must be appended in timestamp order")
+
+            self.file.write(RECORD.pack(timestamp, price))
+            self.file.flush()
+
+            if self.count % self.block_size == 0:
+                self.index.append(timestamp)
+                self.index_file.write(struct.pack('<d', timestamp))
+                self.index_file.flush()
+
+            self.count += 1
+            self.last_tick = (timestamp, price)
+
+    def remap(self):
+        """Map the file again if it has grown since the last read"""
+        if self.mapped_count == self.count:
+            return
+
+        self.map = mmap.mmap(self.file.fileno(), HEADER.size + self.count * RECORD.size,
+                             access=mmap.ACCESS_READ)
+        values = memoryview(self.map)[HEADER.size:].cast('d')
+        self.times = values[0::2]
+        self.prices = values[1::2]
+        self.mapped_count = self.count
+
+    def search(self, timestamp):
+        """Get the position of the first tick at or after timestamp"""
+        block = max(0, bisect_left(self.index, timestamp) - 1)
+        low = block * self.block_size
+        high = min(self.count, low + 2 * self.block_size)
+        return bisect_left(self.times, timestamp, low, high)
+
+    def range(self, start=None, end=None):
+        """Get (timestamps, prices) views of the ticks with start <= timestamp < end"""
+        with self.lock:
+            if not self.count:
+                return memoryview(b'').cast('d'), memoryview(b'').cast('d')
+            self.remap()
+
+            low = 0 if start is None else self.search(start)
+            high = self.count if end is None else self.search(end)
+            return self.times[low:high], self.prices[low:high]
+
+    def covering(self, start, end):
+        """Get (timestamps, prices) views of the ticks needed to price any time in start..end
+
+        That is every tick in the range plus the one before start and the
+        one after end, so times at either edge can still be interpolated.
+        """
+        with self.lock:
+            if not self.count:
+                return memoryview(b'').cast('d'), memoryview(b'').cast('d')
+            self.remap()
+
+            low = max(0, self.search(start) - 1)
+            high = min(self.count, self.search(end) + 1)
+            return self.times[low:high], self.prices[low:high]
+
+    def tail(self, n):
+        """Get (timestamps, prices) views of the latest n ticks"""
+        with self.lock:
+            if not self.count:
+                return memoryview(b'').cast('d'), memoryview(b'').cast('d')
+            self.remap()
+
+            low = max(0, self.count - n)
+            return self.times[low:], self.prices[low:]
+
+    def last(self):
+        """Get the newest (timestamp, price) tick, or None when empty"""
+        return self.last_tick
+
+    def close(self):
+        """Close the files, leaving views handed out so far valid"""
+        with self.lock:
+            self.file.close()
+            self.index_file.close()
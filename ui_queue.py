@@ -0,0 +1,74 @@
+from collections import namedtuple, OrderedDict
+import queue
+from metrics import get_metrics
+
+# Immutable events produced by worker threads and applied on the UI thread
+QuoteEvent = namedtuple("QuoteEvent", ["price", "source", "timestamp"])
+StatsEvent = namedtuple("StatsEvent", ["market_cap", "volume", "supply", "max_supply", "change_24h"])
+
+
+class UiUpdateQueue:
+    """Hand events from worker threads to the Tk main loop
+
+    Workers call put() from any thread. The Tk main loop drains the queue
+    every interval_ms through root.after, so widgets are only ever touched on
+    the UI thread. Each handler gets every event of its type from the batch
+    in arrival order and is expected to render only the last one, so a burst
+    of updates costs a single redraw.
+    """
+
+    def __init__(self, root, interval_ms=100, max_batch=256):
+        self.root = root
+        self.interval_ms = interval_ms
+        self.max_batch = max_batch
+
+        self.events = queue.Queue()
+        self.handlers = {}
+        self.after_id = None
+
+    def register(self, event_type, handler):
+        """Call handler(events) on the UI thread for batches of event_type"""
+        self.handlers[event_type] = handler
+
+    def put(self, event):
+        """Queue an event, safe to call from any thread"""
+        self.events.put(event)
+
+    def start(self):
+        """Start draining the queue from the Tk main loop"""
+        if self.after_id is None:
+            self.after_id = self.root.after(self.interval_ms, self.poll)
+
+    def stop(self):
+        """Stop draining the queue"""
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+
+    def poll(self):
+        """Drain one batch and schedule the next poll"""
+        try:
+            self.drain()
+        finally:
+            self.after_id = self.root.after(self.interval_ms, self.poll)
+
+    def drain(self):
+        """Apply up to max_batch queued events, grouped by type, on the calling thread"""
+        batches = OrderedDict()
+        for _ in range(self.max_batch):
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            batches.setdefault(type(event), []).append(event)
+
+        for event_type, events in batches.items():
+            handler = self.handlers.get(event_type)
+            if handler is None:
+                continue
+            try:
+                handler(events)
+            except Exception as e:
+                print(f"Error applying {event_type.__name__}: {e}")
+                get_metrics().error("ui", e)
+        return sum(len(events) for events in batches.values())